@@ -0,0 +1,127 @@
+"""Run each `Extractor` over synthetic archives (see `synthetic.py`)
+
+Usage: python benchmarks/bench_extractors.py [--rows=10000] [--dataset=...]
+    [--jobs=1] [--fast-normalization] [--data-path=...] [--output=results.json]
+
+Each (dataset, year) is extracted in a new process (so the peak RSS of one
+doesn't affect the others) and written to a `.csv.gz` file, as `tse.py` does.
+The rows/second, peak RSS and output size are reported; errors are reported
+for the layout (the other ones are still executed).
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).absolute().parent.parent))
+sys.path.insert(0, str(Path(__file__).absolute().parent))
+
+import settings  # noqa
+import synthetic  # noqa
+import writers  # noqa
+
+
+def run(dataset, year, data_path, output_filename, jobs, fast_normalization, queue):
+    settings.DOWNLOAD_PATH = Path(data_path)
+    settings.DATA_PATH = Path(data_path)
+    extractor = synthetic.DATASETS[dataset](
+        censor=True, jobs=jobs, fast_normalization=fast_normalization
+    )
+    result = {"dataset": dataset, "year": year, "rows": 0, "error": None}
+    start = time.time()
+    try:
+        writer = writers.CsvWriter(output_filename, extractor.output_fields)
+        try:
+            for row in extractor.extract(year):
+                writer.writerow(row)
+                result["rows"] += 1
+        finally:
+            writer.close()
+    except Exception as exception:
+        result["error"] = f"{exception.__class__.__name__}: {exception}"
+    result["elapsed"] = time.time() - start
+    result["rows_per_second"] = result["rows"] / result["elapsed"]
+    result["max_rss"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    result["output_size"] = os.stat(output_filename).st_size
+    queue.put(result)
+
+
+def measure(dataset, year, data_path, output_filename, jobs, fast_normalization):
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(
+        target=run,
+        args=(dataset, year, data_path, output_filename, jobs, fast_normalization, queue),
+    )
+    process.start()
+    result = queue.get()
+    process.join()
+    os.unlink(output_filename)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=10000, help="Rows per archive member")
+    parser.add_argument("--dataset", action="append", choices=list(synthetic.DATASETS.keys()))
+    parser.add_argument("--jobs", type=int, default=1)
+    parser.add_argument("--fast-normalization", action="store_true")
+    parser.add_argument("--data-path", help="Reuse the archives in this path (create them if empty)")
+    parser.add_argument("--output", help="Save the results to this JSON file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_path:
+        data_path = Path(args.data_path or temp_path)
+        datasets = args.dataset or list(synthetic.DATASETS.keys())
+        layouts = [
+            (dataset, year)
+            for dataset in datasets
+            for year in synthetic.YEARS[dataset]
+        ]
+        missing = [
+            dataset
+            for dataset, year in layouts
+            if not (data_path / synthetic.DATASETS[dataset]().filename(year)).exists()
+        ]
+        if missing:
+            print(f"Creating archives ({args.rows} rows per member) in {data_path}...")
+            synthetic.create_archives(
+                data_path, datasets=sorted(set(missing)), rows_count=args.rows
+            )
+
+        results = []
+        for dataset, year in layouts:
+            result = measure(
+                dataset,
+                year,
+                data_path,
+                Path(temp_path) / "output.csv.gz",
+                args.jobs,
+                args.fast_normalization,
+            )
+            results.append(result)
+            if result["error"]:
+                print(f"{dataset:>14} {year!s:>16}: ERROR ({result['error']})")
+            else:
+                print(
+                    f"{dataset:>14} {year!s:>16}: {result['rows']:9d} rows "
+                    f"{result['rows_per_second']:9.0f} rows/s  "
+                    f"max RSS: {result['max_rss'] / 1024 / 1024:7.1f} MiB  "
+                    f"output: {result['output_size'] / 1024 / 1024:7.2f} MiB"
+                )
+
+    if args.output:
+        with open(args.output, mode="w") as fobj:
+            json.dump(results, fobj, indent=2)
+    if any(result["error"] for result in results):
+        exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Compare the old (whole file in memory) and the streaming `fix_fobj`
+
+Usage: python benchmarks/bench_fix_fobj.py [--size=1024] [--broken-every=10000]
+
+A synthetic `consulta_cand`-like file with `--size` MiB is created (some lines
+have wrongly-escaped quotes) and each implementation runs in its own process,
+so the peak memory (max RSS) of each one can be measured separately.
+"""
+
+import argparse
+import hashlib
+import multiprocessing
+import resource
+import sys
+import tempfile
+import time
+from io import StringIO, TextIOWrapper
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).absolute().parent.parent))
+
+from extractors import REGEXP_WRONGQUOTE, CandidaturaExtractor  # noqa
+
+
+def legacy_fix_fobj(fobj):
+    "`CandidaturaExtractor.fix_fobj` before the streaming implementation"
+
+    text = fobj.read()
+    for fix in REGEXP_WRONGQUOTE.findall(text):
+        if any('"' in part for part in fix.split('""')):
+            text = text.replace(fix, fix.replace('"', '""'))
+
+    return StringIO(text)
+
+
+def streaming_fix_fobj(fobj):
+    return CandidaturaExtractor().fix_fobj(fobj)
+
+
+def create_file(filename, size, broken_every):
+    line = '"2008";"SP";"71072";"SAO PAULO";"13";"VEREADOR";"MARIA DA SILVA";"12345";"2";"DEFERIDO"\n'
+    broken = '"2008";"SP";"71072";"SAO PAULO";"13";"VEREADOR";"MARIA "DA" SILVA";"12345";"2";"DEFERIDO"\n'
+    block = (line * (broken_every - 1) + broken).encode("latin-1")
+    written = 0
+    with open(filename, mode="wb") as fobj:
+        while written < size:
+            fobj.write(block)
+            written += len(block)
+    return written
+
+
+def run(function, filename, queue):
+    start = time.time()
+    checksum = hashlib.md5()
+    with open(filename, mode="rb") as raw:
+        fobj = function(TextIOWrapper(raw, encoding="latin-1"))
+        for line in fobj:
+            checksum.update(line.encode("latin-1"))
+    elapsed = time.time() - start
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    queue.put((elapsed, max_rss, checksum.hexdigest()))
+
+
+def measure(function, filename):
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=run, args=(function, filename, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=1024, help="File size (MiB)")
+    parser.add_argument("--broken-every", type=int, default=10000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_path:
+        filename = Path(temp_path) / "consulta_cand_2008_SP.txt"
+        print(f"Creating {args.size} MiB file...")
+        total = create_file(filename, args.size * 1024 * 1024, args.broken_every)
+        results = {}
+        for name, function in (("legacy", legacy_fix_fobj), ("streaming", streaming_fix_fobj)):
+            elapsed, max_rss, checksum = measure(function, filename)
+            results[name] = checksum
+            speed = total / elapsed / 1024 / 1024
+            print(f"{name:>10}: {elapsed:8.2f}s {speed:8.2f} MiB/s  max RSS: {max_rss:8.1f} MiB")
+        if results["legacy"] != results["streaming"]:
+            print("ERROR: outputs differ!")
+            exit(1)
+        print("Outputs are equal.")
+
+
+if __name__ == "__main__":
+    main()
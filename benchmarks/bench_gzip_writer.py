@@ -0,0 +1,100 @@
+"""Compare `open_compressed` (single-threaded) and `ParallelGzipWriter`
+
+Usage: python benchmarks/bench_gzip_writer.py [--size=512] [--level=9] [--threads=1,2,4]
+
+A synthetic `votacao_zona`-like CSV with `--size` MiB is written with each
+writer (as `extract_data` does, through a text file-like object); the
+throughput, the compressed size and a checksum of the decompressed data are
+reported for each one.
+"""
+
+import argparse
+import gzip
+import hashlib
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).absolute().parent.parent))
+
+from rows.utils import open_compressed  # noqa
+
+import writers  # noqa
+
+
+def create_lines(size):
+    random.seed(42)
+    names = ["MARIA DA SILVA", "JOSE DOS SANTOS", "ANTONIO PEREIRA", "ANA SOUZA"]
+    cities = ["SAO PAULO", "RIO DE JANEIRO", "BELO HORIZONTE", "SALVADOR"]
+    lines, total = [], 0
+    while total < size:
+        line = (
+            f"2018,{random.randint(1, 2)},{random.choice(['SP', 'RJ', 'MG', 'BA'])},"
+            f"{random.randint(1000, 99999)},{random.choice(cities)},{random.randint(1, 400)},"
+            f"{random.choice(names)},{random.randint(10, 99999)},DEPUTADO FEDERAL,"
+            f"{random.randint(0, 5000)}\r\n"
+        )
+        lines.append(line)
+        total += len(line)
+    return lines
+
+
+def run(name, opener, lines, filename):
+    start = time.time()
+    with opener(filename) as fobj:
+        for line in lines:
+            fobj.write(line)
+    elapsed = time.time() - start
+    with gzip.open(filename, mode="rb") as fobj:
+        checksum = hashlib.md5(fobj.read()).hexdigest()
+    return name, elapsed, os.stat(filename).st_size, checksum
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=512, help="Data size in MiB")
+    parser.add_argument("--level", type=int, default=writers.DEFAULT_COMPRESSION_LEVEL)
+    parser.add_argument("--threads", default=f"1,2,4,{os.cpu_count()}")
+    args = parser.parse_args()
+
+    lines = create_lines(args.size * 1024 * 1024)
+    size = sum(len(line) for line in lines) / 1024 / 1024
+    openers = [
+        (
+            "open_compressed",
+            # `open_compressed` always uses the default `gzip.open` level
+            lambda filename: open_compressed(filename, mode="w", encoding="utf-8"),
+        )
+    ]
+    for threads in sorted(set(int(value) for value in args.threads.split(","))):
+        openers.append(
+            (
+                f"ParallelGzipWriter ({threads} threads)",
+                lambda filename, threads=threads: writers.open_output(
+                    filename, compresslevel=args.level, threads=threads
+                ),
+            )
+        )
+
+    print(f"Data: {size:.0f} MiB, level {args.level}, {os.cpu_count()} CPUs")
+    results = []
+    with tempfile.TemporaryDirectory() as temp_path:
+        for index, (name, opener) in enumerate(openers):
+            filename = Path(temp_path) / f"{index}.csv.gz"
+            results.append(run(name, opener, lines, filename))
+            filename.unlink()
+
+    base_elapsed = results[0][1]
+    for name, elapsed, compressed_size, checksum in results:
+        print(
+            f"{name:35} {elapsed:6.2f}s {size / elapsed:7.1f} MiB/s "
+            f"(x{base_elapsed / elapsed:.2f}) {compressed_size / 1024 / 1024:7.1f} MiB "
+            f"{checksum}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""Compare the person identity computation in socio.py with the previous one
+
+Usage: python benchmarks/bench_person.py [--rows=200000] [--people=20000]
+
+Synthetic partner, company and candidate files are created (with `--people`
+distinct people, so each one appears many times, as in the real files) and
+converted by `Partner`, `Company` and `Candidate` (`data()`). The same files
+are converted using the previous implementation (a `Person` dataclass whose
+UUID is computed for every row), the results are compared and the time of
+both is reported.
+"""
+
+import argparse
+import csv
+import gzip
+import random
+import sys
+import tempfile
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).absolute().parent.parent))
+
+import rows  # noqa
+
+import socio  # noqa
+
+
+@dataclass
+class LegacyPerson:
+    "`socio.Person` before the identity cache (for comparison)"
+
+    document: str
+    name: str
+
+    @property
+    def key(self):
+        if getattr(self, "_key", None) is None:
+            document = self.document.strip()
+            name = rows.utils.slug(self.name.strip(), separator="-").upper()
+            self._key = f"{document[3:9]}-{name}"
+        return self._key
+
+    @property
+    def uuid(self):
+        url = f"https://id.brasil.io/person/v1/{self.key}"
+        return uuid.uuid5(uuid.NAMESPACE_URL, url)
+
+
+def legacy_convert(partner_filename, company_filename, candidate_filename):
+    "UUIDs computed as `Partner`, `Company` and `Candidate` used to"
+    result = []
+    with gzip.open(partner_filename, mode="rt") as fobj:
+        for row in csv.DictReader(fobj):
+            partner = LegacyPerson(row["cnpj_cpf_do_socio"], row["nome_socio"])
+            representative = LegacyPerson(
+                row["cpf_representante_legal"], row["nome_representante_legal"]
+            )
+            result.append(str(partner.uuid) if partner.key else None)
+            result.append(str(representative.uuid) if representative.key else None)
+    with gzip.open(company_filename, mode="rt") as fobj:
+        for row in csv.DictReader(fobj):
+            owner_uuid = None
+            for field_name in ("razao_social", "nome_fantasia"):
+                words = row[field_name].split()
+                if words and words[-1].isdigit():
+                    document, name = socio.parse_company_name(words)
+                    if document is None:
+                        continue
+                    owner_uuid = str(LegacyPerson(document, name).uuid)
+                    break
+            result.append(owner_uuid)
+    with gzip.open(candidate_filename, mode="rt") as fobj:
+        for row in csv.DictReader(fobj):
+            person = LegacyPerson(row["cpf"], row["nome"])
+            result.append(str(person.uuid) if person.key else None)
+    return result
+
+
+def convert(partner_filename, company_filename, candidate_filename):
+    result = []
+    for row in socio.Partner(partner_filename).data():
+        result.append(row["partner_uuid"])
+        result.append(row["representative_uuid"])
+    for row in socio.Company(company_filename, None).data():
+        result.append(row["owner_uuid"])
+    for row in socio.Candidate(candidate_filename).data():
+        result.append(row["person_uuid"])
+    return result
+
+
+def create_files(path, total_rows, total_people):
+    random.seed(42)
+    first_names = ["MARIA", "JOSÉ", "ANTÔNIO", "ANA", "JOÃO", "FRANCISCO", "LUCIANA"]
+    last_names = ["DA SILVA", "DOS SANTOS", "PEREIRA", "DE SOUZA", "LIMA", "D'ÁVILA"]
+    people = [
+        (
+            f"{random.randint(0, 10 ** 11 - 1):011d}",
+            f"{random.choice(first_names)} {random.choice(last_names)} {index}",
+        )
+        for index in range(total_people)
+    ]
+    filenames = [path / "socio.csv.gz", path / "empresa.csv.gz", path / "candidatura.csv.gz"]
+    with gzip.open(filenames[0], mode="wt") as fobj:
+        writer = csv.writer(fobj)
+        writer.writerow(
+            ["cnpj", "cnpj_cpf_do_socio", "nome_socio", "cpf_representante_legal", "nome_representante_legal"]
+        )
+        for index in range(total_rows):
+            document, name = random.choice(people)
+            writer.writerow([f"{index:014d}", f"***{document[3:9]}**", name, "", ""])
+    with gzip.open(filenames[1], mode="wt") as fobj:
+        writer = csv.writer(fobj)
+        writer.writerow(["cnpj", "razao_social", "nome_fantasia", "codigo_natureza_juridica"])
+        for index in range(total_rows):
+            document, name = random.choice(people)
+            writer.writerow([f"{index:014d}", f"{name} {document}", "", "2135"])
+    with gzip.open(filenames[2], mode="wt") as fobj:
+        writer = csv.writer(fobj)
+        writer.writerow(["ano", "cpf", "nome"])
+        for index in range(total_rows):
+            document, name = random.choice(people)
+            writer.writerow([2000 + 2 * (index % 12), document, name])
+    return filenames
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200_000, help="Rows per file")
+    parser.add_argument("--people", type=int, default=20_000, help="Distinct people")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_path:
+        filenames = create_files(Path(temp_path), args.rows, args.people)
+        start = time.time()
+        legacy = legacy_convert(*filenames)
+        legacy_time = time.time() - start
+        start = time.time()
+        result = convert(*filenames)
+        new_time = time.time() - start
+
+    total = 3 * args.rows
+    print(f"{'implementation':16} {'time':>8} {'rows/s':>10}")
+    print(f"{'legacy':16} {legacy_time:7.2f}s {total / legacy_time:10.0f}")
+    print(f"{'socio.Person':16} {new_time:7.2f}s {total / new_time:10.0f}")
+    print(f"Speedup: {legacy_time / new_time:.1f}x")
+    if result != legacy:
+        print("ERROR: the UUIDs are different")
+        exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Compare `query.query` on a full file, a seekable file and partitions
+
+Usage: python benchmarks/bench_query.py [--rows=1000000] [--state=SP] [--year=2020]
+
+A synthetic `candidatura`-like dataset (sorted by year and state, as the
+extracted files are) is written as a regular `.csv.gz` file, as a seekable
+file (`--seekable`) and as partitions (`--partition-by ano,sigla_uf`); then
+the same single-state query is run on each one. The time of each query is
+reported and the results are compared.
+"""
+
+import argparse
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).absolute().parent.parent))
+
+import query  # noqa
+import writers  # noqa
+
+
+STATES = (
+    "AC AL AM AP BA CE DF ES GO MA MG MS MT PA PB PE PI PR RJ RN RO RR RS SC SE SP TO"
+).split()
+FIELD_NAMES = ["ano", "sigla_uf", "cargo", "nome", "cpf", "numero_urna"] + [
+    f"campo_{index:02d}" for index in range(40)
+]
+
+
+def create_rows(total_rows, years):
+    random.seed(42)
+    names = ["MARIA DA SILVA", "JOSE DOS SANTOS", "ANTONIO PEREIRA", "ANA SOUZA"]
+    positions = ["PREFEITO", "VICE-PREFEITO", "VEREADOR"]
+    per_partition = total_rows // (len(years) * len(STATES))
+    for year in years:
+        for state in STATES:
+            for index in range(per_partition):
+                yield [
+                    str(year),
+                    state,
+                    random.choice(positions),
+                    f"{random.choice(names)} {index}",
+                    f"***{random.randint(0, 999999):06d}**",
+                    str(random.randint(10, 99999)),
+                ] + [str(random.randint(0, 1000)) for _ in range(40)]
+
+
+def write_files(path, total_rows, years):
+    filenames = {
+        "full scan": (path / "full.csv.gz", path / "none"),
+        "seekable": (path / "seekable.csv.gz", path / "none"),
+        "partitions": (path / "none.csv.gz", path / "partitions"),
+    }
+    output = [
+        writers.CsvWriter(filenames["full scan"][0], FIELD_NAMES, compresslevel=6),
+        writers.SeekableCsvWriter(filenames["seekable"][0], FIELD_NAMES, compresslevel=6),
+        writers.PartitionedCsvWriter(
+            filenames["partitions"][1], FIELD_NAMES, ["ano", "sigla_uf"], compresslevel=6
+        ),
+    ]
+    for row in create_rows(total_rows, years):
+        for writer in output:
+            writer.writerow(row)
+    for writer in output:
+        writer.close()
+    return filenames
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Total rows")
+    parser.add_argument("--state", default="SP")
+    parser.add_argument("--year", default="2020")
+    args = parser.parse_args()
+
+    where = {"ano": args.year, "sigla_uf": args.state, "cargo": "PREFEITO"}
+    columns = ["nome", "cpf", "numero_urna"]
+    with tempfile.TemporaryDirectory() as temp_path:
+        print(f"Creating files with {args.rows} rows")
+        filenames = write_files(Path(temp_path), args.rows, (2016, 2018, 2020))
+        results, times = {}, {}
+        for name, (filename, partitions_path) in filenames.items():
+            start = time.time()
+            result = query.query(filename, partitions_path, where, columns)
+            results[name] = list(result["rows"])
+            times[name] = time.time() - start
+            print(f"{name:12} {times[name]:7.3f}s {len(results[name]):8} rows ({result['source']})")
+
+    for name in ("seekable", "partitions"):
+        print(f"Speedup ({name}): {times['full scan'] / times[name]:.1f}x")
+    if any(value != results["full scan"] for value in results.values()):
+        print("ERROR: the results are different")
+        exit(1)
+
+
+if __name__ == "__main__":
+    main()
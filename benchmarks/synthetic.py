@@ -0,0 +1,351 @@
+"""Create fake TSE archives for every header layout in `headers/`
+
+Usage: python benchmarks/synthetic.py <path> [--rows=10000] [--seed=42] [--dataset=...]
+
+The archives are saved as `<path>/<Extractor.filename(year)>`, so `<path>` can
+be used as `settings.DOWNLOAD_PATH`. Each member follows the header file the
+extractor itself picks for it (`Extractor.get_headers`) and its values look
+like the TSE's: accented names, many date formats, formatted and unformatted
+CPFs, `#NULO#` markers, `1234,56` amounts, wrong-escaped quotes (candidatura)
+and lines without the outer quotes (prestação de contas, 2002-2008).
+"""
+
+import argparse
+import datetime
+import random
+import sys
+from pathlib import Path
+from zipfile import ZIP_DEFLATED, ZipFile
+
+sys.path.insert(0, str(Path(__file__).absolute().parent.parent))
+
+import rows  # noqa
+
+import settings  # noqa
+from extractors import (  # noqa
+    MAP_DESCRICAO_CARGO,
+    BemDeclaradoExtractor,
+    CandidaturaExtractor,
+    PrestacaoContasDespesasExtractor,
+    PrestacaoContasReceitasExtractor,
+    VotacaoZonaExtractor,
+)
+
+
+DATASETS = {
+    "candidatura": CandidaturaExtractor,
+    "bem_declarado": BemDeclaradoExtractor,
+    "votacao_zona": VotacaoZonaExtractor,
+    "receita": PrestacaoContasReceitasExtractor,
+    "despesa": PrestacaoContasDespesasExtractor,
+}
+# One year for each header layout (prestação de contas years have their own
+# layouts, so all of them are used)
+YEARS = {
+    "candidatura": (1994, 2008, 2012, 2014, 2020, 2022),
+    "bem_declarado": (2010, 2018),
+    "votacao_zona": (2012, 2018),
+    "receita": PrestacaoContasReceitasExtractor.year_range,
+    "despesa": PrestacaoContasDespesasExtractor.year_range,
+}
+ORGANIZATIONS = {
+    2002: ("candidatos", "comites"),
+    2004: ("candidatos", "comites"),
+    2006: ("candidatos", "comites"),
+    2008: ("candidatos", "comites"),
+    2010: ("candidatos", "comites", "partidos"),
+    2012: ("candidatos", "comites", "partidos"),
+    2014: ("candidatos", "comites", "partidos"),
+    "2014_suplementar": ("candidatos", "partidos"),
+    2016: ("candidatos", "partidos"),
+    "2018_candidatos": {
+        "receita": ("candidatos", "originarios_candidatos"),
+        "despesa": ("contratadas_candidatos", "pagas_candidatos"),
+    },
+    "2018_orgaos": {
+        "receita": ("partidos", "originarios_partidos"),
+        "despesa": ("contratadas_partidos", "pagas_partidos"),
+    },
+}
+# Files from these years have no quotes at the start and end of the lines
+# (fixed by `utils.FixQuotes`)
+NO_OUTER_QUOTES_YEARS = (2002, 2004, 2006, 2008)
+# Same tokens `PrestacaoContasExtractor.extract` uses to detect a header row
+PRESTACAO_HEADER_TOKENS = (
+    "UF", "SG_UF", "SG_UE_SUP", "SITUACAOCADASTRAL", "DS_ORGAO", "RV_MEANING",
+    "SEQUENCIAL_CANDIDATO",
+)
+UFS = ("AC", "PI", "SP")
+FIRST_NAMES = (
+    "JOSÉ", "MARIA", "JOÃO", "ANTÔNIO", "FRANCISCA", "ANA", "LUÍS", "CÉLIA",
+    "SEBASTIÃO", "MÁRCIA", "RAIMUNDO", "CONCEIÇÃO",
+)
+LAST_NAMES = (
+    "DA SILVA", "DOS SANTOS", "PEREIRA", "ARAÚJO", "GONÇALVES", "FALCÃO",
+    "D'ÁVILA", "LIMA", "BRAGANÇA", "CARVALHO",
+)
+WORDS = (
+    "SÃO PAULO", "TERESINA", "RIO BRANCO", "SERVIÇOS PRESTADOS", "PUBLICIDADE",
+    "COMBUSTÍVEIS E LUBRIFICANTES", "DOAÇÃO", "RECURSOS PRÓPRIOS", "ELEIÇÃO",
+    "CASADO(A)", "ENSINO MÉDIO COMPLETO", "DEFERIDO", "COMITÊ FINANCEIRO",
+)
+MONTHS = ("JAN", "FEB", "MAR", "APR", "MAY", "JUN", "JUL", "AUG", "SEP", "OCT", "NOV", "DEC")
+NULL_VALUES = ("#NULO#", "#NULO", "#NE#")
+
+
+def read_integer_fields():
+    return {
+        field_name
+        for filename in settings.SCHEMA_PATH.glob("*.csv")
+        for field_name, field_type in (
+            (row.field_name, row.field_type) for row in rows.import_from_csv(filename)
+        )
+        if field_type == "integer"
+    }
+
+
+def read_situacoes():
+    return [
+        (row.codigo_situacao_candidatura, row.situacao_candidatura or "")
+        for row in rows.import_from_csv(settings.HEADERS_PATH / "situacao_candidatura.csv")
+    ]
+
+
+def member_names(dataset, year, ufs):
+    "Internal filenames (as the TSE names them) for `dataset` and `year`"
+
+    if dataset == "candidatura":
+        return [f"consulta_cand_{year}_{uf}.txt" for uf in ufs]
+    elif dataset == "bem_declarado":
+        return [f"bem_candidato_{year}_{uf}.txt" for uf in ufs]
+    elif dataset == "votacao_zona":
+        return [f"votacao_candidato_munzona_{year}_{uf}.txt" for uf in ufs]
+
+    organizations = ORGANIZATIONS[year]
+    if isinstance(organizations, dict):
+        organizations = organizations[dataset]
+    kind, names = f"{dataset}s", []
+    for organization in organizations:
+        for uf in ufs:
+            if year == 2010:
+                names.append(f"{uf}/{kind.capitalize()}{organization.capitalize()}.txt")
+            elif year == "2014_suplementar":
+                names.append(f"{kind}_{organization}_sup_2014_{uf}.txt")
+            elif str(year).startswith("2018"):
+                origin, who = "", "candidatos"
+                if organization.startswith("originarios_"):
+                    origin = "_doador_originario"
+                if organization.endswith("partidos"):
+                    who = "orgaos_partidarios"
+                if organization.startswith(("contratadas_", "pagas_")):
+                    who = organization.split("_")[0] + "_" + who
+                names.append(f"{kind}_{who}{origin}_2018_{uf}.csv")
+            else:
+                names.append(f"{kind}_{organization}_{year}_{uf}.txt")
+    return names
+
+
+class ValueFactory:
+    "Create random (but TSE-like) values based on the final field names"
+
+    def __init__(self, seed=42):
+        self.random = random.Random(seed)
+        self.integer_fields = read_integer_fields()
+        self.situacoes = read_situacoes()
+        self.cargos = sorted(MAP_DESCRICAO_CARGO)
+
+    def person_name(self):
+        choice = self.random.choice
+        return f"{choice(FIRST_NAMES)} {choice(LAST_NAMES)}"
+
+    def date(self):
+        randint = self.random.randint
+        day, month, year = randint(1, 28), randint(1, 12), randint(1930, 2022)
+        style = randint(0, 3)
+        if style == 0:
+            return f"{day:02d}/{month:02d}/{year}"
+        elif style == 1:
+            return f"{day}/{month}/{year}"
+        elif style == 2:
+            return f"{day:02d}/{month:02d}/{year % 100:02d}"
+        return f"{day:02d}-{MONTHS[month - 1]}-{year % 100:02d}"
+
+    def digits(self, size):
+        return "".join(self.random.choice("0123456789") for _ in range(size))
+
+    def cpf(self):
+        value = self.digits(11)
+        if self.random.random() < 0.5:
+            return f"{value[:3]}.{value[3:6]}.{value[6:9]}-{value[9:]}"
+        return value
+
+    def value(self, name, year, uf):
+        rand = self.random.random()
+        if name == "ano":
+            return str(year).split("_")[0]
+        elif rand < 0.02 and name not in ("nome", "cargo"):
+            return self.random.choice(NULL_VALUES)
+        elif name.startswith("data"):
+            return self.date()
+        elif name.startswith("cpf_cnpj"):
+            return self.cpf() if rand < 0.5 else self.digits(14)
+        elif name.startswith("cpf"):
+            return self.cpf()
+        elif name.startswith("cnpj"):
+            return self.digits(14)
+        elif name == "titulo_eleitoral":
+            return self.digits(12)
+        elif name == "sigla_unidade_federativa":
+            return uf
+        elif name.startswith("sigla_unidade_federativa") or name == "sigla_uf":
+            return self.random.choice(UFS)
+        elif name == "nome":
+            # Some names start with characters removed by `fix_nome`
+            prefix = "'" if rand < 0.05 else ""
+            return prefix + self.person_name()
+        elif name in ("nome_urna", "nome_social", "administrador") or name.startswith(
+            ("doador", "fornecedor")
+        ):
+            return self.person_name()
+        elif name == "email":
+            return f"candidato{self.random.randint(1, 99999)}@example.com"
+        elif name in ("valor", "despesa_maxima_campanha"):
+            return f"{self.random.randint(1, 999999)},{self.random.randint(0, 99):02d}"
+        elif name == "candidatura_inserida_urna":
+            return self.random.choice(("SIM", "NÃO"))
+        elif (
+            name in self.integer_fields
+            or name.startswith(("codigo_", "numero_"))
+            or name.startswith("idade")
+        ):
+            return str(self.random.randint(1, 99999))
+        return self.random.choice(WORDS)
+
+    def row(self, field_names, year, uf):
+        "Values for `field_names` (final names; other names get random words)"
+
+        data = {name: self.value(name, year, uf) for name in field_names}
+        if "cargo" in data:
+            data["cargo"] = self.random.choice(self.cargos)
+        if "codigo_situacao_candidatura" in data and "situacao_candidatura" in data:
+            (
+                data["codigo_situacao_candidatura"],
+                data["situacao_candidatura"],
+            ) = self.random.choice(self.situacoes)
+        return [data[name] for name in field_names]
+
+
+def format_line(values, outer_quotes=True, wrong_quotes=None):
+    """Create a `;`-separated line with all values quoted
+
+    `wrong_quotes` is the index of a value which has quotes not escaped (as in
+    some TSE files).
+    """
+
+    values = [
+        value if index == wrong_quotes else value.replace('"', '""')
+        for index, value in enumerate(values)
+    ]
+    line = '";"'.join(values)
+    return (f'"{line}"' if outer_quotes else line) + "\r\n"
+
+
+def create_member(extractor, dataset, year, archive_filename, internal_filename,
+        factory, rows_count, wrong_quotes_every):
+    uf = extractor.extract_state_from_filename(internal_filename.split("/")[-1])
+    if uf not in UFS:
+        uf = internal_filename.split("/")[0]
+    header_meta = extractor.get_headers(year, archive_filename, internal_filename)
+    header = [field.nome_tse for field in header_meta["year_fields"]]
+    field_names = [
+        field.nome_final or field.nome_tse for field in header_meta["year_fields"]
+    ]
+    prestacao = dataset in ("receita", "despesa")
+    if prestacao:
+        has_header = any(token in header for token in PRESTACAO_HEADER_TOKENS)
+    else:
+        has_header = "ANO_ELEICAO" in header
+
+    lines = [format_line(header)] if has_header else []
+    outer_quotes = year not in NO_OUTER_QUOTES_YEARS or not prestacao
+    nome = field_names.index("nome") if "nome" in field_names else None
+    for index in range(rows_count):
+        values = factory.row(field_names, year, uf)
+        wrong_quotes = None
+        if (
+            dataset == "candidatura"
+            and wrong_quotes_every
+            and nome not in (None, 0, len(values) - 1)
+            and index % wrong_quotes_every == wrong_quotes_every - 1
+        ):
+            first, rest = values[nome].lstrip("'").split(" ", 1)
+            values[nome] = f'{first} "{first[:3]}" {rest}'
+            wrong_quotes = nome
+        lines.append(format_line(values, outer_quotes, wrong_quotes))
+    return "".join(lines).encode(extractor.encoding)
+
+
+def create_archive(path, dataset, year, rows_count=10000, ufs=UFS, seed=42,
+        wrong_quotes_every=1000):
+    """Create (or update) the archive for `dataset` and `year` inside `path`
+
+    Receitas and despesas share the same archive, so the members of the other
+    dataset are kept.
+    """
+
+    extractor = DATASETS[dataset]()
+    filename = Path(path) / extractor.filename(year)
+    filename.parent.mkdir(parents=True, exist_ok=True)
+    factory = ValueFactory(seed=f"{seed}-{dataset}-{year}")
+    members = {}
+    if filename.exists():
+        with ZipFile(filename) as zfile:
+            members = {name: zfile.read(name) for name in zfile.namelist()}
+    for internal_filename in member_names(dataset, year, ufs):
+        members[internal_filename] = create_member(
+            extractor,
+            dataset,
+            year,
+            filename,
+            internal_filename,
+            factory,
+            rows_count,
+            wrong_quotes_every,
+        )
+    with ZipFile(filename, mode="w", compression=ZIP_DEFLATED) as zfile:
+        for internal_filename, data in members.items():
+            zfile.writestr(internal_filename, data)
+    return filename
+
+
+def create_archives(path, datasets=None, rows_count=10000, ufs=UFS, seed=42):
+    "Create the archives for all layouts, returning (dataset, year, filename)"
+
+    result = []
+    for dataset in datasets or DATASETS:
+        for year in YEARS[dataset]:
+            filename = create_archive(
+                path, dataset, year, rows_count=rows_count, ufs=ufs, seed=seed
+            )
+            result.append((dataset, year, filename))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path", help="Where to save the archives (like data/download)")
+    parser.add_argument("--rows", type=int, default=10000, help="Rows per member")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--dataset", action="append", choices=list(DATASETS.keys()))
+    args = parser.parse_args()
+
+    started = datetime.datetime.now()
+    for dataset, year, filename in create_archives(
+        args.path, datasets=args.dataset, rows_count=args.rows, seed=args.seed
+    ):
+        print(f"{dataset:>14} {year!s:>16}: {filename}")
+    print(f"Done in {(datetime.datetime.now() - started).total_seconds():.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+"""Segmented and resumable HTTP downloads
+
+Files are downloaded in segments (in parallel, using HTTP `Range` requests)
+into a `<filename>.part` file; the progress of each segment is saved in
+`<filename>.part.json`, so an interrupted download continues from where it
+stopped (if the remote file did not change).
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from pathlib import Path
+
+import requests
+from tqdm import tqdm
+
+
+# A dropped connection loses the data of an incomplete chunk
+CHUNK_SIZE = 64 * 1024
+MIN_SEGMENT_SIZE = 8 * 1024 * 1024
+USER_AGENT = "Mozilla/4"
+
+
+def parse_sha512sums(data):
+    "Parse a `sha512sum`-like file contents into a dict (filename -> checksum)"
+
+    checksums = {}
+    for line in data.splitlines():
+        if line.strip():
+            checksum, name = line.strip().split(maxsplit=1)
+            checksums[name.lstrip("*")] = checksum.lower()
+    return checksums
+
+
+def read_sha512sums(filename):
+    filename = Path(filename)
+    if not filename.exists():
+        return {}
+    with open(filename) as fobj:
+        return parse_sha512sums(fobj.read())
+
+
+def file_sha512(filename, chunk_size=1024 * 1024):
+    hasher = hashlib.sha512()
+    with open(filename, mode="rb") as fobj:
+        for chunk in iter(lambda: fobj.read(chunk_size), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+class Download:
+    """Download `url` to `filename` in `segments` parallel `Range` requests
+
+    If the server does not accept `Range` requests the file is downloaded in
+    one request (and can't be resumed). Each segment is retried (continuing
+    from the last byte received) up to `retries` times in a row without
+    receiving any data.
+    """
+
+    def __init__(self, url, filename, expected_sha512=None, segments=4,
+            retries=5, timeout=60, backoff=1, progress=False):
+        self.url = url
+        self.filename = Path(filename)
+        self.part_filename = self.filename.with_name(self.filename.name + ".part")
+        self.state_filename = self.filename.with_name(self.filename.name + ".part.json")
+        self.expected_sha512 = expected_sha512
+        self.segments = segments
+        self.retries = retries
+        self.timeout = timeout
+        self.backoff = backoff
+        self.progress = progress
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = USER_AGENT
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.progress_bar = None
+
+    def remote_info(self):
+        "Probe the remote file size, `Range` support and version (ETag etc.)"
+
+        response = self.session.get(
+            self.url, headers={"Range": "bytes=0-0"}, stream=True, timeout=self.timeout
+        )
+        response.close()
+        response.raise_for_status()
+        validator = response.headers.get("ETag") or response.headers.get("Last-Modified")
+        content_range = response.headers.get("Content-Range", "")
+        if response.status_code == 206 and "/" in content_range:
+            size = content_range.split("/")[-1]
+            if size.isdigit():
+                return {"size": int(size), "ranges": True, "validator": validator}
+        size = response.headers.get("Content-Length")
+        return {
+            "size": int(size) if size and size.isdigit() else None,
+            "ranges": False,
+            "validator": validator,
+        }
+
+    def load_state(self, info):
+        "Return the saved segments if they refer to the same remote file"
+
+        if not (self.state_filename.exists() and self.part_filename.exists()):
+            return None
+        with open(self.state_filename) as fobj:
+            state = json.load(fobj)
+        if (
+            state.get("url") != self.url
+            or state.get("size") != info["size"]
+            or state.get("validator") != info["validator"]
+            or self.part_filename.stat().st_size != info["size"]
+        ):
+            return None
+        return state
+
+    def create_state(self, info):
+        size = info["size"]
+        count = max(1, min(self.segments, size // MIN_SEGMENT_SIZE))
+        segment_size = -(-size // count)  # Ceiling division
+        # Each segment is [start, end (inclusive), next position to download]
+        segments = [
+            [start, min(start + segment_size, size) - 1, start]
+            for start in range(0, size, segment_size)
+        ]
+        with open(self.part_filename, mode="wb") as fobj:
+            fobj.truncate(size)
+        return {
+            "url": self.url,
+            "size": size,
+            "validator": info["validator"],
+            "segments": segments,
+        }
+
+    def save_state(self, state):
+        with self.lock:
+            data = json.dumps(state)
+        temp_filename = self.state_filename.with_name(self.state_filename.name + ".tmp")
+        with open(temp_filename, mode="w") as fobj:
+            fobj.write(data)
+        os.replace(temp_filename, self.state_filename)
+
+    def update_progress(self, size):
+        if self.progress_bar is not None:
+            with self.lock:
+                self.progress_bar.update(size)
+
+    def fetch_segment(self, segment):
+        start, end, position = segment
+        response = self.session.get(
+            self.url,
+            headers={"Range": f"bytes={position}-{end}"},
+            stream=True,
+            timeout=self.timeout,
+        )
+        with response:
+            if response.status_code != 206:
+                raise requests.HTTPError(
+                    f"Expected HTTP 206 for {self.url}, got {response.status_code}"
+                )
+            # Unbuffered, so the saved positions never get ahead of the data
+            with open(self.part_filename, mode="r+b", buffering=0) as fobj:
+                fobj.seek(position)
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    if self.stopped.is_set():
+                        break
+                    chunk = chunk[: end + 1 - segment[2]]
+                    fobj.write(chunk)
+                    with self.lock:
+                        segment[2] += len(chunk)
+                    self.update_progress(len(chunk))
+                    if segment[2] > end:
+                        break
+
+    def download_segment(self, segment):
+        failures = 0
+        while segment[2] <= segment[1] and not self.stopped.is_set():
+            position = segment[2]
+            try:
+                self.fetch_segment(segment)
+            except (requests.ConnectionError, requests.Timeout,
+                    requests.exceptions.ChunkedEncodingError):
+                pass
+            if segment[2] > segment[1] or self.stopped.is_set():
+                break
+            failures = failures + 1 if segment[2] == position else 1
+            if failures > self.retries:
+                raise RuntimeError(
+                    f"Could not download {self.url} (bytes {segment[2]}-{segment[1]})"
+                )
+            time.sleep(self.backoff * 2 ** (failures - 1))
+
+    def download_segments(self, state):
+        with ThreadPoolExecutor(max_workers=len(state["segments"])) as executor:
+            futures = [
+                executor.submit(self.download_segment, segment)
+                for segment in state["segments"]
+            ]
+            try:
+                not_done = futures
+                while not_done:
+                    done, not_done = wait(not_done, timeout=1, return_when=FIRST_EXCEPTION)
+                    self.save_state(state)
+                    for future in done:
+                        future.result()  # Raise the exception, if any
+            except BaseException:
+                # Make the other segments stop as soon as possible
+                self.stopped.set()
+                raise
+            finally:
+                executor.shutdown()
+                self.save_state(state)
+
+    def download_whole(self):
+        for attempt in range(self.retries + 1):
+            if self.progress_bar is not None:
+                self.progress_bar.reset()
+            try:
+                response = self.session.get(self.url, stream=True, timeout=self.timeout)
+                response.raise_for_status()
+                with response, open(self.part_filename, mode="wb") as fobj:
+                    for chunk in response.iter_content(CHUNK_SIZE):
+                        fobj.write(chunk)
+                        self.update_progress(len(chunk))
+                return
+            except (requests.ConnectionError, requests.Timeout,
+                    requests.exceptions.ChunkedEncodingError):
+                if attempt == self.retries:
+                    raise
+                time.sleep(self.backoff * 2 ** attempt)
+
+    def run(self):
+        info = self.remote_info()
+        if self.progress:
+            self.progress_bar = tqdm(
+                total=info["size"], unit="B", unit_scale=True, unit_divisor=1024,
+                desc=self.filename.name,
+            )
+        try:
+            if info["ranges"] and info["size"]:
+                state = self.load_state(info)
+                if state is not None:  # Resume the last download
+                    self.update_progress(
+                        sum(position - start for start, _, position in state["segments"])
+                    )
+                else:
+                    state = self.create_state(info)
+                self.save_state(state)
+                self.download_segments(state)
+            else:
+                self.download_whole()
+        finally:
+            if self.progress_bar is not None:
+                self.progress_bar.close()
+
+        if self.expected_sha512 is not None:
+            checksum = file_sha512(self.part_filename)
+            if checksum != self.expected_sha512.lower():
+                self.part_filename.unlink()
+                if self.state_filename.exists():
+                    self.state_filename.unlink()
+                raise ValueError(
+                    f"SHA-512 mismatch for {self.url}: expected "
+                    f"{self.expected_sha512}, got {checksum}"
+                )
+        os.replace(self.part_filename, self.filename)
+        if self.state_filename.exists():
+            self.state_filename.unlink()
+        return self.filename
+
+
+def download(url, filename, expected_sha512=None, **kwargs):
+    "Download `url` to `filename` (see `Download` for the options)"
+
+    return Download(url, filename, expected_sha512=expected_sha512, **kwargs).run()
@@ -0,0 +1,123 @@
+"""Join the finance files (receita/despesa) with candidatura
+
+`CandidaturaTable` loads only the projected columns of `candidatura.csv.gz`
+into a dict keyed by `(ano, numero_sequencial)` - repeated values (gender,
+occupation etc.) are interned, so they're stored once. The finance files are
+then streamed through it, so the memory used depends only on the candidatura
+side.
+"""
+
+import csv
+import sys
+import time
+
+from rows.utils import open_compressed
+
+import writers
+
+
+# Candidatura columns added to the finance rows (as `candidatura_<name>`)
+DEFAULT_COLUMNS = (
+    "nome_urna",
+    "numero_urna",
+    "genero",
+    "data_nascimento",
+    "grau_instrucao",
+    "ocupacao",
+    "etnia",
+    "titulo_eleitoral",
+    "situacao_candidatura",
+    "totalizacao_turno",
+)
+PREFIX = "candidatura_"
+
+
+def join_key(ano, numero_sequencial):
+    """
+    >>> join_key("2018", "0250000601232")
+    ('2018', '250000601232')
+    """
+    return sys.intern(ano), numero_sequencial.lstrip("0")
+
+
+class CandidaturaTable:
+    """Projected candidatura rows by `(ano, numero_sequencial)`
+
+    If a candidacy has more than one row (one per `turno`, in some years), the
+    row of the last `turno` is kept.
+    """
+
+    def __init__(self, filename, columns=DEFAULT_COLUMNS):
+        self.columns = list(columns)
+        self.data = {}
+        self.duplicates = 0
+        intern = sys.intern
+        with open_compressed(filename, mode="r", encoding="utf-8") as fobj:
+            reader = csv.reader(fobj)
+            field_names = next(reader)
+            unknown = set(self.columns) - set(field_names)
+            if unknown:
+                raise ValueError(f"Fields not in candidatura: {', '.join(sorted(unknown))}")
+            ano = field_names.index("ano")
+            numero_sequencial = field_names.index("numero_sequencial")
+            turno = field_names.index("turno")
+            positions = [field_names.index(column) for column in self.columns]
+            data = self.data
+            for row in reader:
+                if not row[numero_sequencial]:
+                    continue
+                key = join_key(row[ano], row[numero_sequencial])
+                row_turno = int(row[turno] or 0)
+                previous = data.get(key)
+                if previous is not None:
+                    self.duplicates += 1
+                    if previous[0] > row_turno:
+                        continue
+                data[key] = (row_turno, tuple(intern(row[position]) for position in positions))
+
+    def __len__(self):
+        return len(self.data)
+
+    def get(self, ano, numero_sequencial):
+        "Projected values (tuple) or `None`"
+        value = self.data.get(join_key(ano, numero_sequencial))
+        return value[1] if value is not None else None
+
+
+def enrich_file(table, input_filename, output_filename, unmatched_filename,
+        compresslevel=writers.DEFAULT_COMPRESSION_LEVEL, threads=None):
+    """Add `table` columns to the rows of `input_filename`
+
+    Rows with a candidacy are written to `output_filename` (with the
+    `candidatura_*` columns at the end) and the others (including rows from
+    parties and committees) to `unmatched_filename`, as they are.
+    """
+    start = time.time()
+    matched = unmatched = 0
+    with open_compressed(input_filename, mode="r", encoding="utf-8") as fobj:
+        reader = csv.reader(fobj)
+        field_names = next(reader)
+        ano = field_names.index("ano")
+        numero_sequencial = field_names.index("numero_sequencial")
+        output = writers.CsvWriter(
+            output_filename,
+            field_names + [PREFIX + column for column in table.columns],
+            compresslevel=compresslevel,
+            threads=threads,
+        )
+        unmatched_output = writers.CsvWriter(
+            unmatched_filename, field_names, compresslevel=compresslevel, threads=threads
+        )
+        get, writerow, write_unmatched = table.get, output.writerow, unmatched_output.writerow
+        for row in reader:
+            values = get(row[ano], row[numero_sequencial])
+            if values is None:
+                write_unmatched(row)
+                unmatched += 1
+            else:
+                row.extend(values)
+                writerow(row)
+                matched += 1
+        output.close()
+        unmatched_output.close()
+    return {"matched": matched, "unmatched": unmatched, "elapsed": time.time() - start}
@@ -1,18 +1,28 @@
 import csv
 import datetime
+import itertools
+import os
 import re
-from functools import lru_cache
-from io import StringIO, TextIOWrapper
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache, partial
+from operator import itemgetter
+from io import TextIOWrapper
 from pathlib import Path
-from shutil import move as rename_file
 from urllib.parse import urljoin
 from zipfile import ZipFile
 
 import rarfile
 import rows
 from cached_property import cached_property
-from rows.utils import download_file, load_schema
+from rows.utils import load_schema
 
+import downloader
+import layouts
+import profiling
 import utils
 import settings
 
@@ -21,6 +31,13 @@ import settings
 
 REGEXP_NUMBERS = re.compile("([0-9]+)")
 REGEXP_WRONGQUOTE = re.compile(r';"([^;\r\n]+"[^;\r\n]*)";')
+# Same as `strptime` accepts for "%d/%m/%Y" (but only ASCII digits)
+REGEXP_BR_DATE = re.compile(
+    "(3[01]|[12][0-9]|0[1-9]|[1-9]| [1-9])/(1[0-2]|0[1-9]|[1-9])/([0-9]{4})"
+)
+DATE_FORMATS = ("%d/%m/%Y", "%d/%m/%y", "%d-%b-%y")
+# Commands which write a RAR member to stdout (the first one installed is used)
+RAR_COMMANDS = (("unrar", "p", "-inul"), ("bsdtar", "-xOf"))
 MAP_CODIGO_CARGO = {
     "PRESIDENTE": "1",
     "VICE-PRESIDENTE": "2",
@@ -177,7 +194,7 @@ def fix_data(value):
     if not value:
         return None
 
-    possible_date_formats = ("%d/%m/%Y", "%d/%m/%y", "%d-%b-%y")
+    possible_date_formats = DATE_FORMATS
     dt = None
     for date_format in possible_date_formats:
         try:
@@ -189,6 +206,10 @@ def fix_data(value):
         # ou gravar valor em outra coluna
         return None
 
+    return format_date(dt)
+
+
+def format_date(dt):
     result = dt.strftime("%Y-%m-%d")
     if len(result) == 9 and re.match("^9[0-9]{2}-", result):
         # Corrige valores como: '941-09-03', '942-08-23', '955-12-13',
@@ -201,10 +222,115 @@ def fix_data(value):
     return result
 
 
+def date_normalizer(cache_size=16384):
+    """Create a function which normalizes dates exactly like `fix_data`
+
+    Should be created once per column of each file: the results are cached
+    (dates repeat a lot), `dd/mm/yyyy` dates are parsed without `strptime`
+    and, for the other ones, the format which worked last time is tried
+    first. `fix_data` tries every format, but since they can't match the
+    same value, stopping at the first one gives the same result.
+
+    >>> fix = date_normalizer()
+    >>> fix("03/09/0941"), fix("1/2/1970 00:00:00"), fix("31/02/2000")
+    ('1941-09-03', '1970-02-01', None)
+    >>> fix("15-JAN-98"), fix("01/02/03"), fix("")
+    ('1998-01-15', '2003-02-01', None)
+    """
+
+    date_formats = list(DATE_FORMATS)
+
+    def normalize(value):
+        value = value.replace("00:00:00", "").replace("0002", "2002").strip()
+        if not value:
+            return None
+
+        match = REGEXP_BR_DATE.fullmatch(value)
+        if match is not None:
+            day, month, year = match.groups()
+            year = int(year)
+            if year >= 1000:  # Other years depend on `strftime` (see below)
+                try:
+                    dt = datetime.date(year, int(month), int(day))
+                except ValueError:
+                    return None
+                return f"{year}-{dt.month:02d}-{dt.day:02d}"
+
+        for date_format in date_formats:
+            try:
+                dt = datetime.datetime.strptime(value, date_format)
+            except ValueError:
+                continue
+            if date_format != date_formats[0]:
+                date_formats.remove(date_format)
+                date_formats.insert(0, date_format)
+            return format_date(dt)
+
+        return None
+
+    return lru_cache(maxsize=cache_size)(normalize)
+
+
+def fix_wrong_quotes(line):
+    "Escape double quotes which are inside a field but were not doubled"
+
+    return REGEXP_WRONGQUOTE.sub(_escape_wrong_quotes, line)
+
+
+def _escape_wrong_quotes(match):
+    value = match.group(1)
+    if any('"' in part for part in value.split('""')):
+        value = value.replace('"', '""')
+    return f';"{value}";'
+
+
 def clean_header(header):
     return re.sub('"', "", header.strip())
 
 
+def row_selector(row_field_names, final_field_names, output_field_names):
+    """Create a function which picks the raw values for each output field
+
+    It's the same as creating `dict(zip(row_field_names, row))` and getting
+    each one of `output_field_names` from it (fields not in `final_field_names`
+    or missing in the row are filled with an empty string), but the column
+    positions are computed only once per header layout.
+    """
+
+    unknown = [name for name in final_field_names if name not in output_field_names]
+    if unknown:
+        raise ValueError(f"Fields not in schema: {', '.join(unknown)}")
+
+    width = len(row_field_names)
+    positions = {name: index for index, name in enumerate(row_field_names)}
+    final_field_names = set(final_field_names)
+    getter = itemgetter(
+        *[
+            positions.get(name, width) if name in final_field_names else width
+            for name in output_field_names
+        ]
+    )
+    padding, empty = [""] * width, [""]
+    # With a repeated name, a short row may not have its last position
+    short_selectors = {} if len(positions) < width else None
+
+    def select(row):
+        if len(row) != width:
+            if short_selectors is not None and len(row) < width:
+                # Only the names in the row count (as in `dict(zip(...))`)
+                size = len(row)
+                if size not in short_selectors:
+                    short_selectors[size] = row_selector(
+                        row_field_names[:size], final_field_names, output_field_names
+                    )
+                return short_selectors[size](row)
+            row = (row + padding)[:width]
+        # Position `width` is used for the fields which are not in the row
+        return getter(row + empty)
+
+    return select
+
+
 def get_organization(internal_filename, year):
     if year == 2010:
         if "Receitas" in internal_filename:
@@ -229,16 +355,62 @@ def get_organization(internal_filename, year):
         return origin + cand_or_party
 
 
+@contextmanager
+def open_rar_member(filename, internal_filename):
+    """Stream a RAR archive member from `unrar p` (or `bsdtar -xOf`) output
+
+    Nothing is written to disk and only one process exists per member being
+    read. If none of `RAR_COMMANDS` is installed, `rarfile` is used.
+    """
+    for command in RAR_COMMANDS:
+        executable = shutil.which(command[0])
+        if executable is not None:
+            break
+    else:
+        with rarfile.RarFile(str(filename)) as archive:
+            with archive.open(internal_filename) as fobj:
+                yield fobj
+        return
+
+    process = subprocess.Popen(
+        [executable, *command[1:], str(filename), internal_filename],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    completed = False
+    try:
+        yield process.stdout
+        completed = True
+    finally:
+        # If the member was not read until the end, closing the pipe makes
+        # the process exit
+        process.stdout.close()
+        error = process.stderr.read().decode("utf-8", errors="replace").strip()
+        process.stderr.close()
+        returncode = process.wait()
+    if completed and returncode != 0:
+        raise RuntimeError(
+            f"Could not extract '{internal_filename}' from '{filename}' "
+            f"({command[0]} exited with {returncode}: {error})"
+        )
+
+
 class Extractor:
 
     base_url = "http://cdn.tse.jus.br/estatistica/sead/odsele/"
     encoding = "latin-1"
     schema_filename = ""
+    header_prefix = ""
+    null_values = ("#NULO", "#NULO#", "#NE#", "#NE")
 
-    def __init__(self, base_url=None, censor=False):
+    def __init__(self, base_url=None, censor=False, jobs=1, fast_normalization=False,
+            profiler=None):
         if base_url is not None:
             self.base_url = base_url
         self.censor = censor
+        self.jobs = jobs
+        self.fast_normalization = fast_normalization
+        self.profiler = profiler or profiling.NULL_PROFILER
 
     def filename(self, year):
         """Caminho para arquivo de um ano, que será juntado com self.base_url"""
@@ -254,18 +426,83 @@ class Extractor:
     def schema(self):
         return load_schema(str(self.schema_filename))
 
-    def download(self, year, force=False):
+    def input_filenames(self):
+        "Schema and header files which may change the extracted data"
+        return [Path(self.schema_filename)] + sorted(
+            settings.HEADERS_PATH.glob(f"{self.header_prefix}_*.csv")
+        )
+
+    @cached_property
+    def output_fields(self):
+        "Field names (in the order they're yielded by `extract`)"
+        return list(self.schema.keys())
+
+    def row_selector(self, row_field_names, final_field_names):
+        return row_selector(row_field_names, final_field_names, self.output_fields)
+
+    def values_cleaner(self, normalized=False):
+        """Create the function which strips, removes nulls and normalizes values
+
+        If `normalized` is `True`, the values come from lines already
+        translated by `normalize_fobj` and only the ones which are not ASCII
+        need to be unaccented and uppercased (the result is the same).
+        """
+
+        null_values = self.null_values
+        unaccent = utils.unaccent
+        if normalized:
+            def clean(values):
+                return [
+                    "" if value in null_values
+                    else value if value.isascii()
+                    else unaccent(value).upper()
+                    for value in map(str.strip, values)
+                ]
+
+        else:
+            def clean(values):
+                return [
+                    "" if value in null_values else unaccent(value).upper()
+                    for value in map(str.strip, values)
+                ]
+
+        return clean
+
+    def normalize_fobj(self, fobj):
+        """Unaccent and uppercase all lines but the first one (may be a header)
+
+        Translating whole lines before they're parsed is much faster than
+        normalizing each field; use `values_cleaner(normalized=True)` for the
+        rows read from the new file-like object.
+        """
+
+        first_line = fobj.readline()
+        function = utils.unaccent_upper_function(self.null_values)
+        return itertools.chain([first_line], utils.LineFilter(fobj, function))
+
+    def download(self, year, force=False, progress=True):
+        """Download the file for `year` (resuming a previous download, if any)
+
+        The file is checked against `data/download/SHA512SUMS`, if it's listed.
+        """
         filename = self.download_filename(year)
         if not filename.parent.exists():
-            filename.parent.mkdir(parents=True)
+            filename.parent.mkdir(parents=True, exist_ok=True)
         if not force and filename.exists():  # File has already been downloaded
             return {"downloaded": False, "filename": filename}
 
-        url = self.url(year)
-        file_data = download_file(url, progress=True, chunk_size=256 * 1024, user_agent="Mozilla/4")
-        rename_file(file_data.uri, filename)
+        checksums = downloader.read_sha512sums(settings.DOWNLOAD_PATH / "SHA512SUMS")
+        downloader.download(
+            self.url(year),
+            filename,
+            expected_sha512=checksums.get(self.filename(year)),
+            progress=progress,
+        )
         return {"downloaded": True, "filename": filename}
 
+    def _convert_row(self, *args, **kwargs):
+        return self.profiler.wrap_function(self.convert_row(*args, **kwargs), "convert")
+
     def extract_state_from_filename(self, filename):
         """ 'bem_candidato_2006_AC.csv' -> 'AC' """
         return filename.split(".")[0].split("_")[-1]
@@ -277,47 +514,110 @@ class Extractor:
     def extract(self, year):
         filename = self.download_filename(year)
         zfile = ZipFile(filename)
-        for file_info in zfile.filelist:
-            internal_filename = file_info.filename
-            if not self.valid_filename(internal_filename):
+        internal_filenames = [
+            file_info.filename
+            for file_info in zfile.filelist
+            if self.valid_filename(file_info.filename)
+        ]
+        # The stages of the members extracted by other processes can't be timed
+        if self.jobs > 1 and len(internal_filenames) > 1 and not self.profiler.enabled:
+            yield from self.extract_parallel(year, filename, internal_filenames)
+            return
+
+        for internal_filename in internal_filenames:
+            yield from self.extract_member(year, filename, zfile, internal_filename)
+
+    def extract_parallel(self, year, filename, internal_filenames):
+        """Extract archive members in a process pool, keeping members order
+
+        Each worker converts one member into a temporary CSV file, which is
+        then read back (and deleted) in the same order as `internal_filenames`.
+        """
+        with tempfile.TemporaryDirectory(dir=settings.DATA_PATH) as temp_path, \
+                ProcessPoolExecutor(max_workers=self.jobs) as executor:
+            futures = []
+            for index, internal_filename in enumerate(internal_filenames):
+                temp_filename = os.path.join(temp_path, f"{index:04d}.csv")
+                future = executor.submit(
+                    extract_member_to_file,
+                    self,
+                    year,
+                    filename,
+                    internal_filename,
+                    temp_filename,
+                )
+                futures.append((future, temp_filename))
+
+            for future, temp_filename in futures:
+                future.result()
+                with open(temp_filename, encoding="utf-8", newline="") as fobj:
+                    yield from csv.reader(fobj)
+                os.unlink(temp_filename)
+
+    def extract_member(self, year, filename, zfile, internal_filename):
+        profiler = self.profiler
+        profiler.start_member(year, internal_filename)
+        fobj = profiler.wrap_file(zfile.open(internal_filename), "inflate")
+        fobj = profiler.wrap_file(TextIOWrapper(fobj, encoding=self.encoding), "decode")
+        fobj = profiler.wrap_file(self.fix_fobj(fobj), "fix")
+        normalized = self.fast_normalization
+        if normalized:
+            fobj = profiler.wrap_iterator(self.normalize_fobj(fobj), "normalize")
+        reader = profiler.wrap_iterator(
+            csv.reader(fobj, dialect=utils.TSEDialect), "parse"
+        )
+        header_meta = self.get_headers(year, filename, internal_filename)
+        year_fields = [
+            field.nome_final or field.nome_tse
+            for field in header_meta["year_fields"]
+        ]
+        final_fields = [
+            field.nome_final
+            for field in header_meta["final_fields"]
+            if field.nome_final
+        ]
+        convert_function = self._convert_row(year_fields, final_fields)
+        for index, row in enumerate(reader):
+            if index == 0 and "ANO_ELEICAO" in row:
+                # It's a header, we should skip it as a data row but
+                # use the information to get field ordering (better
+                # trust it then our headers files, TSE may change the
+                # order)
+                field_map = {
+                    field.nome_tse: field.nome_final or field.nome_tse
+                    for field in header_meta["year_fields"]
+                }
+                year_fields = [field_map[field_name] for field_name in row]
+                convert_function = self._convert_row(
+                    year_fields, final_fields, normalized=normalized
+                )
                 continue
-            fobj = TextIOWrapper(zfile.open(internal_filename), encoding=self.encoding)
-            fobj = self.fix_fobj(fobj)
-            reader = csv.reader(fobj, dialect=utils.TSEDialect)
-            header_meta = self.get_headers(year, filename, internal_filename)
-            year_fields = [
-                field.nome_final or field.nome_tse
-                for field in header_meta["year_fields"]
-            ]
-            final_fields = [
-                field.nome_final
-                for field in header_meta["final_fields"]
-                if field.nome_final
-            ]
-            convert_function = self.convert_row(year_fields, final_fields)
-            for index, row in enumerate(reader):
-                if index == 0 and "ANO_ELEICAO" in row:
-                    # It's a header, we should skip it as a data row but
-                    # use the information to get field ordering (better
-                    # trust it then our headers files, TSE may change the
-                    # order)
-                    field_map = {
-                        field.nome_tse: field.nome_final or field.nome_tse
-                        for field in header_meta["year_fields"]
-                    }
-                    year_fields = [field_map[field_name] for field_name in row]
-                    convert_function = self.convert_row(year_fields, final_fields)
-                    continue
 
-                data = convert_function(row)
-                if data is not None:
-                    yield data
+            data = convert_function(row)
+            if index == 0 and normalized:
+                # Only the lines after the first one were normalized
+                convert_function = self._convert_row(
+                    year_fields, final_fields, normalized=True
+                )
+            if data is not None:
+                yield data
+
+
+def extract_member_to_file(extractor, year, filename, internal_filename, output_filename):
+    """Convert one archive member into a CSV file (runs in a worker process)"""
+    zfile = ZipFile(filename)
+    with open(output_filename, mode="w", encoding="utf-8", newline="") as fobj:
+        writer = csv.writer(fobj)
+        writer.writerows(
+            extractor.extract_member(year, filename, zfile, internal_filename)
+        )
 
 
 class CandidaturaExtractor(Extractor):
 
     year_range = tuple(range(1996, last_elections_year() + 1, 2))
     schema_filename = settings.SCHEMA_PATH / "candidatura.csv"
+    header_prefix = "candidatura"
 
     def filename(self, year):
         return f"consulta_cand/consulta_cand_{year}.zip"
@@ -337,14 +637,12 @@ class CandidaturaExtractor(Extractor):
         - consulta_cand_2000_RS.txt
         - consulta_cand_2008_PR.txt
         - consulta_cand_2008_SP.txt
-        """
 
-        text = fobj.read()
-        for fix in REGEXP_WRONGQUOTE.findall(text):
-            if any('"' in part for part in fix.split('""')):
-                text = text.replace(fix, fix.replace('"', '""'))
+        The file is fixed line by line while it's read, so memory usage does
+        not depend on the file size.
+        """
 
-        return StringIO(text)
+        return utils.LineFilter(fobj, fix_wrong_quotes)
 
     def get_headers(self, year, filename, internal_filename):
         uf = self.extract_state_from_filename(internal_filename)
@@ -373,36 +671,45 @@ class CandidaturaExtractor(Extractor):
             ),
         }
 
-    def convert_row(self, row_field_names, final_field_names):
+    def convert_row(self, row_field_names, final_field_names, normalized=False):
         censor = self.censor
+        select = self.row_selector(row_field_names, final_field_names)
+        clean = self.values_cleaner(normalized)
+        position = self.output_fields.index
+        cpf, nome, email = position("cpf"), position("nome"), position("email")
+        sigla_uf = position("sigla_unidade_federativa")
+        sigla_uf_nascimento = position("sigla_unidade_federativa_nascimento")
+        titulo_eleitoral = position("titulo_eleitoral")
+        codigo_cargo, cargo = position("codigo_cargo"), position("cargo")
+        pergunta = position("pergunta")
+        candidatura_inserida_urna = position("candidatura_inserida_urna")
+        data_eleicao = position("data_eleicao")
+        data_nascimento = position("data_nascimento")
+        fix_data_eleicao = date_normalizer()
+        fix_data_nascimento = date_normalizer()
+
         def convert(row_data):
             if len(row_data) == 1 and "elapsed" in row_data[0].lower():
                 return None
 
-            row = dict(zip(row_field_names, row_data))
-            new = {}
-            for key in final_field_names:
-                value = row.get(key, "").strip()
-                if value in ("#NULO", "#NULO#", "#NE#", "#NE"):
-                    value = ""
-                new[key] = value = utils.unaccent(value).upper()
+            new = clean(select(row_data))
 
             # TODO: fix data_nascimento (dd/mm/yyyy, dd/mm/yy, yyyymmdd, xx/xx/)
             # TODO: fix situacao
             # TODO: fix totalizacao
-            new["cpf"] = fix_cpf(new["cpf"])
-            new["nome"] = fix_nome(new["nome"])
-            new["sigla_unidade_federativa"] = fix_sigla_unidade_federativa(new["sigla_unidade_federativa"])
-            new["sigla_unidade_federativa_nascimento"] = fix_sigla_unidade_federativa(new["sigla_unidade_federativa_nascimento"])
-            new["titulo_eleitoral"] = fix_titulo_eleitoral(new["titulo_eleitoral"])
-            new["codigo_cargo"], new["cargo"], new["pergunta"] = fix_cargo(
-                new["codigo_cargo"], new["cargo"]
+            new[cpf] = fix_cpf(new[cpf])
+            new[nome] = fix_nome(new[nome])
+            new[sigla_uf] = fix_sigla_unidade_federativa(new[sigla_uf])
+            new[sigla_uf_nascimento] = fix_sigla_unidade_federativa(new[sigla_uf_nascimento])
+            new[titulo_eleitoral] = fix_titulo_eleitoral(new[titulo_eleitoral])
+            new[codigo_cargo], new[cargo], new[pergunta] = fix_cargo(
+                new[codigo_cargo], new[cargo]
             )
-            new["candidatura_inserida_urna"] = SimNaoBooleanField.deserialize(
-                new["candidatura_inserida_urna"]
+            new[candidatura_inserida_urna] = SimNaoBooleanField.deserialize(
+                new[candidatura_inserida_urna]
             )
-            new["data_eleicao"] = fix_data(new["data_eleicao"])
-            new["data_nascimento"] = fix_data(new["data_nascimento"])
+            new[data_eleicao] = fix_data_eleicao(new[data_eleicao])
+            new[data_nascimento] = fix_data_nascimento(new[data_nascimento])
             # TODO: seria interessante confirmar a idade na data da posse com
             # os valores corrigidos, para verificar se a correção é compatível
             # TODO: existem casos em que row['idade_data_eleicao'] é '' e
@@ -412,8 +719,8 @@ class CandidaturaExtractor(Extractor):
             # TODO: idade_data_eleicao está em branco em muitos casos, porém
             # conseguimos preenchê-lo caso a data de nascimento esteja correta
             if censor:
-                row["cpf"] = obfuscate_cpf(row["cpf"])
-                row["email"] = ""
+                new[cpf] = obfuscate_cpf(new[cpf])
+                new[email] = ""
 
             return new
 
@@ -467,6 +774,8 @@ class BemDeclaradoExtractor(Extractor):
 
     year_range = tuple(range(2006, last_elections_year() + 1, 2))
     schema_filename = settings.SCHEMA_PATH / "bem_declarado.csv"
+    header_prefix = "bem_declarado"
+    null_values = ("#NULO", "#NULO#", "#NE#")
 
     def filename(self, year):
         return f"bem_candidato/bem_candidato_{year}.zip"
@@ -497,18 +806,17 @@ class BemDeclaradoExtractor(Extractor):
             ),
         }
 
-    def convert_row(self, row_field_names, final_field_names):
+    def convert_row(self, row_field_names, final_field_names, normalized=False):
+        select = self.row_selector(row_field_names, final_field_names)
+        clean = self.values_cleaner(normalized)
+        position = self.output_fields.index
+        sigla_uf, valor = position("sigla_unidade_federativa"), position("valor")
+
         def convert(row_data):
-            row = dict(zip(row_field_names, row_data))
-            new = {}
-            for key in final_field_names:
-                value = row.get(key, "").strip()
-                if value in ("#NULO", "#NULO#", "#NE#"):
-                    value = ""
-                new[key] = value = utils.unaccent(value).upper()
+            new = clean(select(row_data))
 
-            new["sigla_unidade_federativa"] = fix_sigla_unidade_federativa(new["sigla_unidade_federativa"])
-            new["valor"] = fix_valor(new["valor"])
+            new[sigla_uf] = fix_sigla_unidade_federativa(new[sigla_uf])
+            new[valor] = fix_valor(new[valor])
 
             return new
 
@@ -539,6 +847,13 @@ class VotacaoZonaExtractor(Extractor):
 
     year_range = tuple(range(1996, last_elections_year(), 2))
     schema_filename = settings.SCHEMA_PATH / "votacao_zona.csv"
+    header_prefix = "votacao_zona"
+    null_values = ("#NULO", "#NULO#", "#NE#")
+
+    def input_filenames(self):
+        return super().input_filenames() + [
+            settings.HEADERS_PATH / "situacao_candidatura.csv"
+        ]
 
     @cached_property
     def codigo_situacao_candidatura(self):
@@ -587,26 +902,29 @@ class VotacaoZonaExtractor(Extractor):
             ),
         }
 
-    def convert_row(self, row_field_names, final_field_names):
+    def convert_row(self, row_field_names, final_field_names, normalized=False):
+        select = self.row_selector(row_field_names, final_field_names)
+        clean = self.values_cleaner(normalized)
+        position = self.output_fields.index
+        sigla_uf, nome = position("sigla_unidade_federativa"), position("nome")
+        codigo_cargo, cargo = position("codigo_cargo"), position("cargo")
+        codigo_situacao = position("codigo_situacao_candidatura")
+        situacao = position("situacao_candidatura")
+        codigo_situacao_candidatura = self.codigo_situacao_candidatura
+        situacao_candidatura = self.situacao_candidatura
+
         def convert(row_data):
-            row = dict(zip(row_field_names, row_data))
-            new = {}
-            for key in final_field_names:
-                value = row.get(key, "").strip()
-                if value in ("#NULO", "#NULO#", "#NE#"):
-                    value = ""
-                new[key] = value = utils.unaccent(value).upper()
-
-            new["sigla_unidade_federativa"] = fix_sigla_unidade_federativa(new["sigla_unidade_federativa"])
-            new["nome"] = fix_nome(new["nome"])
-            new["codigo_cargo"], new["cargo"], _ = fix_cargo(
-                new["codigo_cargo"], new["cargo"]
+            new = clean(select(row_data))
+
+            new[sigla_uf] = fix_sigla_unidade_federativa(new[sigla_uf])
+            new[nome] = fix_nome(new[nome])
+            new[codigo_cargo], new[cargo], _ = fix_cargo(
+                new[codigo_cargo], new[cargo]
             )
 
-            key = (new["codigo_situacao_candidatura"],
-                    new["situacao_candidatura"])
-            new["codigo_situacao_candidatura"] = self.codigo_situacao_candidatura[key]
-            new["situacao_candidatura"] = self.situacao_candidatura[key]
+            key = (new[codigo_situacao], new[situacao])
+            new[codigo_situacao] = codigo_situacao_candidatura[key]
+            new[situacao] = situacao_candidatura[key]
 
             return new
 
@@ -678,29 +996,36 @@ class PrestacaoContasExtractor(Extractor):
         }
         return f"prestacao_contas/prestacao_{urls[year]}.zip"
 
-    def _get_compressed_fobjs(self, filename, year):
+    @property
+    def header_prefix(self):
+        return self.type_mov
+
+    def _iter_compressed_fobjs(self, filename, year):
+        """Yield `(internal_filename, fobj)` for each valid archive member
+
+        Members are opened one at a time (each one is closed before the next
+        is opened), so only one decompressor (or `unrar` process) is alive,
+        no matter how many members the archive has.
+        """
         with open(filename, mode="rb") as fobj:
             first_bytes = fobj.read(10)
         if first_bytes.startswith(b"PK\x03\x04"):  # Zip archive
             zfile = ZipFile(str(filename))
             filelist = [fn.filename for fn in zfile.filelist]
-            opener = zfile
+            opener = zfile.open
         elif first_bytes.startswith(b"Rar!"):
-            rarobj = rarfile.RarFile(str(filename))
-            filelist = rarobj.namelist()
-            opener = rarobj
+            # Only the headers are read to list the members
+            with rarfile.RarFile(str(filename)) as rarobj:
+                filelist = rarobj.namelist()
+            opener = partial(open_rar_member, filename)
         else:
             raise RuntimeError(f"Could not extract archive '{filename}'")
 
-        valid_names = []
-        fobjs = []
         for internal_filename in filelist:
             if not self.valid_filename(internal_filename, year=year):
                 continue
-            fobjs.append(opener.open(internal_filename))
-            valid_names.append(internal_filename)
-
-        return fobjs, valid_names
+            with opener(internal_filename) as fobj:
+                yield internal_filename, fobj
 
     def fix_fobj(self, fobj, year):
         if year == 2002 or year == 2004 or year == 2006 or year == 2008:
@@ -721,12 +1046,13 @@ class PrestacaoContasExtractor(Extractor):
         else:
             header_year = str(year)
 
-        org = get_organization(internal_filename, year)
+        # Header files use "_" ("pagas-candidatos" -> "pagas_candidatos")
+        org = get_organization(internal_filename, year).replace("-", "_")
+        year_filename = settings.HEADERS_PATH / f"{self.type_mov}_{org}_{header_year}.csv"
 
         return {
-            "year_fields": read_header(
-                settings.HEADERS_PATH / f"{self.type_mov}_{org}_{header_year}.csv"
-            ),
+            "year_filename": year_filename,
+            "year_fields": read_header(year_filename),
             "final_fields": read_header(
                 settings.HEADERS_PATH / f"{self.type_mov}_final.csv"
             ),
@@ -775,50 +1101,76 @@ class PrestacaoContasExtractor(Extractor):
 
         return value, name
 
-    def extract(self, year):
-        filename = self.download_filename(year)
-        fobjs, internal_filenames = self._get_compressed_fobjs(filename, year)
-        for fobj, internal_filename in zip(fobjs, internal_filenames):
-            fobj = self.fix_fobj(fobj, year)
-            dialect = csv.Sniffer().sniff(fobj.read(1024))
-            fobj.seek(0)
-            reader = csv.reader(fobj, dialect=dialect)
-            header_meta = self.get_headers(year, filename, internal_filename)
-            year_fields = [
+    def detect_layout(self, header_meta, first_line):
+        """Find the delimiter and field names of a member by its first line
+
+        If the first line is a header, it's used to get the field ordering
+        (better trust it then our headers files, TSE may change the order).
+        """
+        delimiter = layouts.guess_delimiter(first_line)
+        header = layouts.is_header(first_line)
+        if header:
+            field_map = {
+                field.nome_tse: field.nome_final or field.nome_tse
+                for field in header_meta["year_fields"]
+            }
+            row = next(
+                csv.reader([first_line], dialect=utils.TSEDialect, delimiter=delimiter)
+            )
+            fields = [field_map[clean_header(field_name)] for field_name in row]
+        else:
+            fields = [
                 field.nome_final or field.nome_tse
                 for field in header_meta["year_fields"]
             ]
+        return {"delimiter": delimiter, "header": header, "fields": fields}
+
+    def extract(self, year):
+        filename = self.download_filename(year)
+        profiler = self.profiler
+        registry = layouts.LayoutRegistry(settings.LAYOUTS_FILENAME)
+        for internal_filename, fobj in self._iter_compressed_fobjs(filename, year):
+            profiler.start_member(year, internal_filename)
+            fobj = self.fix_fobj(profiler.wrap_file(fobj, "inflate"), year)
+            # `FixQuotes` decodes and fixes the lines at the same time
+            fobj = profiler.wrap_file(
+                fobj, "fix" if isinstance(fobj, utils.FixQuotes) else "decode"
+            )
+            header_meta = self.get_headers(year, filename, internal_filename)
             final_fields = [
                 field.nome_final
                 for field in header_meta["final_fields"]
                 if field.nome_final
             ]
-
             # Add year to final csv
             final_fields = ["ano"] + final_fields
-            convert_function = self.convert_row(year_fields, final_fields, year)
+
+            # The first line is enough to find the layout (and it's replayed,
+            # since streams like `unrar` output can't be rewound)
+            first_line = fobj.readline()
+            layout = registry.resolve(
+                header_meta["year_filename"],
+                first_line,
+                partial(self.detect_layout, header_meta),
+            )
+            fobj = utils.ReplayLines([first_line], fobj)
+            normalized = self.fast_normalization
+            if normalized:
+                fobj = profiler.wrap_iterator(self.normalize_fobj(fobj), "normalize")
+            reader = profiler.wrap_iterator(
+                csv.reader(fobj, dialect=utils.TSEDialect, delimiter=layout["delimiter"]),
+                "parse",
+            )
+            year_fields = layout["fields"]
+            convert_function = self._convert_row(year_fields, final_fields, year)
             for index, row in enumerate(reader):
-                if index == 0 and (
-                    "UF" in row
-                    or "SG_UF" in row
-                    or "SG_UE_SUP" in row
-                    or "SITUACAOCADASTRAL" in row
-                    or "DS_ORGAO" in row
-                    or "RV_MEANING" in row
-                    or "SEQUENCIAL_CANDIDATO" in row
-                ):
-                    # It's a header, we should skip it as a data row but
-                    # use the information to get field ordering (better
-                    # trust it then our headers files, TSE may change the
-                    # order)
-                    field_map = {
-                        field.nome_tse: field.nome_final or field.nome_tse
-                        for field in header_meta["year_fields"]
-                    }
-                    year_fields = [
-                        field_map[clean_header(field_name)] for field_name in row
-                    ]
-                    convert_function = self.convert_row(year_fields, final_fields, year)
+                if index == 0:
+                    # Only the lines after the first one were normalized
+                    if not layout["header"]:
+                        yield convert_function(row)
+                    convert_function = self._convert_row(
+                        year_fields, final_fields, year, normalized=normalized
+                    )
                     continue
 
                 yield convert_function(row)
@@ -829,26 +1181,33 @@ class PrestacaoContasReceitasExtractor(PrestacaoContasExtractor):
     type_mov = "receita"
     schema_filename = settings.SCHEMA_PATH / "receita.csv"
 
-    def convert_row(self, row_field_names, final_field_names, year):
+    def convert_row(self, row_field_names, final_field_names, year, normalized=False):
+        select = self.row_selector(row_field_names, final_field_names)
+        clean = self.values_cleaner(normalized)
+        position = self.output_fields.index
+        ano, valor, data = position("ano"), position("valor"), position("data")
+        data_prestacao_contas = position("data_prestacao_contas")
+        data_eleicao = position("data_eleicao")
+        fix_data_receita = date_normalizer()
+        fix_data_prestacao_contas = date_normalizer()
+        fix_data_eleicao = date_normalizer()
+        cnpj, cpf_cnpj_doador = position("cnpj"), position("cpf_cnpj_doador")
+        cpf_cnpj_doador_originario = position("cpf_cnpj_doador_originario")
+        cleaned_year, *_unused_suffix = str(year).split('_')
+        cleaned_year = int(cleaned_year)
+
         def convert(row_data):
-            row = dict(zip(row_field_names, row_data))
-            new = {}
-            for key in final_field_names:
-                value = row.get(key, "").strip()
-                if value in ("#NULO", "#NULO#", "#NE#", "#NE"):
-                    value = ""
-                new[key] = value = utils.unaccent(value).upper()
-
-            cleaned_year, *_unused_suffix = str(year).split('_')
-            new["ano"] = int(cleaned_year)
-            new["valor"] = fix_valor(new["valor"])
-            new["data"] = fix_data(new["data"])
-            new["data_prestacao_contas"] = fix_data(new["data_prestacao_contas"])
-            new["data_eleicao"] = fix_data(new["data_eleicao"])
-            new["cnpj"] = fix_cnpj_cpf(new["cnpj"])
-            new["cpf_cnpj_doador"] = fix_cnpj_cpf(new["cpf_cnpj_doador"])
-            new["cpf_cnpj_doador_originario"] = fix_cnpj_cpf(
-                new["cpf_cnpj_doador_originario"]
+            new = clean(select(row_data))
+
+            new[ano] = cleaned_year
+            new[valor] = fix_valor(new[valor])
+            new[data] = fix_data_receita(new[data])
+            new[data_prestacao_contas] = fix_data_prestacao_contas(new[data_prestacao_contas])
+            new[data_eleicao] = fix_data_eleicao(new[data_eleicao])
+            new[cnpj] = fix_cnpj_cpf(new[cnpj])
+            new[cpf_cnpj_doador] = fix_cnpj_cpf(new[cpf_cnpj_doador])
+            new[cpf_cnpj_doador_originario] = fix_cnpj_cpf(
+                new[cpf_cnpj_doador_originario]
             )
             return new
 
@@ -860,24 +1219,30 @@ class PrestacaoContasDespesasExtractor(PrestacaoContasExtractor):
     type_mov = "despesa"
     schema_filename = settings.SCHEMA_PATH / "despesa.csv"
 
-    def convert_row(self, row_field_names, final_field_names, year):
+    def convert_row(self, row_field_names, final_field_names, year, normalized=False):
+        select = self.row_selector(row_field_names, final_field_names)
+        clean = self.values_cleaner(normalized)
+        position = self.output_fields.index
+        ano, valor, data = position("ano"), position("valor"), position("data")
+        data_prestacao_contas = position("data_prestacao_contas")
+        data_eleicao = position("data_eleicao")
+        fix_data_despesa = date_normalizer()
+        fix_data_prestacao_contas = date_normalizer()
+        fix_data_eleicao = date_normalizer()
+        cnpj, cpf_cnpj_fornecedor = position("cnpj"), position("cpf_cnpj_fornecedor")
+        cleaned_year, *_unused_suffix = str(year).split('_')
+        cleaned_year = int(cleaned_year)
+
         def convert(row_data):
-            row = dict(zip(row_field_names, row_data))
-            new = {}
-            for key in final_field_names:
-                value = row.get(key, "").strip()
-                if value in ("#NULO", "#NULO#", "#NE#", "#NE"):
-                    value = ""
-                new[key] = value = utils.unaccent(value).upper()
-
-            cleaned_year, *_unused_suffix = str(year).split('_')
-            new["ano"] = int(cleaned_year)
-            new["valor"] = fix_valor(new["valor"])
-            new["data"] = fix_data(new["data"])
-            new["data_prestacao_contas"] = fix_data(new["data_prestacao_contas"])
-            new["data_eleicao"] = fix_data(new["data_eleicao"])
-            new["cnpj"] = fix_cnpj_cpf(new["cnpj"])
-            new["cpf_cnpj_fornecedor"] = fix_cnpj_cpf(new["cpf_cnpj_fornecedor"])
+            new = clean(select(row_data))
+
+            new[ano] = cleaned_year
+            new[valor] = fix_valor(new[valor])
+            new[data] = fix_data_despesa(new[data])
+            new[data_prestacao_contas] = fix_data_prestacao_contas(new[data_prestacao_contas])
+            new[data_eleicao] = fix_data_eleicao(new[data_eleicao])
+            new[cnpj] = fix_cnpj_cpf(new[cnpj])
+            new[cpf_cnpj_fornecedor] = fix_cnpj_cpf(new[cpf_cnpj_fornecedor])
             return new
 
         return convert
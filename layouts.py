@@ -0,0 +1,121 @@
+"""Registry of archive member layouts (delimiter, header row and field names)
+
+The layout of a member is identified by a fingerprint of its first line: the
+header file chosen by the extractor, plus the line itself (if it's a header
+row) or its "shape" (only the quotes and delimiters, if it's a data row). The
+layouts are saved to a JSON file, so they're detected only once - and the
+members don't need to be sniffed and rewound.
+"""
+
+import hashlib
+import json
+import os
+import re
+from functools import lru_cache
+from pathlib import Path
+
+
+LAYOUTS_VERSION = 1
+DELIMITERS = ";,\t|"
+# Same tokens `PrestacaoContasExtractor` used to detect a header row (one of
+# the fields must be equal to one of them)
+HEADER_TOKENS = (
+    "UF", "SG_UF", "SG_UE_SUP", "SITUACAOCADASTRAL", "DS_ORGAO", "RV_MEANING",
+    "SEQUENCIAL_CANDIDATO",
+)
+REGEXP_HEADER_TOKEN = re.compile(
+    r'(?:^|[;,\t|])"?(?:' + "|".join(HEADER_TOKENS) + r')"?(?=[;,\t|]|$)'
+)
+REGEXP_QUOTED = re.compile(r'"[^"]*"')
+REGEXP_UNQUOTED = re.compile(r'[^";,\t|]+')
+
+
+def line_shape(line):
+    """Remove the values from a line, keeping quotes and delimiters
+
+    >>> line_shape('"1";"A,B";3,5\\r\\n')
+    '"";"";x,x'
+    """
+    line = line.rstrip("\r\n")
+    return REGEXP_UNQUOTED.sub("x", REGEXP_QUOTED.sub('""', line))
+
+
+def is_header(line):
+    """
+    >>> is_header('"SEQUENCIAL_CANDIDATO";"SG_UF";"NOME"\\n')
+    True
+    >>> is_header('"1";"SP";"UF DO CANDIDATO"\\n')
+    False
+    """
+    return REGEXP_HEADER_TOKEN.search(line.rstrip("\r\n")) is not None
+
+
+def guess_delimiter(line):
+    "The most frequent delimiter outside quotes"
+    shape = line_shape(line)
+    return max(DELIMITERS, key=shape.count)
+
+
+@lru_cache(maxsize=256)
+def file_digest(filename):
+    with open(filename, mode="rb") as fobj:
+        return hashlib.sha1(fobj.read()).hexdigest()
+
+
+def fingerprint(header_filename, first_line):
+    "Identify the layout of a member by its header file and first line"
+
+    if is_header(first_line):
+        line = "header:" + first_line.rstrip("\r\n")
+    else:
+        line = "data:" + line_shape(first_line)
+    data = json.dumps(
+        [LAYOUTS_VERSION, Path(header_filename).name, file_digest(header_filename), line]
+    )
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+
+class LayoutRegistry:
+    """Layouts by fingerprint, persisted to `filename` (if not `None`)
+
+    A layout is a dict with `delimiter`, `header` (if the first line is a
+    header row) and `fields` (the field names, in the same order as the
+    columns).
+    """
+
+    def __init__(self, filename=None):
+        self.filename = Path(filename) if filename is not None else None
+        self.layouts = self.load()
+
+    def load(self):
+        if self.filename is None or not self.filename.exists():
+            return {}
+        with open(self.filename) as fobj:
+            data = json.load(fobj)
+        if data.get("version") != LAYOUTS_VERSION:
+            return {}
+        return data["layouts"]
+
+    def save(self):
+        if self.filename is None:
+            return
+        # Other processes (`--jobs`) may have added layouts in the meantime
+        layouts = self.load()
+        layouts.update(self.layouts)
+        self.layouts = layouts
+        temp_filename = self.filename.with_name(f"{self.filename.name}.{os.getpid()}.tmp")
+        with open(temp_filename, mode="w") as fobj:
+            json.dump({"version": LAYOUTS_VERSION, "layouts": layouts}, fobj, indent=2)
+        os.replace(temp_filename, self.filename)
+
+    def resolve(self, header_filename, first_line, detect):
+        """Return the layout for `first_line`, calling `detect` if it's new
+
+        `detect(first_line)` must return the layout dict.
+        """
+        key = fingerprint(header_filename, first_line)
+        layout = self.layouts.get(key)
+        if layout is None:
+            layout = self.layouts[key] = detect(first_line)
+            self.save()
+        return layout
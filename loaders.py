@@ -0,0 +1,298 @@
+"""Load the extracted data into databases
+
+The rows are streamed (nothing is loaded in memory) from the `.csv.gz` files
+created by `tse.py` (SQLite) or from the extractors themselves (PostgreSQL)
+and the column types come from `schema/*.csv`.
+"""
+
+import csv
+import datetime
+import re
+import sqlite3
+import time
+from collections import Counter
+from io import StringIO
+from itertools import islice
+
+import rows
+from rows.utils import open_compressed
+
+
+# For each group, an index is created for the first column the table has
+INDEX_COLUMNS = (
+    ("ano_eleicao", "ano"),
+    ("sigla_unidade_federativa", "sigla_uf"),
+    ("numero_sequencial", "sequencial_candidato"),
+    ("cpf",),
+)
+SQLITE_BATCH_SIZE = 50_000
+SQLITE_TRANSACTION_SIZE = 2_000_000
+COPY_BUFFER_SIZE = 1024 * 1024
+BIGINT_REGEXP = re.compile(r"\s*[+-]?[0-9]+\s*\Z")
+NUMERIC_REGEXP = re.compile(r"\s*[+-]?([0-9]+\.?[0-9]*|\.[0-9]+)([eE][+-]?[0-9]+)?\s*\Z")
+BOOLEAN_VALUES = {"t", "true", "y", "yes", "on", "1", "f", "false", "n", "no", "off", "0"}
+
+
+def sqlite_type(field_type):
+    "SQLite column type and the SQL expression which converts a CSV value"
+
+    # Values are converted by SQLite itself (column affinity, `NULLIF` and
+    # `CASE`), which is much faster than converting them in Python
+    if issubclass(field_type, rows.fields.BoolField):
+        return "INTEGER", "CASE ? WHEN 'True' THEN 1 WHEN 'False' THEN 0 END"
+    elif issubclass(field_type, rows.fields.IntegerField):
+        return "INTEGER", "NULLIF(?, '')"
+    elif issubclass(field_type, rows.fields.DecimalField):
+        return "NUMERIC", "NULLIF(?, '')"
+    elif issubclass(field_type, rows.fields.FloatField):
+        return "REAL", "NULLIF(?, '')"
+    elif issubclass(field_type, rows.fields.DateField):
+        return "DATE", "NULLIF(?, '')"
+    return "TEXT", "NULLIF(?, '')"
+
+
+def quote_name(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def index_columns(field_names):
+    return [
+        next(name for name in group if name in field_names)
+        for group in INDEX_COLUMNS
+        if any(name in field_names for name in group)
+    ]
+
+
+def sqlite_connect(filename):
+    "Connect to the database using settings for fast bulk loads"
+
+    connection = sqlite3.connect(str(filename), isolation_level=None)
+    connection.execute("PRAGMA journal_mode = WAL")
+    # A crash during the load may corrupt the database (it'd be loaded again)
+    connection.execute("PRAGMA synchronous = OFF")
+    connection.execute("PRAGMA temp_store = MEMORY")
+    connection.execute("PRAGMA cache_size = -262144")  # 256 MiB
+    return connection
+
+
+def sqlite_close(connection):
+    "Move the WAL contents to the database file and close the connection"
+
+    connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    connection.close()
+
+
+def load_sqlite(connection, table_name, csv_filename, schema,
+        batch_size=SQLITE_BATCH_SIZE, transaction_size=SQLITE_TRANSACTION_SIZE):
+    """Replace `table_name` with the rows from a (compressed) CSV file
+
+    Fields not in `schema` are created as `TEXT`. The indexes (see
+    `INDEX_COLUMNS`) are created after all the rows are inserted.
+    """
+
+    start = time.time()
+    with open_compressed(csv_filename, mode="r", encoding="utf-8") as fobj:
+        reader = csv.reader(fobj)
+        field_names = next(reader)
+        columns, values = [], []
+        for field_name in field_names:
+            column_type, value = sqlite_type(schema.get(field_name, rows.fields.TextField))
+            columns.append(f"{quote_name(field_name)} {column_type}")
+            values.append(value)
+        table = quote_name(table_name)
+        connection.execute(f"DROP TABLE IF EXISTS {table}")
+        connection.execute(f"CREATE TABLE {table} ({', '.join(columns)})")
+        insert = f"INSERT INTO {table} VALUES ({', '.join(values)})"
+
+        total, in_transaction = 0, 0
+        connection.execute("BEGIN")
+        while True:
+            batch = list(islice(reader, batch_size))
+            if not batch:
+                break
+            connection.executemany(insert, batch)
+            total += len(batch)
+            in_transaction += len(batch)
+            if in_transaction >= transaction_size:
+                connection.execute("COMMIT")
+                connection.execute("BEGIN")
+                in_transaction = 0
+        connection.execute("COMMIT")
+    load_time = time.time() - start
+
+    for column in index_columns(field_names):
+        connection.execute(
+            f"CREATE INDEX {quote_name(f'idx_{table_name}_{column}')} "
+            f"ON {table} ({quote_name(column)})"
+        )
+    connection.execute(f"ANALYZE {table}")
+    return {
+        "table": table_name,
+        "rows": total,
+        "load_time": load_time,
+        "index_time": time.time() - start - load_time,
+    }
+
+
+def postgresql_type(field_type):
+    if issubclass(field_type, rows.fields.BoolField):
+        return "BOOLEAN"
+    elif issubclass(field_type, rows.fields.IntegerField):
+        return "BIGINT"
+    elif issubclass(field_type, rows.fields.DecimalField):
+        return "NUMERIC"
+    elif issubclass(field_type, rows.fields.FloatField):
+        return "DOUBLE PRECISION"
+    elif issubclass(field_type, rows.fields.DateField):
+        return "DATE"
+    return "TEXT"
+
+
+def _is_bigint(value):
+    value = str(value)
+    return BIGINT_REGEXP.match(value) is not None and -2 ** 63 <= int(value) < 2 ** 63
+
+
+def _is_numeric(value):
+    return NUMERIC_REGEXP.match(str(value)) is not None
+
+
+def _is_date(value):
+    if isinstance(value, datetime.date):
+        return True
+    try:
+        datetime.date.fromisoformat(str(value).strip())
+    except ValueError:
+        return False
+    return True
+
+
+def _is_boolean(value):
+    return str(value).strip().lower() in BOOLEAN_VALUES
+
+
+def postgresql_accepts(field_type):
+    """Function which checks if a value is accepted by the column type
+
+    `None` for `TEXT` (which accepts everything).
+    """
+    if issubclass(field_type, rows.fields.BoolField):
+        return _is_boolean
+    elif issubclass(field_type, rows.fields.IntegerField):
+        return _is_bigint
+    elif issubclass(field_type, (rows.fields.DecimalField, rows.fields.FloatField)):
+        return _is_numeric
+    elif issubclass(field_type, rows.fields.DateField):
+        return _is_date
+    return None
+
+
+class CopyFile:
+    """Read-only file-like object with `rows` encoded as CSV, on demand
+
+    Used as the input of `COPY ... FROM STDIN WITH (FORMAT csv)`: empty values
+    (and `None`) are written unquoted, so PostgreSQL loads them as `NULL`.
+    With a `schema`, the values its column types don't accept (like `DEFERIDO`
+    in the integer `codigo_situacao_candidatura`, which would abort the whole
+    `COPY`) are also written as `NULL` and counted in `invalid_values`.
+    """
+
+    def __init__(self, rows, batch_size=10_000, schema=None):
+        self.rows = iter(rows)
+        self.batch_size = batch_size
+        self.total = 0
+        self.invalid_values = Counter()
+        self.checks = [
+            (position, field_name, postgresql_accepts(field_type))
+            for position, (field_name, field_type) in enumerate((schema or {}).items())
+            if postgresql_accepts(field_type) is not None
+        ]
+        self._buffer = StringIO()
+        self._writer = csv.writer(self._buffer, lineterminator="\n")
+        self._data, self._position = "", 0
+
+    def _fill(self):
+        batch = list(islice(self.rows, self.batch_size))
+        if not batch:
+            return False
+        if self.checks:
+            self._check(batch)
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        self._writer.writerows(batch)
+        self.total += len(batch)
+        self._data = self._data[self._position:] + self._buffer.getvalue()
+        self._position = 0
+        return True
+
+    def _check(self, batch):
+        for position, field_name, accepts in self.checks:
+            for index, row in enumerate(batch):
+                value = row[position]
+                if value is None or value == "" or accepts(value):
+                    continue
+                row = batch[index] = list(row)
+                row[position] = None
+                self.invalid_values[field_name] += 1
+
+    def read(self, size=-1):
+        while size < 0 or len(self._data) - self._position < size:
+            if not self._fill():
+                break
+        if size < 0:
+            size = len(self._data) - self._position
+        start, self._position = self._position, self._position + size
+        return self._data[start:self._position]
+
+
+def postgresql_connect(database_url):
+    try:
+        import psycopg2
+    except ImportError:
+        raise RuntimeError("psycopg2 is needed to load into PostgreSQL (pip install psycopg2-binary)")
+
+    return psycopg2.connect(database_url)
+
+
+def load_postgresql(connection, table_name, rows, schema):
+    """Replace `table_name` with `rows` (in `schema` order) using `COPY`
+
+    The table is created in the same transaction as the `COPY`, so PostgreSQL
+    may skip the WAL for the data (with `wal_level = minimal`). The indexes
+    (see `INDEX_COLUMNS`) are created after all the rows are loaded. Values
+    the column types don't accept are loaded as `NULL` (see `CopyFile`).
+    """
+
+    start = time.time()
+    table = quote_name(table_name)
+    columns = ", ".join(
+        f"{quote_name(field_name)} {postgresql_type(field_type)}"
+        for field_name, field_type in schema.items()
+    )
+    fobj = CopyFile(rows, schema=schema)
+    with connection.cursor() as cursor:
+        cursor.execute("SET synchronous_commit = off")
+        cursor.execute(f"DROP TABLE IF EXISTS {table}")
+        cursor.execute(f"CREATE TABLE {table} ({columns})")
+        cursor.copy_expert(
+            f"COPY {table} FROM STDIN WITH (FORMAT csv)", fobj, size=COPY_BUFFER_SIZE
+        )
+    connection.commit()
+    load_time = time.time() - start
+
+    with connection.cursor() as cursor:
+        cursor.execute("SET maintenance_work_mem = '512MB'")
+        for column in index_columns(list(schema.keys())):
+            cursor.execute(
+                f"CREATE INDEX {quote_name(f'idx_{table_name}_{column}')} "
+                f"ON {table} ({quote_name(column)})"
+            )
+        cursor.execute(f"ANALYZE {table}")
+    connection.commit()
+    return {
+        "table": table_name,
+        "rows": fobj.total,
+        "invalid_values": dict(fobj.invalid_values),
+        "load_time": load_time,
+        "index_time": time.time() - start - load_time,
+    }
@@ -0,0 +1,257 @@
+"""On-disk key index for the extracted CSV files
+
+`build_index` reads a (compressed) CSV file once and creates, next to it, a
+directory with:
+
+- `rows.bin`: the rows (as CSV) in independently compressed blocks of
+  `BLOCK_SIZE` bytes, so any row can be read by decompressing only one block;
+- `blocks.bin`: the offset of each block in `rows.bin`;
+- `<key>.keys`/`<key>.rows`: for each key, the sorted 64-bit hashes of its
+  values and the position (block and offset inside the block) of each row;
+- `meta.json`: field names, keys and the size/mtime of the CSV file.
+
+`KeyIndex` memory-maps the arrays, so a lookup is a binary search plus one
+block decompression.
+"""
+
+import csv
+import hashlib
+import json
+import mmap
+import os
+import shutil
+import sys
+import zlib
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from io import StringIO
+from pathlib import Path
+
+from rows.utils import open_compressed
+
+
+INDEX_VERSION = 1
+BLOCK_SIZE = 32 * 1024
+OFFSET_BITS = 16  # Rows start before `BLOCK_SIZE` inside the block
+POINTER_BITS = 40
+CANDIDATURA_KEYS = {
+    "cpf": ("cpf",),
+    "titulo_eleitoral": ("titulo_eleitoral",),
+    "sequencial": ("ano", "numero_sequencial"),
+}
+
+
+def index_path(filename):
+    "Directory of the index for `filename` (`candidatura.csv.gz.idx`)"
+    filename = Path(filename)
+    return filename.with_name(filename.name + ".idx")
+
+
+def key_hash(values):
+    data = "\x1f".join(values).encode("utf-8")
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "little")
+
+
+def source_info(filename):
+    stat_result = os.stat(filename)
+    return {"size": stat_result.st_size, "mtime_ns": stat_result.st_mtime_ns}
+
+
+def build_index(filename, keys, path=None):
+    """Index the rows of the CSV `filename` by `keys` (name -> field names)
+
+    Rows with an empty value in any of the key fields are not indexed by that
+    key. The new index replaces the old one only when it's complete.
+    """
+    path = Path(path or index_path(filename))
+    temp_path = path.with_name(path.name + ".tmp")
+    if temp_path.exists():
+        shutil.rmtree(temp_path)
+    temp_path.mkdir(parents=True)
+
+    # Hashes and pointers of each key, in file order (sorted later)
+    entries = {name: (array("Q"), array("Q")) for name in keys}
+    blocks = array("Q", [0])
+    total = 0
+    with open_compressed(filename, mode="r", encoding="utf-8") as fobj, \
+            open(temp_path / "rows.bin", mode="wb") as store:
+        reader = csv.reader(fobj)
+        field_names = next(reader)
+        key_positions = {
+            name: [field_names.index(field_name) for field_name in key_fields]
+            for name, key_fields in keys.items()
+        }
+        buffer = StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        block_data = bytearray()
+
+        for row in reader:
+            pointer = ((len(blocks) - 1) << OFFSET_BITS) | len(block_data)
+            for name, positions in key_positions.items():
+                values = [row[position] for position in positions]
+                if all(values):
+                    hashes, pointers = entries[name]
+                    hashes.append(key_hash(values))
+                    pointers.append(pointer)
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerow(row)
+            block_data += buffer.getvalue().encode("utf-8")
+            total += 1
+            if len(block_data) >= BLOCK_SIZE:
+                store.write(zlib.compress(block_data))
+                blocks.append(store.tell())
+                block_data = bytearray()
+        if block_data:
+            store.write(zlib.compress(block_data))
+            blocks.append(store.tell())
+
+    with open(temp_path / "blocks.bin", mode="wb") as fobj:
+        blocks.tofile(fobj)
+    for name in keys:
+        hashes, pointers = entries.pop(name)
+        # Sorting one list of ints is much faster than sorting tuples
+        combined = sorted(
+            (hash_value << POINTER_BITS) | pointer
+            for hash_value, pointer in zip(hashes, pointers)
+        )
+        del hashes, pointers
+        mask = (1 << POINTER_BITS) - 1
+        with open(temp_path / f"{name}.keys", mode="wb") as fobj:
+            array("Q", (value >> POINTER_BITS for value in combined)).tofile(fobj)
+        with open(temp_path / f"{name}.rows", mode="wb") as fobj:
+            array("Q", (value & mask for value in combined)).tofile(fobj)
+        del combined
+
+    with open(temp_path / "meta.json", mode="w") as fobj:
+        json.dump(
+            {
+                "version": INDEX_VERSION,
+                "byteorder": sys.byteorder,
+                "block_size": BLOCK_SIZE,
+                "fields": field_names,
+                "keys": {name: list(key_fields) for name, key_fields in keys.items()},
+                "rows": total,
+                "source": source_info(filename),
+            },
+            fobj,
+            indent=2,
+        )
+
+    if path.exists():
+        old_path = path.with_name(path.name + ".old")
+        os.replace(path, old_path)
+        os.replace(temp_path, path)
+        shutil.rmtree(old_path)
+    else:
+        os.replace(temp_path, path)
+    return {"rows": total, "blocks": len(blocks) - 1}
+
+
+def update_index(filename, keys):
+    "Build the index of `filename`, unless it exists and is up to date"
+    path = index_path(filename)
+    if path.exists():
+        try:
+            with KeyIndex(path) as index:
+                if not index.is_stale(filename) and index.keys == {
+                    name: list(key_fields) for name, key_fields in keys.items()
+                }:
+                    return None
+        except (OSError, ValueError):
+            pass  # Incomplete or incompatible: rebuild it
+    return build_index(filename, keys, path)
+
+
+class KeyIndex:
+    """Find rows by key in an index created by `build_index`
+
+    >>> index = KeyIndex("data/output/candidatura.csv.gz.idx")  # doctest: +SKIP
+    >>> index.lookup("sequencial", "2018", "250000601232")  # doctest: +SKIP
+    [{'ano': '2018', 'nome': ..., ...}]
+    """
+
+    def __init__(self, path, cache_size=64):
+        self.path = Path(path)
+        with open(self.path / "meta.json") as fobj:
+            self.meta = json.load(fobj)
+        if self.meta.get("version") != INDEX_VERSION or self.meta["byteorder"] != sys.byteorder:
+            raise ValueError(f"Incompatible index: {self.path} (rebuild it)")
+        self.fields = self.meta["fields"]
+        self.keys = self.meta["keys"]
+        self._files = []
+        self.blocks = self._open_array("blocks.bin")
+        self.arrays = {
+            name: (self._open_array(f"{name}.keys"), self._open_array(f"{name}.rows"))
+            for name in self.keys
+        }
+        self.store = open(self.path / "rows.bin", mode="rb")
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+
+    def _open_array(self, filename):
+        with open(self.path / filename, mode="rb") as fobj:
+            if os.fstat(fobj.fileno()).st_size == 0:
+                return array("Q")
+            data = mmap.mmap(fobj.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(data)
+        values = view.cast("Q")
+        # The views must be released before the `mmap` is closed
+        self._files.append((data, view, values))
+        return values
+
+    def is_stale(self, filename):
+        "`True` if the CSV file changed after the index was created"
+        return source_info(filename) != self.meta["source"]
+
+    def _block(self, number):
+        data = self._cache.get(number)
+        if data is not None:
+            self._cache.move_to_end(number)
+            return data
+        start, end = self.blocks[number], self.blocks[number + 1]
+        self.store.seek(start)
+        data = zlib.decompress(self.store.read(end - start))
+        self._cache[number] = data
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return data
+
+    def read_row(self, pointer):
+        data = self._block(pointer >> OFFSET_BITS)
+        offset = pointer & ((1 << OFFSET_BITS) - 1)
+        # Quoted values may have line breaks, so the row must be parsed
+        lines = StringIO(data[offset:].decode("utf-8"))
+        return next(csv.reader(lines))
+
+    def lookup(self, key, *values):
+        "List of rows (dicts) whose `key` fields are equal to `values`"
+        values = [str(value) for value in values]
+        hashes, pointers = self.arrays[key]
+        hash_value = key_hash(values)
+        start = bisect_left(hashes, hash_value)
+        end = bisect_right(hashes, hash_value, start)
+        positions = [self.fields.index(field_name) for field_name in self.keys[key]]
+        result = []
+        for pointer in sorted(pointers[start:end]):
+            row = self.read_row(pointer)
+            # Different values may have the same hash
+            if [row[position] for position in positions] == values:
+                result.append(dict(zip(self.fields, row)))
+        return result
+
+    def close(self):
+        self.store.close()
+        self.blocks = self.arrays = None
+        for data, view, values in self._files:
+            values.release()
+            view.release()
+            data.close()
+        self._files = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
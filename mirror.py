@@ -0,0 +1,154 @@
+"""Mirror the TSE files to an S3-compatible storage
+
+Files are downloaded (see `downloader`), hashed and uploaded (using multipart
+uploads) concurrently. A `SHA512SUMS` file is kept in the bucket (and in the
+download path), so the objects whose size and SHA-512 didn't change are not
+uploaded again.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+import downloader
+import settings
+
+
+DEFAULT_BUCKET = "mirror"
+DEFAULT_PREFIX = "tse/"
+MULTIPART_CHUNK_SIZE = 64 * 1024 * 1024
+
+
+def create_s3_client(endpoint_url=None):
+    "Create a boto3 S3 client (credentials are read by boto3, as usual)"
+
+    import boto3
+
+    return boto3.client("s3", endpoint_url=endpoint_url)
+
+
+def create_transfer_config(chunk_size=MULTIPART_CHUNK_SIZE, threads=8):
+    from boto3.s3.transfer import TransferConfig
+
+    return TransferConfig(
+        multipart_threshold=chunk_size,
+        multipart_chunksize=chunk_size,
+        max_concurrency=threads,
+    )
+
+
+def serialize_sha512sums(checksums):
+    return "".join(
+        f"{checksum} {name}\n" for name, checksum in sorted(checksums.items())
+    )
+
+
+class S3Mirror:
+    """Download files from TSE and upload the changed ones to a bucket
+
+    `files` passed to `run` are `(url, filename)` pairs, where `filename` is
+    relative to `download_path` and to the bucket's `prefix`.
+    """
+
+    def __init__(self, client, bucket=DEFAULT_BUCKET, prefix=DEFAULT_PREFIX,
+            download_path=None, jobs=4, transfer_config=None):
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+        self.download_path = Path(download_path or settings.DOWNLOAD_PATH)
+        self.jobs = jobs
+        self.transfer_config = transfer_config
+
+    def remote_objects(self):
+        "Return the sizes of the objects in the bucket (key -> size)"
+
+        sizes, kwargs = {}, {"Bucket": self.bucket, "Prefix": self.prefix}
+        while True:
+            response = self.client.list_objects_v2(**kwargs)
+            for obj in response.get("Contents", []):
+                sizes[obj["Key"]] = obj["Size"]
+            if not response.get("IsTruncated"):
+                return sizes
+            kwargs["ContinuationToken"] = response["NextContinuationToken"]
+
+    def remote_sha512sums(self, sizes):
+        key = self.prefix + "SHA512SUMS"
+        if key not in sizes:
+            return {}
+        response = self.client.get_object(Bucket=self.bucket, Key=key)
+        return downloader.parse_sha512sums(response["Body"].read().decode("utf-8"))
+
+    def mirror_file(self, url, filename, remote_size, remote_sha512, force=False):
+        local_filename = self.download_path / filename
+        local_filename.parent.mkdir(parents=True, exist_ok=True)
+        download = downloader.Download(url, local_filename)
+        downloaded = False
+        if (
+            force
+            or not local_filename.exists()
+            or local_filename.stat().st_size != download.remote_info()["size"]
+        ):
+            download.run()
+            downloaded = True
+
+        size = local_filename.stat().st_size
+        checksum = downloader.file_sha512(local_filename)
+        uploaded = False
+        if (size, checksum) != (remote_size, remote_sha512):
+            kwargs = {"Config": self.transfer_config} if self.transfer_config else {}
+            self.client.upload_file(
+                str(local_filename), self.bucket, self.prefix + filename, **kwargs
+            )
+            uploaded = True
+        return {
+            "filename": filename,
+            "sha512": checksum,
+            "downloaded": downloaded,
+            "uploaded": uploaded,
+        }
+
+    def run(self, files, force=False):
+        sizes = self.remote_objects()
+        remote_checksums = self.remote_sha512sums(sizes)
+        checksums = dict(remote_checksums)
+        results, errors = [], []
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            futures = {
+                executor.submit(
+                    self.mirror_file,
+                    url,
+                    filename,
+                    sizes.get(self.prefix + filename),
+                    remote_checksums.get(filename),
+                    force=force,
+                ): filename
+                for url, filename in files
+            }
+            for future in as_completed(futures):
+                filename = futures[future]
+                try:
+                    result = future.result()
+                except Exception as exception:
+                    errors.append(filename)
+                    print(f"  {filename}: ERROR ({exception})")
+                    continue
+                results.append(result)
+                checksums[filename] = result["sha512"]
+                status = "uploaded" if result["uploaded"] else "up to date"
+                print(f"  {filename}: {status}")
+
+        # The checksums of the files which failed are kept (as they were)
+        data = serialize_sha512sums(checksums)
+        if checksums != remote_checksums:
+            self.client.put_object(
+                Bucket=self.bucket,
+                Key=self.prefix + "SHA512SUMS",
+                Body=data.encode("utf-8"),
+            )
+        sha512sums_filename = self.download_path / "SHA512SUMS"
+        temp_filename = sha512sums_filename.with_name("SHA512SUMS.tmp")
+        temp_filename.write_text(data)
+        os.replace(temp_filename, sha512sums_filename)
+        if errors:
+            raise RuntimeError(f"Could not mirror: {', '.join(errors)}")
+        return results
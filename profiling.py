@@ -0,0 +1,225 @@
+"""Per-stage timings of an extraction (`tse.py --profile`)
+
+Each archive member read by an extractor is a pipeline of file-like objects
+and functions: zip inflate -> decode -> fix (`fix_fobj`) -> normalize ->
+`csv.reader` -> `convert_row` -> writer. When profiling, each one of these
+stages is wrapped and the time spent *only* in that stage (the time of the
+nested stages is subtracted) is accounted to the member being read.
+
+`NullProfiler` (the default) returns the objects it receives unchanged, so
+there's no overhead when profiling is disabled.
+"""
+
+import json
+import time
+import tracemalloc
+from collections import OrderedDict
+
+
+STAGES = ("inflate", "decode", "fix", "normalize", "parse", "convert", "write")
+
+
+class NullProfiler:
+    "Profiler which does nothing (the objects are not wrapped)"
+
+    enabled = False
+
+    def start_member(self, year, internal_filename):
+        pass
+
+    def wrap_file(self, fobj, stage):
+        return fobj
+
+    def wrap_iterator(self, iterator, stage):
+        return iterator
+
+    def wrap_function(self, function, stage, count_rows=False):
+        return function
+
+    def finish(self):
+        pass
+
+
+NULL_PROFILER = NullProfiler()
+
+
+class TimedFile:
+    "File-like object proxy which accounts the time spent reading to `stage`"
+
+    def __init__(self, fobj, profiler, stage):
+        self._fobj = fobj
+        self._call = profiler.call
+        self._stage = stage
+
+    def read(self, *args):
+        return self._call(self._stage, self._fobj.read, *args)
+
+    def read1(self, *args):
+        return self._call(self._stage, self._fobj.read1, *args)
+
+    def readinto(self, *args):
+        return self._call(self._stage, self._fobj.readinto, *args)
+
+    def readline(self, *args):
+        return self._call(self._stage, self._fobj.readline, *args)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        line = self.readline()
+        if not line:
+            raise StopIteration
+        return line
+
+    def __getattr__(self, name):
+        return getattr(self._fobj, name)
+
+
+class TimedIterator:
+    def __init__(self, iterator, profiler, stage):
+        self._iterator = iter(iterator)
+        self._call = profiler.call
+        self._stage = stage
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return self._call(self._stage, self._iterator.__next__)
+
+
+class Profiler(NullProfiler):
+    """Account the time of each stage (and the rows) per `(year, member)`
+
+    If `trace_memory` is `True`, the peak memory allocated (by Python code,
+    using `tracemalloc`) while each member is read is also reported - it's
+    much slower, though.
+    """
+
+    enabled = True
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.members = OrderedDict()
+        self.current = None
+        self.started_at = None
+        # Time spent in nested stages of the calls being executed
+        self._nested = []
+        if trace_memory:
+            tracemalloc.start()
+
+    def _finish_member(self):
+        if self.current is None:
+            return
+        self.current["elapsed"] = time.perf_counter() - self.started_at
+        if self.trace_memory:
+            self.current["memory_peak"] = tracemalloc.get_traced_memory()[1]
+
+    def start_member(self, year, internal_filename):
+        self._finish_member()
+        key = (year, internal_filename)
+        if key not in self.members:
+            self.members[key] = {
+                "year": year,
+                "filename": internal_filename,
+                "rows": 0,
+                "stages": {stage: 0.0 for stage in STAGES},
+            }
+        self.current = self.members[key]
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        self.started_at = time.perf_counter()
+
+    def call(self, stage, function, *args):
+        nested = self._nested
+        nested.append(0.0)
+        start = time.perf_counter()
+        try:
+            return function(*args)
+        finally:
+            elapsed = time.perf_counter() - start
+            inner = nested.pop()
+            if self.current is not None:
+                self.current["stages"][stage] += elapsed - inner
+            if nested:
+                nested[-1] += elapsed
+
+    def wrap_file(self, fobj, stage):
+        return TimedFile(fobj, self, stage)
+
+    def wrap_iterator(self, iterator, stage):
+        return TimedIterator(iterator, self, stage)
+
+    def wrap_function(self, function, stage, count_rows=False):
+        call = self.call
+
+        if count_rows:
+            def wrapper(*args):
+                if self.current is not None:
+                    self.current["rows"] += 1
+                return call(stage, function, *args)
+
+        else:
+            def wrapper(*args):
+                return call(stage, function, *args)
+
+        return wrapper
+
+    def finish(self):
+        self._finish_member()
+        self.current = None
+        if self.trace_memory:
+            tracemalloc.stop()
+
+    def report(self):
+        members = []
+        for member in self.members.values():
+            member = dict(member)
+            member["stages"] = dict(member["stages"])
+            member["stages"]["other"] = max(
+                0.0, member.get("elapsed", 0.0) - sum(member["stages"].values())
+            )
+            members.append(member)
+        totals = {stage: 0.0 for stage in STAGES + ("other",)}
+        for member in members:
+            for stage, value in member["stages"].items():
+                totals[stage] += value
+        return {
+            "members": members,
+            "total": {
+                "rows": sum(member["rows"] for member in members),
+                "elapsed": sum(member.get("elapsed", 0.0) for member in members),
+                "stages": totals,
+            },
+        }
+
+    def save(self, filename):
+        with open(filename, mode="w") as fobj:
+            json.dump(self.report(), fobj, indent=2)
+
+    def summary(self):
+        "Table with the share of time of each stage, per member"
+
+        report = self.report()
+        columns = STAGES + ("other",)
+        lines = [
+            f"{'year':>16} {'file':40} {'rows':>9} {'rows/s':>8} {'total':>8} "
+            + " ".join(f"{column:>9}" for column in columns)
+            + (f" {'mem peak':>9}" if self.trace_memory else "")
+        ]
+        for member in report["members"] + [dict(report["total"], year="", filename="TOTAL")]:
+            elapsed = member.get("elapsed", 0.0)
+            speed = member["rows"] / elapsed if elapsed else 0
+            line = (
+                f"{member['year']!s:>16} {member['filename'][-40:]:40} "
+                f"{member['rows']:9d} {speed:8.0f} {elapsed:7.2f}s "
+                + " ".join(
+                    f"{100 * member['stages'][column] / elapsed if elapsed else 0:8.1f}%"
+                    for column in columns
+                )
+            )
+            if self.trace_memory and "memory_peak" in member:
+                line += f" {member['memory_peak'] / 1024 / 1024:6.1f}MiB"
+            lines.append(line)
+        return "\n".join(lines)
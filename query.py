@@ -0,0 +1,167 @@
+"""Query the extracted files (`tse.py query`)
+
+The smallest source available for a dataset is read:
+
+- partitioned output (`tse.py <type> --partition-by ...`): only the files of
+  the partitions matching the conditions (if the partitions are not older
+  than the `.csv.gz` file);
+- seekable file (`tse.py <type> --seekable`): only the blocks of the matching
+  years/states (see `readers.py`);
+- otherwise, the whole `.csv.gz` file.
+
+The other conditions are checked for each row (by position: no dicts are
+created) and only the projected columns are copied to the output.
+"""
+
+import csv
+import json
+import os
+from pathlib import Path
+from urllib.parse import unquote
+
+from rows.utils import open_compressed
+
+import readers
+import writers
+
+
+def parse_where(values):
+    """Conditions (field name -> value) from `name=value` strings
+
+    >>> parse_where(["ano_eleicao=2020", "cargo=VICE-PREFEITO"])
+    {'ano_eleicao': '2020', 'cargo': 'VICE-PREFEITO'}
+    """
+    where = {}
+    for value in values:
+        name, separator, value = value.partition("=")
+        if not separator or not name:
+            raise ValueError(f"Invalid condition (use name=value): {name}")
+        where[name] = value
+    return where
+
+
+def field_name(name, field_names):
+    "Field of `field_names` for `name` (accepting the partition field aliases)"
+    try:
+        return writers.partition_field(name, field_names)
+    except ValueError:
+        raise ValueError(f"Unknown field: {name}")
+
+
+def read_header(filename):
+    with open_compressed(filename, mode="r", encoding="utf-8") as fobj:
+        return next(csv.reader(fobj))
+
+
+def read_files(filenames):
+    "Rows of CSV files (without their headers)"
+    for filename in filenames:
+        with open_compressed(filename, mode="r", encoding="utf-8") as fobj:
+            reader = csv.reader(fobj)
+            next(reader)
+            yield from reader
+
+
+def partition_values(path, filename):
+    "Partition values (directory name -> value) of a partition file"
+    values = {}
+    for part in filename.parent.relative_to(path).parts:
+        name, _, value = part.partition("=")
+        values[name] = "" if value == writers.DEFAULT_PARTITION else unquote(value)
+    return values
+
+
+def partition_manifest(path, filename):
+    """Manifest of the partitioned output in `path` (`None` if it can't be used)
+
+    The partitions are not used if `filename` was written after them.
+    """
+    manifest_filename = Path(path) / writers.PARTITIONS_MANIFEST
+    try:
+        with open(manifest_filename) as fobj:
+            manifest = json.load(fobj)
+        mtime = os.stat(manifest_filename).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    if manifest.get("version") != writers.PARTITIONS_MANIFEST_VERSION:
+        return None
+    if Path(filename).exists() and os.stat(filename).st_mtime_ns > mtime:
+        return None
+    return manifest
+
+
+def select(field_names, data, where, columns):
+    "Project the rows (lists) of `data` which match `where` (by field position)"
+    conditions = [(field_names.index(name), value) for name, value in where.items()]
+    positions = [field_names.index(name) for name in columns]
+    for row in data:
+        for position, value in conditions:
+            if row[position] != value:
+                break
+        else:
+            yield [row[position] for position in positions]
+
+
+def query(filename, partitions_path, where, columns=None):
+    """Find the rows matching `where` in the best source for a dataset
+
+    `filename` is the (possibly seekable) `.csv.gz` file and `partitions_path`
+    the directory of the partitioned output (see `partition_manifest`). Returns
+    a dict with the output `fields`, the `rows` (an iterator of lists) and a
+    description of the `source` used.
+    """
+    manifest = partition_manifest(partitions_path, filename)
+    reader = None
+    if manifest is not None:
+        field_names = manifest["fields"]
+    else:
+        field_names = read_header(filename)
+        try:
+            reader = readers.SeekableCsvReader(filename)
+        except ValueError:  # No block index (or an old one)
+            pass
+    where = {field_name(name, field_names): value for name, value in where.items()}
+    columns = [field_name(name, field_names) for name in columns or field_names]
+
+    if manifest is not None:
+        filenames = [Path(partitions_path) / name for name in manifest["files"]]
+        selected = [
+            partition_filename
+            for partition_filename in filenames
+            if all(
+                where.get(field_name(name, field_names), value) == value
+                for name, value in partition_values(partitions_path, partition_filename).items()
+            )
+        ]
+        source, data = f"{len(selected)} of {len(filenames)} partitions", read_files(selected)
+    elif reader is not None:
+        indexed = {name: value for name, value in where.items() if name in reader.partition_fields}
+        ranges = reader.ranges(**indexed) if indexed else reader.index["ranges"]
+        source = f"{len(ranges)} of {len(reader.index['ranges'])} indexed ranges"
+        data = reader.rows(**indexed)
+    else:
+        source, data = "full scan", read_files([filename])
+    return {
+        "fields": columns,
+        "rows": select(field_names, data, where, columns),
+        "source": source,
+    }
+
+
+def write_results(fobj, fields, data, output_format="csv"):
+    "Write the rows as CSV (with header) or JSON lines and return how many"
+    total = 0
+    if output_format == "csv":
+        writer = csv.writer(fobj)
+        writer.writerow(fields)
+        for row in data:
+            writer.writerow(row)
+            total += 1
+    elif output_format == "jsonl":
+        dumps, write = json.dumps, fobj.write
+        for row in data:
+            write(dumps(dict(zip(fields, row)), ensure_ascii=False) + "\n")
+            total += 1
+    else:
+        raise ValueError(f"Unknown output format: {output_format}")
+    return total
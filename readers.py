@@ -0,0 +1,129 @@
+"""Read the seekable CSV files created with `tse.py --seekable`
+
+These files are made of BGZF blocks (see `writers.SeekableCsvWriter`): any
+block can be decompressed alone and no row (except huge ones) crosses a block
+boundary. The index (`<filename>.blocks.json`) has the offset of each block
+and the blocks of each (year, state), so a reader can:
+
+- jump to the rows of one year/state (`SeekableCsvReader.rows(ano="2020")`);
+- split the file in parts with about the same compressed size, to be read by
+  different processes (`SeekableCsvReader.split` and `read_part`).
+"""
+
+import csv
+import gzip
+import io
+import json
+import os
+
+import writers
+
+
+class FileSlice(io.RawIOBase):
+    "Read-only file-like object with the bytes `start:end` of a file"
+
+    def __init__(self, fobj, start, end):
+        self.fobj = fobj
+        self.position = start
+        self.end = end
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        size = min(len(buffer), self.end - self.position)
+        if size <= 0:
+            return 0
+        self.fobj.seek(self.position)
+        data = self.fobj.read(size)
+        buffer[:len(data)] = data
+        self.position += len(data)
+        return len(data)
+
+
+class SeekableCsvReader:
+    """Read rows from a seekable CSV file (by year/state or by parts)
+
+    >>> reader = SeekableCsvReader("data/output/candidatura.csv.gz")  # doctest: +SKIP
+    >>> for row in reader.rows(ano="2020", sigla_unidade_federativa="SP"):  # doctest: +SKIP
+    ...     print(row)
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        index_filename = writers.seekable_index_filename(filename)
+        try:
+            with open(index_filename) as fobj:
+                self.index = json.load(fobj)
+        except FileNotFoundError:
+            raise ValueError(f"{filename} has no block index (create it with --seekable)")
+        if self.index.get("version") != writers.SEEKABLE_INDEX_VERSION:
+            raise ValueError(f"Incompatible block index: {index_filename}")
+        if os.stat(filename).st_size != self.index["end"] + len(writers.BGZF_EOF):
+            raise ValueError(f"{filename} changed after its block index was created")
+        self.fields = self.index["fields"]
+        self.partition_fields = self.index["partition_fields"]
+        self.offsets = [offset for offset, _ in self.index["blocks"]] + [self.index["end"]]
+
+    def __len__(self):
+        return self.index["rows"]
+
+    def read_blocks(self, first_block, last_block):
+        "Rows (lists) from the blocks `first_block` to `last_block` (inclusive)"
+        with open(self.filename, mode="rb") as fobj:
+            data = FileSlice(fobj, self.offsets[first_block], self.offsets[last_block + 1])
+            text = io.TextIOWrapper(gzip.GzipFile(fileobj=data), encoding="utf-8", newline="")
+            yield from csv.reader(text)
+
+    def ranges(self, **values):
+        "Year/state ranges (dicts) with the partition field values in `values`"
+        unknown = set(values) - set(self.partition_fields)
+        if unknown:
+            raise ValueError(
+                f"Not indexed: {', '.join(sorted(unknown))} "
+                f"(available: {', '.join(self.partition_fields)})"
+            )
+        values = {key: str(value) for key, value in values.items()}
+        return [
+            item
+            for item in self.index["ranges"]
+            if all(item[key] == value for key, value in values.items())
+        ]
+
+    def rows(self, **values):
+        """Rows (lists) whose partition fields are equal to `values`
+
+        Only the blocks of the matching ranges are read.
+        """
+        if not values:
+            for part in self.split(1):
+                yield from self.read_part(part)
+            return
+        for item in self.ranges(**values):
+            yield from self.read_blocks(item["first_block"], item["last_block"])
+
+    def split(self, parts):
+        """Split the data blocks in up to `parts` (first, last) block ranges
+
+        Each part has about the same compressed size and starts at a block
+        which starts a row, so parts can be read independently (see
+        `read_part`) and, concatenated in order, have all rows of the file.
+        """
+        blocks = self.index["blocks"]
+        # Block 0 has only the header
+        starts = [number for number in range(1, len(blocks)) if blocks[number][1] is not None]
+        if not starts:
+            return []
+        first_offset, total = self.offsets[1], self.offsets[-1] - self.offsets[1]
+        result, first = [], starts[0]
+        for number in starts[1:]:
+            # Cut before the block which would make this part bigger than its share
+            if self.offsets[number] - first_offset >= total * (len(result) + 1) / parts:
+                result.append((first, number - 1))
+                first = number
+        result.append((first, len(blocks) - 1))
+        return result
+
+    def read_part(self, part):
+        "Rows (lists) from a part returned by `split`"
+        return self.read_blocks(*part)
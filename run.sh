@@ -8,9 +8,11 @@ OUTPUT_PATH=$DATA_PATH/output
 rm -rf $OUTPUT_PATH
 mkdir -p $OUTPUT_PATH
 
-OPTS=""
+# Years already extracted (in data/parts) are re-extracted only if their
+# archive or the headers/schema/code changed
+OPTS="--incremental"
 if [ "$1" = "--use-mirror" ]; then
-	OPTS="$1"
+	OPTS="$OPTS $1"
 fi
 
 time python tse.py headers
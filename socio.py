@@ -1,10 +1,15 @@
 import csv
+import hashlib
+import math
+import os
 import uuid
-from collections import defaultdict
-from dataclasses import dataclass
+from array import array
+from bisect import bisect_left
+from collections import defaultdict, namedtuple
+from functools import lru_cache
+from itertools import combinations, islice
 from pathlib import Path
 
-import distance
 import rows
 from tqdm import tqdm
 
@@ -37,39 +42,181 @@ def parse_company_name(words):
     return (document, " ".join(words).strip())
 
 
-@dataclass
+PERSON_URL = "https://id.brasil.io/person/v1/{}"
+PERSON_CACHE_SIZE = 2 ** 20
+CHUNK_SIZE = 10_000
+_NAMESPACE_URL = uuid.NAMESPACE_URL.bytes
+
+
+def uuid5_string(name):
+    """Same as `str(uuid.uuid5(uuid.NAMESPACE_URL, name))`, without `UUID`
+
+    >>> uuid5_string("https://brasil.io/") == str(uuid.uuid5(uuid.NAMESPACE_URL, "https://brasil.io/"))
+    True
+    """
+    digest = bytearray(hashlib.sha1(_NAMESPACE_URL + name.encode("utf-8")).digest()[:16])
+    digest[6] = (digest[6] & 0x0F) | 0x50  # Version 5
+    digest[8] = (digest[8] & 0x3F) | 0x80  # RFC 4122 variant
+    value = digest.hex()
+    return f"{value[:8]}-{value[8:12]}-{value[12:16]}-{value[16:20]}-{value[20:]}"
+
+
+@lru_cache(maxsize=PERSON_CACHE_SIZE)
+def name_slug(name):
+    return rows.utils.slug(name.strip(), separator="-").upper()
+
+
+@lru_cache(maxsize=PERSON_CACHE_SIZE)
+def person_identity(document_digits, name):
+    """`(key, uuid)` of a person, by the digits used from the document
+
+    Invalid documents/names also get a key (as they always did - changing it
+    would change the UUIDs already published).
+    """
+    key = f"{document_digits}-{name_slug(name)}"
+    return key, uuid5_string(PERSON_URL.format(key))
+
+
+def person_uuids(pairs):
+    "UUIDs (strings) of `(document, name)` pairs - same as `str(Person(...).uuid)`"
+    identity = person_identity
+    return [identity(document.strip()[3:9], name)[1] for document, name in pairs]
+
+
+def chunks(iterable, size=CHUNK_SIZE):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            break
+        yield chunk
+
+
 class Person:
-    document: str
-    name: str
+    __slots__ = ("document", "name", "_identity")
+
+    def __init__(self, document, name):
+        self.document = document
+        self.name = name
+        self._identity = None
+
+    def __repr__(self):
+        return f"Person(document={self.document!r}, name={self.name!r})"
+
+    def __eq__(self, other):
+        if not isinstance(other, Person):
+            return NotImplemented
+        return (self.document, self.name) == (other.document, other.name)
+
+    @property
+    def identity(self):
+        if self._identity is None:
+            self._identity = person_identity(self.document.strip()[3:9], self.name)
+        return self._identity
 
     @property
     def key(self):
-        if getattr(self, "_key", None) is None:
-            document = self.document.strip()
-            name = rows.utils.slug(self.name.strip(), separator="-").upper()
-            if not document or len(document) != 11 or not name:
-                self._key = None
-            self._key = f"{document[3:9]}-{name}"
-        return self._key
+        return self.identity[0]
 
     @property
     def url(self):
-        if getattr(self, "_url", None) is None:
-            self._url = f"https://id.brasil.io/person/v1/{self.key}"
-        return self._url
+        return PERSON_URL.format(self.key)
 
     @property
     def uuid(self):
-        if getattr(self, "_uuid", None) is None:
-            self._uuid = uuid.uuid5(uuid.NAMESPACE_URL, self.url)
-        return self._uuid
+        return uuid.UUID(self.identity[1])
+
+
+def uuid_hash(value):
+    """First 64 bits of a UUID (in its string form)
+
+    >>> hex(uuid_hash("12345678-9abc-5def-8123-456789abcdef"))
+    '0x123456789abc5def'
+    """
+    return int(value[:8] + value[9:13] + value[14:18], 16)
+
+
+def mix64(value):
+    """Spread the bits of a 64-bit integer over all the result bits (splitmix64)
+
+    >>> hex(mix64(1))
+    '0x5692161d100b05e5'
+    """
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & 0xFFFFFFFFFFFFFFFF
+    return value ^ (value >> 31)
+
+
+class BloomFilter:
+    """Bloom filter of 64-bit integers (such as `uuid_hash` results)
+
+    The bit positions are derived from `mix64(value)` (double hashing): some
+    bits of the values may be fixed (like the version of a UUID), so they
+    can't be used directly.
+    """
+
+    def __init__(self, capacity, bits_per_item=16, hashes=3):
+        self.capacity = max(capacity, 1)
+        size = 1 << max(3, (self.capacity * bits_per_item - 1).bit_length())
+        self.mask = size - 1
+        self.bits = bytearray(size >> 3)
+        self.hashes = hashes
+
+    @property
+    def false_positive_rate(self):
+        "Expected false positive rate with `capacity` values added"
+        return (1 - math.exp(-self.hashes * self.capacity / (self.mask + 1))) ** self.hashes
+
+    def _positions(self, value):
+        value = mix64(value)
+        first, second = value & 0xFFFFFFFF, (value >> 32) | 1
+        return [(first + index * second) & self.mask for index in range(self.hashes)]
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value):
+        bits = self.bits
+        for position in self._positions(value):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+
+class UUIDSet:
+    """Compact set of UUIDs, stored as a sorted array of `uuid_hash` values
+
+    Each UUID takes 8 bytes (plus 2 bytes of the Bloom filter), instead of
+    ~100 bytes of a 36-character string in a `set`. Most of the values not in
+    the set are rejected by the Bloom filter, before the binary search.
+    """
+
+    def __init__(self, values):
+        self.hashes = array("Q", sorted({uuid_hash(value) for value in values if value}))
+        self.bloom = BloomFilter(len(self.hashes))
+        for value in self.hashes:
+            self.bloom.add(value)
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def __contains__(self, value):
+        return self.contains_hash(uuid_hash(value))
+
+    def contains_hash(self, value):
+        if value not in self.bloom:
+            return False
+        index = bisect_left(self.hashes, value)
+        return index < len(self.hashes) and self.hashes[index] == value
 
 
 class Entity:
 
-    def __init__(self, input_filename, file_type="full"):
+    def __init__(self, input_filename, file_type="full", cache_filename=None):
         self.input_filename = input_filename
         self.file_type = file_type
+        self.cache_filename = cache_filename
 
     def read(self):
         fobj = rows.utils.open_compressed(self.input_filename)
@@ -83,10 +230,22 @@ class Entity:
         yield from self.data()
 
     def get_data(self):
-        if self.file_type == "full":
-            yield from self.filtered_data()
-        else:
-            yield from self.data()
+        data = self.filtered_data() if self.file_type == "full" else self.data()
+        if self.cache_filename is None:
+            yield from data
+            return
+
+        # The converted rows are saved while they're read, so the next reads
+        # use the cache file (it's renamed only after all the rows are saved)
+        cache_filename = Path(self.cache_filename)
+        temp_filename = cache_filename.with_name(f"tmp-{cache_filename.name}")
+        writer = rows.utils.CsvLazyDictWriter(temp_filename)
+        for row in data:
+            writer.writerow(row)
+            yield row
+        writer.close()
+        os.replace(temp_filename, cache_filename)
+        self.input_filename, self.file_type, self.cache_filename = cache_filename, "filtered", None
 
     def convert_to(self, output_filename):
         writer = rows.utils.CsvLazyDictWriter(output_filename)
@@ -98,13 +257,22 @@ class Entity:
 class Partner(Entity):
 
     def data(self):
-        for row in tqdm(self.read(), desc="Reading partner file"):
-            if "partner_uuid" not in row:
-                partner = Person(row["cnpj_cpf_do_socio"], row["nome_socio"])
-                representative = Person(row["cpf_representante_legal"], row["nome_representante_legal"])
-                row["partner_uuid"] = str(partner.uuid) if partner.key else None
-                row["representative_uuid"] = str(representative.uuid) if representative.key else None
-            yield row
+        for chunk in chunks(tqdm(self.read(), desc="Reading partner file")):
+            pending = [row for row in chunk if "partner_uuid" not in row]
+            if pending:
+                partner_uuids = person_uuids(
+                    (row["cnpj_cpf_do_socio"], row["nome_socio"]) for row in pending
+                )
+                representative_uuids = person_uuids(
+                    (row["cpf_representante_legal"], row["nome_representante_legal"])
+                    for row in pending
+                )
+                for row, partner_uuid, representative_uuid in zip(
+                    pending, partner_uuids, representative_uuids
+                ):
+                    row["partner_uuid"] = partner_uuid
+                    row["representative_uuid"] = representative_uuid
+            yield from chunk
 
     def filtered_data(self):
         for row in self.data():
@@ -123,11 +291,13 @@ class Partner(Entity):
 class Candidate(Entity):
 
     def data(self):
-        for row in tqdm(self.read(), desc="Reading candidate file"):
-            if "person_uuid" not in row:
-                person = Person(row["cpf"], row["nome"])
-                row["person_uuid"] = str(person.uuid) if person.key else None
-            yield row
+        for chunk in chunks(tqdm(self.read(), desc="Reading candidate file")):
+            pending = [row for row in chunk if "person_uuid" not in row]
+            if pending:
+                uuids = person_uuids((row["cpf"], row["nome"]) for row in pending)
+                for row, person_uuid in zip(pending, uuids):
+                    row["person_uuid"] = person_uuid
+            yield from chunk
 
     def filtered_data(self):
         for row in self.data():
@@ -142,26 +312,38 @@ class Candidate(Entity):
 
 class Company(Entity):
 
-    def __init__(self, input_filename, company_type_filename, file_type="full"):
-        super().__init__(input_filename=input_filename, file_type=file_type)
+    def __init__(self, input_filename, company_type_filename, file_type="full",
+            cache_filename=None):
+        super().__init__(
+            input_filename=input_filename,
+            file_type=file_type,
+            cache_filename=cache_filename,
+        )
         self.company_type_filename = company_type_filename
 
+    def owner(self, row):
+        "`(document, name)` of the owner, from the company name (or `None`)"
+        for field_name in ("razao_social", "nome_fantasia"):
+            words = row[field_name].split()
+            if words and words[-1].isdigit():
+                document, name = parse_company_name(words)
+                if document is not None:
+                    return document, name
+        return None
+
     def data(self):
-        for row in tqdm(self.read(), desc="Reading company file"):
-            if "owner_uuid" not in row:
-                row["owner_uuid"] = None
-                for field_name in ("razao_social", "nome_fantasia"):
-                    words = row[field_name].split()
-                    if words and words[-1].isdigit():
-                        document, name = parse_company_name(words)
-                        if document is None:
-                            continue
-                        person = Person(document, name)
-                        if person.key is None:
-                            continue
-                        row["owner_uuid"] = str(person.uuid)
-                        break
-            yield row
+        for chunk in chunks(tqdm(self.read(), desc="Reading company file")):
+            pending, owners = [], []
+            for row in chunk:
+                if "owner_uuid" not in row:
+                    row["owner_uuid"] = None
+                    owner = self.owner(row)
+                    if owner is not None:
+                        pending.append(row)
+                        owners.append(owner)
+            for row, owner_uuid in zip(pending, person_uuids(owners)):
+                row["owner_uuid"] = owner_uuid
+            yield from chunk
 
     def filtered_data(self):
         individual_company_codes = tuple(
@@ -179,75 +361,197 @@ class Company(Entity):
             yield (row["owner_uuid"], row)
 
 
-if __name__ == "__main__":
-    BASE_PATH = Path(__file__).parent.absolute()
-    ELECTIONS_PATH = BASE_PATH / "data" / "output"
-    COMPANIES_PATH = BASE_PATH.parent / "socios-brasil" / "data"
-    partner_filename = COMPANIES_PATH / "output" / "socio.csv.gz"
-    filtered_partner_filename = COMPANIES_PATH / "output" / "socio-filtrado.csv.gz"
-    company_filename = COMPANIES_PATH / "output" / "empresa.csv.gz"
-    filtered_company_filename = COMPANIES_PATH / "output" / "empresa-filtrado.csv.gz"
-    company_type_filename = COMPANIES_PATH / "natureza-juridica.csv"
-    candidate_filename = ELECTIONS_PATH / "candidatura.csv.gz"
-    filtered_candidate_filename = ELECTIONS_PATH / "candidatura-filtrado.csv.gz"
-    output_filename = ELECTIONS_PATH / "politico_socio.csv.gz"
+Conflict = namedtuple("Conflict", ["person_uuid", "cpf_1", "cpf_2", "reason"])
+
+
+def bounded_levenshtein(a, b, limit):
+    """Edit distance between `a` and `b` or `limit + 1`, if it's greater
+
+    The common prefix and suffix are removed first and the computation stops
+    as soon as all the values in a row of the matrix are greater than `limit`.
+
+    >>> bounded_levenshtein("123456789", "213456789", 1)
+    2
+    >>> bounded_levenshtein("123456789", "023456789", 1)
+    1
+    >>> bounded_levenshtein("000456789", "999456789", 1)
+    2
+    """
+    start = 0
+    while start < len(a) and start < len(b) and a[start] == b[start]:
+        start += 1
+    end_a, end_b = len(a), len(b)
+    while end_a > start and end_b > start and a[end_a - 1] == b[end_b - 1]:
+        end_a -= 1
+        end_b -= 1
+    a, b = a[start:end_a], b[start:end_b]
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    if not a or not b:
+        return len(a) or len(b)
+
+    previous = list(range(len(b) + 1))
+    for index_a, char_a in enumerate(a, start=1):
+        current = [index_a]
+        for index_b, char_b in enumerate(b, start=1):
+            current.append(
+                min(
+                    previous[index_b] + 1,
+                    current[index_b - 1] + 1,
+                    previous[index_b - 1] + (char_a != char_b),
+                )
+            )
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return min(previous[-1], limit + 1)
+
+
+class CPFConflictDetector:
+    """Find people (UUIDs) with different CPFs
+
+    The UUID of a person depends only on part of the CPF (see
+    `person_identity`), so different people may share one. The CPF prefixes
+    (first 9 digits) are grouped by UUID (the blocks) and all the pairs of
+    each block are compared: CPFs with the same digits in another order (in
+    the part not used by the key) or with up to `max_distance` edits (typos)
+    are considered the same person. Masked CPFs (`***`, as in the censored
+    `candidatura` output) can't be compared (they're counted in `masked`) and
+    blocks with more than `max_block_size` CPFs are reported as a whole, so
+    the time is linear on the number of rows.
+    """
 
-    if not filtered_candidate_filename.exists():
-        print("Converting candidates")
-        Candidate(candidate_filename, file_type="full").convert_to(filtered_candidate_filename)
-    if not filtered_partner_filename.exists():
-        print("Converting partners")
-        Partner(partner_filename, file_type="full").convert_to(filtered_partner_filename)
-    if not filtered_company_filename.exists():
-        print("Converting companies")
-        Company(company_filename, company_type_filename, file_type="full").convert_to(filtered_company_filename)
-
-    candidate_uuids = set(
-        person_uuid
-        for person_uuid, _ in Candidate(filtered_candidate_filename, file_type="filtered").keys()
-    )
+    def __init__(self, max_distance=1, max_block_size=16):
+        self.max_distance = max_distance
+        self.max_block_size = max_block_size
+        # UUID -> CPF prefixes (a dict, so the order is kept)
+        self.blocks = defaultdict(dict)
+        self.masked = 0
+
+    def add(self, person_uuid, cpf):
+        if "*" in cpf:
+            self.masked += 1
+        self.blocks[person_uuid][cpf[:9]] = None
+
+    def compare(self, cpf_1, cpf_2):
+        "The reason why both CPFs are from different people (or `None`)"
+        if "*" in cpf_1 or "*" in cpf_2:
+            return None
+        elif set(cpf_1[:3]) == set(cpf_2[:3]):
+            return None
+        distance = bounded_levenshtein(cpf_1, cpf_2, self.max_distance)
+        if distance > self.max_distance:
+            return f"edit distance greater than {self.max_distance}"
+        return None
+
+    def conflicts(self):
+        for person_uuid, cpfs in self.blocks.items():
+            if len(cpfs) < 2:
+                continue
+            cpfs = list(cpfs)
+            if len(cpfs) > self.max_block_size:
+                yield Conflict(person_uuid, cpfs[0], cpfs[-1], f"{len(cpfs)} different CPFs")
+                continue
+            for cpf_1, cpf_2 in combinations(cpfs, 2):
+                reason = self.compare(cpf_1, cpf_2)
+                if reason is not None:
+                    yield Conflict(person_uuid, cpf_1, cpf_2, reason)
+
+
+def match_politicians(candidates, partners, companies, output_filename,
+        conflicts_filename=None):
+    """Write the candidacies of partners/owners of companies to `output_filename`
+
+    The candidate file is read twice (to find the candidates' UUIDs and to
+    write the result) and the partner and company files only once. The
+    people with conflicting CPFs (see `CPFConflictDetector`) are saved to
+    `conflicts_filename`, if given; the conflicts can only be found if the
+    candidate file was extracted with `--no-censorship` (a warning is shown
+    if it has masked CPFs).
+    """
+    candidate_uuids = UUIDSet(person_uuid for person_uuid, _ in candidates.keys())
     print(f"Total de candidatos com CPF: {len(candidate_uuids)}")
 
-    business_and_politician = defaultdict(set)
-    for partner_uuid, row in Partner(filtered_partner_filename, file_type="filtered").keys():
-        if partner_uuid in candidate_uuids:
-            business_and_politician[partner_uuid].add(row["cnpj"])
+    # UUID hash -> CNPJs (a dict, so the order is kept)
+    business_and_politician = defaultdict(dict)
+    for partner_uuid, row in partners.keys():
+        value = uuid_hash(partner_uuid)
+        if candidate_uuids.contains_hash(value):
+            business_and_politician[value][row["cnpj"]] = None
     total_1 = len(business_and_politician)
     print(f"Total de candidatos sócios de empresas não-individuais: {total_1}")
 
-    for partner_uuid, row in Company(filtered_company_filename, company_type_filename, file_type="filtered").keys():
-        if partner_uuid in candidate_uuids:
-            business_and_politician[partner_uuid].add(row["cnpj"])
+    for owner_uuid, row in companies.keys():
+        value = uuid_hash(owner_uuid)
+        if candidate_uuids.contains_hash(value):
+            business_and_politician[value][row["cnpj"]] = None
     total_2 = len(business_and_politician)
     print(f"Total de candidatos sócios de empresas individuais: {total_2 - total_1}")
     print(f"Total de candidatos sócios de empresas: {total_2}")
 
-    cpfs_per_uuid = defaultdict(set)
-    for person_uuid, row in Candidate(filtered_candidate_filename, file_type="filtered").keys():
-        if person_uuid not in business_and_politician:
-            continue
-        cpfs_per_uuid[person_uuid].add(row["cpf"][:9])
-    conflicting_cpfs = set()
-    for person_uuid, values in cpfs_per_uuid.items():
-        if len(values) == 1:
-            continue
-        values = list(values)
-        for v1, v2 in zip(values, values[1:]):
-            if set(v1[:3]) == set(v2[:3]):
-                continue
-            elif distance.levenshtein(v1, v2) >= 2:
-                conflicting_cpfs.add(person_uuid)
-    print(f"Encontrados {len(conflicting_cpfs)} CPFs conflitantes")
-
     cnpjs = set()
+    detector = CPFConflictDetector()
     writer = rows.utils.CsvLazyDictWriter(output_filename)
-    for person_uuid, row in Candidate(filtered_candidate_filename, file_type="filtered").keys():
-        candidate_companies = business_and_politician.get(person_uuid, None)
-        if candidate_companies is None or row["cpf"] in conflicting_cpfs:
+    for person_uuid, row in candidates.keys():
+        if not person_uuid:
+            continue
+        candidate_companies = business_and_politician.get(uuid_hash(person_uuid), None)
+        if candidate_companies is None:
             continue
+        detector.add(person_uuid, row["cpf"])
         for company_document in candidate_companies:
             new = row.copy()
             new["cnpj"] = company_document
             cnpjs.add(company_document)
             writer.writerow(new)
+    writer.close()
+
+    # The conflicts are only reported (the rows are kept in the result)
+    conflicting_uuids = set()
+    if conflicts_filename is not None:
+        conflicts_writer = rows.utils.CsvLazyDictWriter(conflicts_filename)
+    for conflict in detector.conflicts():
+        conflicting_uuids.add(conflict.person_uuid)
+        if conflicts_filename is not None:
+            conflicts_writer.writerow(conflict._asdict())
+    if conflicts_filename is not None:
+        conflicts_writer.close()
+    print(f"Encontrados {len(conflicting_uuids)} CPFs conflitantes")
+    if detector.masked:
+        print(
+            f"AVISO: {detector.masked} candidaturas com CPF censurado (***), que não "
+            "podem ser comparados: para detectar CPFs conflitantes, extraia as "
+            "candidaturas com `tse.py candidatura --no-censorship`"
+        )
     print(f"Total de CNPJs encontrados: {len(cnpjs)}")
+
+if __name__ == "__main__":
+    BASE_PATH = Path(__file__).parent.absolute()
+    ELECTIONS_PATH = BASE_PATH / "data" / "output"
+    COMPANIES_PATH = BASE_PATH.parent / "socios-brasil" / "data"
+    partner_filename = COMPANIES_PATH / "output" / "socio.csv.gz"
+    filtered_partner_filename = COMPANIES_PATH / "output" / "socio-filtrado.csv.gz"
+    company_filename = COMPANIES_PATH / "output" / "empresa.csv.gz"
+    filtered_company_filename = COMPANIES_PATH / "output" / "empresa-filtrado.csv.gz"
+    company_type_filename = COMPANIES_PATH / "natureza-juridica.csv"
+    candidate_filename = ELECTIONS_PATH / "candidatura.csv.gz"
+    filtered_candidate_filename = ELECTIONS_PATH / "candidatura-filtrado.csv.gz"
+    output_filename = ELECTIONS_PATH / "politico_socio.csv.gz"
+    conflicts_filename = ELECTIONS_PATH / "politico_socio_cpf_conflitante.csv.gz"
+
+    # The filtered files are created (in the same pass) if they don't exist
+    if filtered_candidate_filename.exists():
+        candidates = Candidate(filtered_candidate_filename, file_type="filtered")
+    else:
+        candidates = Candidate(candidate_filename, cache_filename=filtered_candidate_filename)
+    if filtered_partner_filename.exists():
+        partners = Partner(filtered_partner_filename, file_type="filtered")
+    else:
+        partners = Partner(partner_filename, cache_filename=filtered_partner_filename)
+    if filtered_company_filename.exists():
+        companies = Company(filtered_company_filename, company_type_filename, file_type="filtered")
+    else:
+        companies = Company(
+            company_filename, company_type_filename, cache_filename=filtered_company_filename
+        )
+    match_politicians(candidates, partners, companies, output_filename, conflicts_filename)
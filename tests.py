@@ -1,7 +1,54 @@
+import csv
+import datetime
+import decimal
+import gzip
+import hashlib
+import io
+import json
+import os
+import random
+import tempfile
+import threading
 import unittest
+import uuid
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from io import StringIO
+from pathlib import Path
+from unittest import mock
+from zipfile import ZipFile
 
-from extractors import CandidaturaExtractor
+import rows
+
+import downloader
+import enrich
+import layouts
+import loaders
+import lookup
+import mirror
+import profiling
+import query
+import readers
+import settings
+import socio
+import tse
+import utils
+import writers
+from benchmarks import synthetic
+from extractors import (
+    BemDeclaradoExtractor,
+    CandidaturaExtractor,
+    PrestacaoContasDespesasExtractor,
+    PrestacaoContasReceitasExtractor,
+    date_normalizer,
+    fix_data,
+    fix_sigla_unidade_federativa,
+    fix_valor,
+    obfuscate_cpf,
+    open_rar_member,
+    read_header,
+    row_selector,
+)
 
 
 class CandidaturaExtractorTestCase(unittest.TestCase):
@@ -34,3 +81,1339 @@ class CandidaturaExtractorTestCase(unittest.TestCase):
         input_data = '''"61937410978";""DAVID XIXICO"";"2";"DEFERIDO"'''
         expected_data = '''"61937410978";"""DAVID XIXICO""";"2";"DEFERIDO"'''
         self.assert_fix_fobj(input_data, expected_data)
+
+    def test_fix_multiple_lines(self):
+        input_data = (
+            '''"1";"SONIA "MEREU"";"2";"DEFERIDO"\n'''
+            '''"2";"JOSE DA SILVA";"2";"DEFERIDO"\n'''
+            '''"3";"DAVID ''XIXICO"";"2";"DEFERIDO"'''
+        )
+        expected_data = (
+            '''"1";"SONIA ""MEREU""";"2";"DEFERIDO"\n'''
+            '''"2";"JOSE DA SILVA";"2";"DEFERIDO"\n'''
+            '''"3";"DAVID ''XIXICO""";"2";"DEFERIDO"'''
+        )
+        self.assert_fix_fobj(input_data, expected_data)
+
+    def test_censorship(self):
+        values = {
+            "cpf": "12345678901",
+            "email": "ana@example.com",
+            "nome": "ANA",
+            "codigo_cargo": "11",
+            "cargo": "PREFEITO",
+        }
+        for censor, cpf, email in (
+            (True, "***456789**", ""),
+            (False, "12345678901", "ANA@EXAMPLE.COM"),
+        ):
+            extractor = CandidaturaExtractor(censor=censor)
+            header_meta = extractor.get_headers(2020, None, "consulta_cand_2020_SP.csv")
+            year_fields = [
+                field.nome_final or field.nome_tse for field in header_meta["year_fields"]
+            ]
+            final_fields = [
+                field.nome_final for field in header_meta["final_fields"] if field.nome_final
+            ]
+            convert = extractor.convert_row(year_fields, final_fields)
+            row = dict(
+                zip(
+                    extractor.output_fields,
+                    convert([values.get(name, "") for name in year_fields]),
+                )
+            )
+            self.assertEqual((row["cpf"], row["email"], row["nome"]), (cpf, email, "ANA"))
+
+    def test_fix_fobj_is_streamed(self):
+        input_data = '''"1";"SONIA "MEREU"";"2"\n"2";"JOSE";"2"\n'''
+        extractor = CandidaturaExtractor()
+        result = extractor.fix_fobj(StringIO(input_data))
+        self.assertEqual(result.read(5), '"1";"')
+        self.assertEqual(result.readline(), '''SONIA ""MEREU""";"2"\n''')
+        self.assertEqual(list(result), ['''"2";"JOSE";"2"\n'''])
+
+
+class FastNormalizationTestCase(unittest.TestCase):
+    def assert_same_values(self, extractor, values):
+        data = StringIO()
+        csv.writer(data, dialect=utils.TSEDialect, quoting=csv.QUOTE_ALL).writerow(values)
+        data = data.getvalue()
+        function = utils.unaccent_upper_function(extractor.null_values)
+        normalized_data = utils.LineFilter(StringIO(data), function)
+        expected = extractor.values_cleaner()(
+            next(csv.reader(StringIO(data), dialect=utils.TSEDialect))
+        )
+        result = extractor.values_cleaner(normalized=True)(
+            next(csv.reader(normalized_data, dialect=utils.TSEDialect))
+        )
+        self.assertEqual(result, expected)
+
+    def test_all_latin1_code_points(self):
+        extractor = CandidaturaExtractor()
+        for code in range(256):
+            char = chr(code)
+            values = [
+                char,
+                char * 3,
+                f" {char} ",
+                f"A{char}b",
+                f"a {char}",
+                f"{char} a",
+                f"#NULO{char}",
+                f"{char}#NE",
+                f"#NE{char}#",
+            ]
+            with self.subTest(code=code):
+                self.assert_same_values(extractor, values)
+
+    def test_null_values(self):
+        extractor = CandidaturaExtractor()
+        values = ["#NULO", " #NULO# ", "#nulo", "#Nulo#", "#ñe", "#ÑE#", "x#ne", "#NE"]
+        self.assert_same_values(extractor, values)
+        result = extractor.values_cleaner()(values)
+        self.assertEqual(result, ["", "", "#NULO", "#NULO#", "#NE", "#NE#", "X#NE", ""])
+
+
+def legacy_select(row_field_names, final_field_names, output_field_names, row):
+    "Values as they were selected before `row_selector` (dict + `DictWriter`)"
+    data = dict(zip(row_field_names, row))
+    new = {key: data.get(key, "") for key in final_field_names}
+    return [new.get(name, "") for name in output_field_names]
+
+
+def legacy_bem_declarado(row_field_names, final_field_names, output_field_names, row):
+    "`BemDeclaradoExtractor.convert_row` before `row_selector`"
+    data = dict(zip(row_field_names, row))
+    new = {}
+    for key in final_field_names:
+        value = data.get(key, "").strip()
+        if value in ("#NULO", "#NULO#", "#NE#"):
+            value = ""
+        new[key] = value = utils.unaccent(value).upper()
+    new["sigla_unidade_federativa"] = fix_sigla_unidade_federativa(new["sigla_unidade_federativa"])
+    new["valor"] = fix_valor(new["valor"])
+    return [new.get(name, "") for name in output_field_names]
+
+
+class RowSelectorTestCase(unittest.TestCase):
+    def assert_same_as_legacy(self, row_field_names, final_field_names, output_field_names, data):
+        select = row_selector(row_field_names, final_field_names, output_field_names)
+        for row in data:
+            with self.subTest(header=row_field_names, row=row):
+                self.assertEqual(
+                    list(select(row)),
+                    legacy_select(row_field_names, final_field_names, output_field_names, row),
+                )
+
+    def test_same_values_as_dict_selection(self):
+        output = ["ano", "nome", "cpf", "email", "situacao"]
+        final = ["ano", "nome", "cpf", "situacao"]
+        data = [
+            ["2018", "JOSE", "12345678901", "DEFERIDO"],  # Same width
+            ["2018", "JOSE"],  # Shorter than the header
+            [],
+            ["2018", "JOSE", "12345678901", "DEFERIDO", "EXTRA", "VALUES"],  # Longer
+        ]
+        cases = (
+            ["ano", "nome", "cpf", "situacao"],
+            # Renamed fields (`nome_final` of each `nome_tse`) in another order
+            ["situacao", "cpf", "ano", "nome"],
+            # Duplicated column: the last one wins, as in `dict(zip(...))`
+            ["ano", "nome", "nome", "cpf"],
+            # Final fields missing from this year's layout
+            ["ano", "descricao", "nome", "outro"],
+        )
+        for header in cases:
+            self.assert_same_as_legacy(header, final, output, data)
+
+    def test_unknown_final_field(self):
+        # `DictWriter` used to fail for fields not in the schema, too
+        with self.assertRaises(ValueError):
+            row_selector(["ano", "foo"], ["ano", "foo"], ["ano"])
+
+    def test_same_rows_as_dict_conversion(self):
+        extractor = BemDeclaradoExtractor()
+        factory = synthetic.ValueFactory(seed=1)
+        final_fields = [
+            field.nome_final
+            for field in read_header(settings.HEADERS_PATH / "bem_declarado_final.csv")
+            if field.nome_final
+        ]
+        for header_year in ("2006", "2014"):
+            year_fields = [
+                field.nome_final or field.nome_tse
+                for field in read_header(settings.HEADERS_PATH / f"bem_declarado_{header_year}.csv")
+            ]
+            convert = extractor.convert_row(year_fields, final_fields)
+            for index in range(500):
+                row = factory.row(year_fields, 2018, random.choice(synthetic.UFS))
+                row[random.randrange(len(row))] = random.choice([" #NULO ", "ação ", "#NE#"])
+                if index % 10 == 1:
+                    row = row[:random.randrange(len(row))]
+                elif index % 10 == 2:
+                    row = row + ["EXTRA"]
+                with self.subTest(header_year=header_year, row=row):
+                    self.assertEqual(
+                        list(convert(row)),
+                        legacy_bem_declarado(year_fields, final_fields, extractor.output_fields, row),
+                    )
+
+
+class DateNormalizerTestCase(unittest.TestCase):
+    def test_same_result_as_fix_data(self):
+        values = [
+            "",
+            "   ",
+            "00:00:00",
+            "01/02/2003",
+            "1/2/2003",
+            " 1/2/2003",
+            "01/02/03",
+            "01/02/70",
+            "31/02/2000",
+            "29/02/2000",
+            "29/02/1900",
+            "03/09/0941",
+            "03/09/0041",
+            "01/01/0000",
+            "01/01/0002",
+            "10/10/2020 00:00:00",
+            "15-JAN-98",
+            "15-jan-98",
+            "15-XYZ-98",
+            "2020-10-10",
+            "01/13/2000",
+            "001/01/2000",
+            "01/01/20000",
+            "0１/01/2000",
+        ]
+        random.seed(42)
+        for _ in range(2000):
+            day, month = random.randint(0, 32), random.randint(0, 13)
+            year = random.choice([random.randint(0, 2030), random.randint(0, 99)])
+            values.append(
+                random.choice(["{}/{}/{}", "{:02d}/{:02d}/{:04d}", "{:02d}/{:02d}/{:02d}"])
+                .format(day, month, year)
+            )
+
+        fix = date_normalizer(cache_size=16)
+        for value in values + values:
+            with self.subTest(value=value):
+                self.assertEqual(fix(value), fix_data(value))
+
+
+class PrestacaoContasExtractorTestCase(unittest.TestCase):
+    def test_get_headers_2018(self):
+        # Organizations of the despesas are "pagas-..." and "contratadas-..."
+        receita, despesa = PrestacaoContasReceitasExtractor, PrestacaoContasDespesasExtractor
+        cases = (
+            (receita, "2018_candidatos", "receitas_candidatos_2018_AC.csv",
+                "receita_candidatos_2018.csv"),
+            (receita, "2018_candidatos", "receitas_candidatos_doador_originario_2018_AC.csv",
+                "receita_originarios_candidatos_2018.csv"),
+            (receita, "2018_orgaos", "receitas_orgaos_partidarios_2018_AC.csv",
+                "receita_partidos_2018.csv"),
+            (receita, "2018_orgaos", "receitas_orgaos_partidarios_doador_originario_2018_AC.csv",
+                "receita_originarios_partidos_2018.csv"),
+            (despesa, "2018_candidatos", "despesas_contratadas_candidatos_2018_AC.csv",
+                "despesa_contratadas_candidatos_2018.csv"),
+            (despesa, "2018_candidatos", "despesas_pagas_candidatos_2018_AC.csv",
+                "despesa_pagas_candidatos_2018.csv"),
+            (despesa, "2018_orgaos", "despesas_contratadas_orgaos_partidarios_2018_AC.csv",
+                "despesa_contratadas_partidos_2018.csv"),
+            (despesa, "2018_orgaos", "despesas_pagas_orgaos_partidarios_2018_AC.csv",
+                "despesa_pagas_partidos_2018.csv"),
+        )
+        for ExtractorClass, year, internal_filename, header_filename in cases:
+            with self.subTest(internal_filename=internal_filename):
+                header_meta = ExtractorClass().get_headers(year, None, internal_filename)
+                self.assertEqual(header_meta["year_filename"].name, header_filename)
+                expected = rows.import_from_csv(settings.HEADERS_PATH / header_filename)
+                self.assertEqual(
+                    [field.nome_tse for field in header_meta["year_fields"]],
+                    [field.nome_tse for field in expected],
+                )
+
+    def test_members_are_opened_one_at_a_time(self):
+        with tempfile.TemporaryDirectory() as temp_path:
+            filename = Path(temp_path) / "prestacao_final_2012.zip"
+            with ZipFile(filename, mode="w") as zfile:
+                for uf in ("AC", "PI", "SP"):
+                    zfile.writestr(f"receitas_candidatos_2012_{uf}.txt", f'"{uf}"\n')
+                zfile.writestr("despesas_candidatos_2012_AC.txt", '"AC"\n')
+
+            extractor = PrestacaoContasReceitasExtractor()
+            names, previous = [], None
+            for internal_filename, fobj in extractor._iter_compressed_fobjs(filename, 2012):
+                if previous is not None:
+                    self.assertTrue(previous.closed)
+                names.append(internal_filename)
+                previous = fobj
+            self.assertTrue(previous.closed)
+        self.assertEqual(
+            names,
+            [f"receitas_candidatos_2012_{uf}.txt" for uf in ("AC", "PI", "SP")],
+        )
+
+    def test_open_rar_member_streams_command_output(self):
+        # `sh -c 'cat "$1"' <archive> <member>` plays the role of `unrar p`
+        commands = (("sh", "-c", 'cat "$1"'),)
+        with tempfile.TemporaryDirectory() as temp_path, \
+                mock.patch("extractors.RAR_COMMANDS", commands):
+            member = Path(temp_path) / "ReceitasCandidatos.txt"
+            member.write_bytes(b'"1";"JOS\xc9"\r\n' * 10000)
+            with open_rar_member("archive.rar", str(member)) as fobj:
+                self.assertEqual(fobj.read(), member.read_bytes())
+
+            with self.assertRaises(RuntimeError):
+                with open_rar_member("archive.rar", str(member) + "-missing") as fobj:
+                    fobj.read()
+
+
+class LayoutRegistryTestCase(unittest.TestCase):
+    header_filename = settings.HEADERS_PATH / "receita_candidatos_2012.csv"
+
+    def test_fingerprint(self):
+        def fingerprint(line, header_filename=self.header_filename):
+            return layouts.fingerprint(header_filename, line)
+
+        data_1 = '"1";"SP";"JOSE";"1234,56"\r\n'
+        data_2 = '"2";"AC";"MARIA DA SILVA";"1,00"\n'
+        header_1 = '"SEQUENCIAL_CANDIDATO";"SG_UF";"NOME"\r\n'
+        header_2 = '"SG_UF";"SEQUENCIAL_CANDIDATO";"NOME"\r\n'
+        self.assertEqual(fingerprint(data_1), fingerprint(data_2))
+        self.assertNotEqual(fingerprint(data_1), fingerprint(header_1))
+        self.assertNotEqual(fingerprint(header_1), fingerprint(header_2))
+        other_header_filename = settings.HEADERS_PATH / "receita_comites_2012.csv"
+        self.assertNotEqual(fingerprint(data_1), fingerprint(data_1, other_header_filename))
+
+    def test_layouts_are_detected_once_and_saved(self):
+        layout = {"delimiter": ";", "header": False, "fields": ["a"]}
+        detect = mock.Mock(return_value=layout)
+        with tempfile.TemporaryDirectory() as temp_path:
+            filename = Path(temp_path) / "layouts.json"
+            registry = layouts.LayoutRegistry(filename)
+            for line in ('"1";"SP"\n', '"2";"AC"\n'):
+                self.assertEqual(registry.resolve(self.header_filename, line, detect), layout)
+            self.assertEqual(detect.call_count, 1)
+
+            registry = layouts.LayoutRegistry(filename)
+            result = registry.resolve(self.header_filename, '"3";"RJ"\n', detect)
+            self.assertEqual(result, layout)
+            self.assertEqual(detect.call_count, 1)
+
+    def test_detect_layout(self):
+        extractor = PrestacaoContasReceitasExtractor()
+        header_meta = extractor.get_headers(2012, None, "receitas_candidatos_2012_AC.txt")
+        layout = extractor.detect_layout(header_meta, '"1";"SP";"JOSE ""ZE"" SILVA"\r\n')
+        self.assertEqual(layout["delimiter"], ";")
+        self.assertFalse(layout["header"])
+        self.assertEqual(
+            layout["fields"],
+            [field.nome_final or field.nome_tse for field in header_meta["year_fields"]],
+        )
+
+        names = [field.nome_tse for field in header_meta["year_fields"]]
+        line = ";".join(f'"{name}"' for name in reversed(names)) + "\r\n"
+        layout = extractor.detect_layout(header_meta, line)
+        self.assertTrue(layout["header"])
+        self.assertEqual(
+            layout["fields"],
+            [
+                field.nome_final or field.nome_tse
+                for field in reversed(header_meta["year_fields"])
+            ],
+        )
+
+
+class ProfilerTestCase(unittest.TestCase):
+    def test_null_profiler_does_not_wrap(self):
+        fobj, function = StringIO(), lambda row: row
+        self.assertIs(profiling.NULL_PROFILER.wrap_file(fobj, "decode"), fobj)
+        self.assertIs(profiling.NULL_PROFILER.wrap_function(function, "convert"), function)
+
+    def test_nested_stages(self):
+        clock = [0.0]
+
+        def tick(seconds):
+            clock[0] += seconds
+
+        profiler = profiling.Profiler()
+        with mock.patch("profiling.time.perf_counter", lambda: clock[0]):
+            profiler.start_member(2020, "consulta_cand_2020_AC.csv")
+            decode = profiler.wrap_function(lambda: tick(2), "decode")
+            parse = profiler.wrap_function(lambda: [tick(1), decode(), tick(0.5)], "parse")
+            write = profiler.wrap_function(lambda row: tick(0.25), "write", count_rows=True)
+            parse()
+            write(["1"])
+            write(["2"])
+            tick(1)
+            profiler.finish()
+
+        member = profiler.report()["members"][0]
+        self.assertEqual(member["rows"], 2)
+        self.assertEqual(member["elapsed"], 5)
+        self.assertEqual(member["stages"]["decode"], 2)
+        self.assertEqual(member["stages"]["parse"], 1.5)
+        self.assertEqual(member["stages"]["write"], 0.5)
+        self.assertEqual(member["stages"]["other"], 1)
+
+    def test_wrapped_files(self):
+        data = '"1";"JOSÉ"\r\n"2";"MARIA"\r\n'.encode("latin-1")
+        profiler = profiling.Profiler()
+        profiler.start_member(2020, "consulta_cand_2020_AC.csv")
+        fobj = profiler.wrap_file(io.BytesIO(data), "inflate")
+        fobj = profiler.wrap_file(io.TextIOWrapper(fobj, encoding="latin-1"), "decode")
+        reader = profiler.wrap_iterator(csv.reader(fobj, dialect=utils.TSEDialect), "parse")
+        self.assertEqual(list(reader), [["1", "JOSÉ"], ["2", "MARIA"]])
+        profiler.finish()
+        self.assertGreater(profiler.report()["members"][0]["stages"]["parse"], 0)
+
+
+class FakeYearExtractor:
+    "Extractor with a different number of (generated) rows per year"
+
+    year_range = (2016, 2018, 2020)
+    schema = OrderedDict([("ano", rows.fields.IntegerField), ("nome", rows.fields.TextField)])
+
+    def __init__(self, base_url=None, censor=False, jobs=1, fast_normalization=False,
+            profiler=None):
+        pass
+
+    def download_filename(self, year):
+        return settings.DOWNLOAD_PATH / f"fake_{year}.zip"
+
+    def download(self, year, force=False, progress=True):
+        return {"downloaded": False, "filename": self.download_filename(year)}
+
+    def extract(self, year):
+        if year == "error":
+            raise RuntimeError("Corrupted archive")
+        for index in range(year * 7 % 1000 + 2000):
+            yield [year, f"CANDIDATO {year}-{index}"]
+
+
+class ParallelYearsTestCase(unittest.TestCase):
+    def extract(self, output_filename, year_range, jobs):
+        tse.extract_data(
+            FakeYearExtractor, year_range, output_filename, None, jobs=jobs, compresslevel=1
+        )
+
+    def test_same_output_as_serial_extraction(self):
+        year_range = (2020, 2016, 2018)  # Output must follow this order
+        with tempfile.TemporaryDirectory() as temp_path:
+            temp_path = Path(temp_path)
+            self.extract(temp_path / "serial.csv.gz", year_range, jobs=1)
+            self.extract(temp_path / "parallel.csv.gz", year_range, jobs=3)
+            serial = (temp_path / "serial.csv.gz").read_bytes()
+            parallel = (temp_path / "parallel.csv.gz").read_bytes()
+            self.assertEqual(sorted(os.listdir(temp_path)), ["parallel.csv.gz", "serial.csv.gz"])
+
+        self.assertEqual(parallel, serial)
+        result = list(csv.reader(StringIO(gzip.decompress(parallel).decode("utf-8"))))
+        self.assertEqual(result[0], ["ano", "nome"])
+        expected = [
+            [str(year), f"CANDIDATO {year}-{index}"]
+            for year in year_range
+            for index in range(year * 7 % 1000 + 2000)
+        ]
+        self.assertEqual(result[1:], expected)
+
+    def test_temporary_files_are_removed_when_a_worker_fails(self):
+        with tempfile.TemporaryDirectory() as temp_path:
+            temp_path = Path(temp_path)
+            with self.assertRaisesRegex(RuntimeError, "Corrupted archive"):
+                tse.extract_data_parallel(
+                    FakeYearExtractor,
+                    (2016, "error", 2020),
+                    temp_path / "output.csv.gz",
+                    None,
+                    jobs=2,
+                    compresslevel=1,
+                )
+            self.assertEqual(os.listdir(temp_path), ["output.csv.gz"])
+
+
+class FailingBemDeclaradoExtractor(BemDeclaradoExtractor):
+    "Fails in the middle of the `SP` member"
+
+    def extract_member(self, year, filename, zfile, internal_filename):
+        data = super().extract_member(year, filename, zfile, internal_filename)
+        for index, row in enumerate(data):
+            if index == 100 and internal_filename.endswith("_SP.txt"):
+                raise RuntimeError("Corrupted member")
+            yield row
+
+
+class ParallelMembersTestCase(unittest.TestCase):
+    def setUp(self):
+        self.temp_path = tempfile.TemporaryDirectory()
+        path = Path(self.temp_path.name)
+        for name in ("DOWNLOAD_PATH", "DATA_PATH"):
+            patcher = mock.patch.object(settings, name, path)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(self.temp_path.cleanup)
+        self.ufs = ("AC", "PI", "RJ", "SP", "TO")
+        synthetic.create_archive(path, "bem_declarado", 2018, rows_count=300, ufs=self.ufs)
+
+    def test_same_rows_as_serial_extraction(self):
+        serial = list(BemDeclaradoExtractor().extract(2018))
+        parallel = list(BemDeclaradoExtractor(jobs=3).extract(2018))
+        self.assertEqual(len(serial), 300 * len(self.ufs))
+        self.assertEqual([list(row) for row in parallel], [list(row) for row in serial])
+        self.assertEqual(os.listdir(self.temp_path.name), ["bem_candidato"])
+
+    def test_failing_member_raises(self):
+        serial = list(BemDeclaradoExtractor().extract(2018))
+        result = []
+        with self.assertRaisesRegex(RuntimeError, "Corrupted member"):
+            for row in FailingBemDeclaradoExtractor(jobs=3).extract(2018):
+                result.append(list(row))
+        # Only whole members (the ones before `SP`) were yielded
+        self.assertEqual(result, [list(row) for row in serial[:3 * 300]])
+        self.assertEqual(os.listdir(self.temp_path.name), ["bem_candidato"])
+
+
+class IncrementalTestCase(unittest.TestCase):
+    def test_concatenate_parts(self):
+        with tempfile.TemporaryDirectory() as temp_path:
+            temp_path = Path(temp_path)
+            part_filenames = []
+            for year in (2018, 2020):
+                part_filenames.append(temp_path / f"{year}.csv.gz")
+                with gzip.open(part_filenames[-1], mode="wb") as fobj:
+                    fobj.write(f"{year},A\r\n{year},B\r\n".encode("utf-8"))
+            output_filename = temp_path / "output.csv.gz"
+            tse.concatenate_parts(output_filename, "ano,nome\r\n", part_filenames)
+            with gzip.open(output_filename, mode="rb") as fobj:
+                result = fobj.read()
+            self.assertFalse((temp_path / "output.csv.gz.tmp").exists())
+        self.assertEqual(
+            result, b"ano,nome\r\n2018,A\r\n2018,B\r\n2020,A\r\n2020,B\r\n"
+        )
+
+    def test_source_sha512(self):
+        with tempfile.TemporaryDirectory() as temp_path:
+            filename = Path(temp_path) / "data.zip"
+            filename.write_bytes(b"first")
+            source = tse.source_sha512(filename)
+            self.assertEqual(source["sha512"], tse.file_sha512(filename))
+            # Checksum is reused while size and mtime don't change
+            fake = dict(source, sha512="fake")
+            self.assertEqual(tse.source_sha512(filename, fake)["sha512"], "fake")
+            filename.write_bytes(b"second")
+            os.utime(filename, ns=(0, source["mtime_ns"] + 1))
+            self.assertEqual(
+                tse.source_sha512(filename, fake)["sha512"], tse.file_sha512(filename)
+            )
+
+
+class ParallelGzipWriterTestCase(unittest.TestCase):
+    def test_multi_member_output(self):
+        data = "".join(f"{index},{random.random()}\r\n" for index in range(20000))
+        with tempfile.TemporaryDirectory() as temp_path:
+            filename = Path(temp_path) / "test.csv.gz"
+            fobj = writers.open_output(filename, compresslevel=1, threads=3)
+            fobj.buffer.block_size = 16 * 1024
+            fobj.write(data)
+            fobj.close()
+            with gzip.open(filename, mode="rt", encoding="utf-8", newline="") as fobj:
+                result = fobj.read()
+            members = (filename.read_bytes()).count(b"\x1f\x8b\x08")
+        self.assertEqual(result, data)
+        self.assertGreater(members, 1)
+
+
+class SeekableCsvTestCase(unittest.TestCase):
+    def test_write_and_read_ranges_and_parts(self):
+        schema = OrderedDict(
+            [("ano", rows.fields.IntegerField), ("sigla_uf", rows.fields.TextField),
+             ("nome", rows.fields.TextField)]
+        )
+        data = [
+            [str(year), state, f"CANDIDATO {index}, \"{state}\"\n" * random.randint(1, 20)]
+            for year in ("2018", "2020")
+            for state in ("AC", "SP")
+            for index in range(3000)
+        ]
+        data.append(["2020", "SP", "Ç" * 50000])  # Bigger than a block
+        with tempfile.TemporaryDirectory() as temp_path:
+            filename = Path(temp_path) / "test.csv.gz"
+            writer = writers.open_writer(filename, schema, seekable=True, threads=2)
+            writer.writerows(data)
+            writer.close()
+            with gzip.open(filename, mode="rt", encoding="utf-8", newline="") as fobj:
+                result = list(csv.reader(fobj))
+            reader = readers.SeekableCsvReader(filename)
+            rows_2020_sp = list(reader.rows(ano=2020, sigla_uf="SP"))
+            rows_ac = list(reader.rows(sigla_uf="AC"))
+            parts = reader.split(3)
+            rows_from_parts = [row for part in parts for row in reader.read_part(part)]
+            with self.assertRaises(ValueError):
+                reader.ranges(nome="X")
+
+        self.assertEqual(result, [list(schema.keys())] + data)
+        self.assertEqual(rows_2020_sp, [row for row in data if row[:2] == ["2020", "SP"]])
+        self.assertEqual(rows_ac, [row for row in data if row[1] == "AC"])
+        self.assertEqual(len(parts), 3)
+        self.assertEqual(rows_from_parts, data)
+
+
+class PartitionedCsvWriterTestCase(unittest.TestCase):
+    def test_partitions_with_few_open_files(self):
+        field_names = ["ano", "sigla_unidade_federativa", "nome"]
+        data = [
+            [year, random.choice(["AC", "SP", "RJ", ""]), f"CANDIDATO {index}"]
+            for index, year in enumerate([2018, 2020] * 500)
+        ]
+        with tempfile.TemporaryDirectory() as temp_path:
+            path = Path(temp_path) / "candidatura"
+            old_partition = path / "ano_eleicao=2020" / "sigla_unidade_federativa=SP"
+            old_partition.mkdir(parents=True)
+            (old_partition / "part-00001.csv.gz").write_bytes(b"")
+            stale_partition = path / "ano_eleicao=2016" / "sigla_unidade_federativa=SP"
+            stale_partition.mkdir(parents=True)
+
+            writer = writers.PartitionedCsvWriter(
+                path, field_names, ["ano_eleicao", "sigla_unidade_federativa"], max_open=2
+            )
+            writer.writerows(data)
+            self.assertEqual(list(path.glob("ano_eleicao=2018")), [])  # Not visible yet
+            writer.close()
+
+            result = {}
+            for filename in sorted(path.glob("*/*/part-*.csv.gz")):
+                with gzip.open(filename, mode="rt", encoding="utf-8", newline="") as fobj:
+                    reader = csv.reader(fobj)
+                    self.assertEqual(next(reader), field_names)
+                    result[str(filename.relative_to(path).parent)] = list(reader)
+            with open(path / writers.PARTITIONS_MANIFEST) as fobj:
+                manifest = json.load(fobj)
+            self.assertEqual(
+                sorted(manifest["files"]),
+                sorted(str(filename.relative_to(path)) for filename in path.glob("*/*/*")),
+            )
+            self.assertEqual(manifest["rows"], len(data))
+            self.assertFalse(stale_partition.exists())
+            self.assertFalse((old_partition / "part-00001.csv.gz").exists())
+            self.assertEqual(os.listdir(temp_path), ["candidatura"])
+
+        for year in ("2018", "2020"):
+            for state in ("AC", "SP", "RJ", ""):
+                name = state or writers.DEFAULT_PARTITION
+                self.assertEqual(
+                    result[f"ano_eleicao={year}/sigla_unidade_federativa={name}"],
+                    [[str(row[0]), row[1], row[2]] for row in data if [str(row[0]), row[1]] == [year, state]],
+                )
+        self.assertEqual(len(result), 8)
+
+    def test_new_run_replaces_all_partitions(self):
+        field_names = ["ano", "sigla_uf", "nome"]
+        with tempfile.TemporaryDirectory() as temp_path:
+            path = Path(temp_path) / "candidatura"
+            for partition_by, data in (
+                (["ano", "sigla_uf"], [[2018, "AC", "A"], [2020, "SP", "B"]]),
+                (["ano"], [[2020, "SP", "C"]]),
+            ):
+                writer = writers.PartitionedCsvWriter(path, field_names, partition_by)
+                writer.writerows(data)
+                writer.close()
+            filenames = sorted(str(filename.relative_to(path)) for filename in path.glob("**/*.*"))
+            self.assertEqual(filenames, [writers.PARTITIONS_MANIFEST, "ano=2020/part-00000.csv.gz"])
+
+
+class QueryTestCase(unittest.TestCase):
+    def test_same_result_from_all_sources(self):
+        field_names = ["ano", "sigla_uf", "cargo", "nome"]
+        data = [
+            [year, state, random.choice(["PREFEITO", "VEREADOR"]), f"CANDIDATO {index}"]
+            for year in ("2016", "2020")
+            for state in ("AC", "SP")
+            for index in range(1000)
+        ]
+        where = {"ano_eleicao": "2020", "sigla_uf": "SP", "cargo": "PREFEITO"}
+        expected = [[row[3]] for row in data if row[:3] == ["2020", "SP", "PREFEITO"]]
+        with tempfile.TemporaryDirectory() as temp_path:
+            temp_path = Path(temp_path)
+            output = [
+                writers.CsvWriter(temp_path / "full.csv.gz", field_names),
+                writers.SeekableCsvWriter(temp_path / "seekable.csv.gz", field_names),
+                writers.PartitionedCsvWriter(
+                    temp_path / "partitions", field_names, ["ano_eleicao", "sigla_uf"]
+                ),
+            ]
+            for writer in output:
+                writer.writerows(data)
+                writer.close()
+
+            sources = [
+                (temp_path / "full.csv.gz", temp_path / "none", "full scan"),
+                (temp_path / "seekable.csv.gz", temp_path / "none", "1 of 4 indexed ranges"),
+                (temp_path / "none.csv.gz", temp_path / "partitions", "1 of 4 partitions"),
+            ]
+            for filename, partitions_path, source in sources:
+                result = query.query(filename, partitions_path, where, ["nome"])
+                self.assertEqual(result["source"], source)
+                self.assertEqual(result["fields"], ["nome"])
+                self.assertEqual(list(result["rows"]), expected)
+
+            with self.assertRaises(ValueError):
+                query.query(temp_path / "full.csv.gz", temp_path / "none", {"foo": "1"})
+
+        fobj = StringIO()
+        total = query.write_results(fobj, ["nome"], [["JOSÉ"]], "jsonl")
+        self.assertEqual((total, fobj.getvalue()), (1, '{"nome": "JOSÉ"}\n'))
+
+    def test_partitions_older_than_file_are_not_used(self):
+        field_names = ["ano", "sigla_uf", "nome"]
+        where = {"ano": "2020", "sigla_uf": "SP"}
+        with tempfile.TemporaryDirectory() as temp_path:
+            temp_path = Path(temp_path)
+            filename, partitions_path = temp_path / "data.csv.gz", temp_path / "partitions"
+            manifest_filename = partitions_path / writers.PARTITIONS_MANIFEST
+            writer = writers.PartitionedCsvWriter(partitions_path, field_names, ["ano", "sigla_uf"])
+            writer.writerows([["2020", "SP", "OLD"]])
+            writer.close()
+            writer = writers.SeekableCsvWriter(filename, field_names)
+            writer.writerows([["2020", "SP", "NEW"]])
+            writer.close()
+            os.utime(manifest_filename, ns=(1_000_000_000, 1_000_000_000))
+            os.utime(filename, ns=(2_000_000_000, 2_000_000_000))
+
+            result = query.query(filename, partitions_path, where, ["nome"])
+            self.assertEqual(result["source"], "1 of 1 indexed ranges")
+            self.assertEqual(list(result["rows"]), [["NEW"]])
+
+            os.utime(manifest_filename, ns=(2_000_000_000, 2_000_000_000))
+            result = query.query(filename, partitions_path, where, ["nome"])
+            self.assertEqual(result["source"], "1 of 1 partitions")
+            self.assertEqual(list(result["rows"]), [["OLD"]])
+
+            # Without a manifest (e.g. an interrupted run) the file is used
+            manifest_filename.unlink()
+            result = query.query(filename, partitions_path, where, ["nome"])
+            self.assertEqual(list(result["rows"]), [["NEW"]])
+
+
+class FakeTSEHandler(BaseHTTPRequestHandler):
+    "Serve `server.files`, dropping connections after `server.drop_after` bytes"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        data = self.server.files.get(self.path)
+        if data is None:
+            self.send_error(404)
+            return
+        start, end = 0, len(data) - 1
+        range_header = self.headers.get("Range")
+        if range_header and self.server.accept_ranges:
+            start, end = range_header.replace("bytes=", "").split("-")
+            start, end = int(start), min(int(end or len(data) - 1), len(data) - 1)
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(data)}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("ETag", '"v1"')
+        self.end_headers()
+        body = data[start : end + 1]
+        if self.server.drop_after is not None and end - start > 0:
+            body = body[: self.server.drop_after]
+            self.close_connection = True
+        with self.server.lock:
+            self.server.requests.append(range_header)
+            self.server.bytes_sent += len(body)
+        self.wfile.write(body)
+
+
+class FakeTSEServerMixin:
+    def setUp(self):
+        self.data = random.Random(42).randbytes(1024 * 1024)
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), FakeTSEHandler)
+        self.server.files = {"/consulta_cand_2020.zip": self.data}
+        self.server.accept_ranges, self.server.drop_after = True, None
+        self.server.lock, self.server.requests, self.server.bytes_sent = threading.Lock(), [], 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}/consulta_cand_2020.zip"
+        self.temp_path = tempfile.TemporaryDirectory()
+        self.filename = Path(self.temp_path.name) / "consulta_cand_2020.zip"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.temp_path.cleanup()
+
+
+class DownloaderTestCase(FakeTSEServerMixin, unittest.TestCase):
+    def download(self, **kwargs):
+        with mock.patch.object(downloader, "MIN_SEGMENT_SIZE", 128 * 1024):
+            return downloader.download(self.url, self.filename, backoff=0, **kwargs)
+
+    def test_segmented_download_with_dropped_connections(self):
+        self.server.drop_after = 100 * 1024
+        self.download(segments=4, expected_sha512=hashlib.sha512(self.data).hexdigest())
+        self.assertEqual(self.filename.read_bytes(), self.data)
+        self.assertGreater(len(self.server.requests), 16)  # Resumed many times
+        self.assertEqual(os.listdir(self.temp_path.name), [self.filename.name])
+
+    def test_resume_previous_download(self):
+        # Simulate an interrupted download (2 segments, the first one is done)
+        part_filename = Path(str(self.filename) + ".part")
+        part_filename.write_bytes(self.data[:512 * 1024] + b"\x00" * 512 * 1024)
+        state = {
+            "url": self.url,
+            "size": len(self.data),
+            "validator": '"v1"',
+            "segments": [[0, 524287, 524288], [524288, 1048575, 524288]],
+        }
+        Path(str(part_filename) + ".json").write_text(json.dumps(state))
+        self.download(segments=2)
+        self.assertEqual(self.filename.read_bytes(), self.data)
+        self.assertEqual(self.server.bytes_sent, 1 + 512 * 1024)  # Probe + segment
+
+    def test_checksum_mismatch(self):
+        with self.assertRaises(ValueError):
+            self.download(expected_sha512="0" * 128)
+        self.assertEqual(os.listdir(self.temp_path.name), [])
+
+    def test_server_without_range_support(self):
+        self.server.accept_ranges = False
+        self.download(segments=4)
+        self.assertEqual(self.filename.read_bytes(), self.data)
+        self.assertEqual(self.server.requests, ["bytes=0-0", None])
+
+    def test_read_sha512sums(self):
+        filename = Path(self.temp_path.name) / "SHA512SUMS"
+        filename.write_text("ABC123 consulta_cand/consulta_cand_2020.zip\ndef456 *bem.zip\n")
+        self.assertEqual(
+            downloader.read_sha512sums(filename),
+            {"consulta_cand/consulta_cand_2020.zip": "abc123", "bem.zip": "def456"},
+        )
+
+
+class FakeS3Client:
+    "Stand-in for the boto3 S3 client methods used by `mirror.S3Mirror`"
+
+    def __init__(self):
+        self.objects, self.uploads = {}, []
+
+    def list_objects_v2(self, Bucket, Prefix):
+        return {
+            "Contents": [
+                {"Key": key, "Size": len(data)}
+                for (bucket, key), data in sorted(self.objects.items())
+                if bucket == Bucket and key.startswith(Prefix)
+            ],
+            "IsTruncated": False,
+        }
+
+    def get_object(self, Bucket, Key):
+        return {"Body": io.BytesIO(self.objects[(Bucket, Key)])}
+
+    def put_object(self, Bucket, Key, Body):
+        self.objects[(Bucket, Key)] = Body
+
+    def upload_file(self, Filename, Bucket, Key):
+        self.uploads.append(Key)
+        self.objects[(Bucket, Key)] = Path(Filename).read_bytes()
+
+
+class MirrorTestCase(FakeTSEServerMixin, unittest.TestCase):
+    def mirror(self, client):
+        files = [(self.url, "consulta_cand/consulta_cand_2020.zip")]
+        download_path = Path(self.temp_path.name) / "download"
+        s3_mirror = mirror.S3Mirror(client, download_path=download_path)
+        s3_mirror.run(files)
+        return download_path
+
+    def test_upload_only_changed_files(self):
+        client = FakeS3Client()
+        download_path = self.mirror(client)
+        key = "tse/consulta_cand/consulta_cand_2020.zip"
+        self.assertEqual(client.uploads, [key])
+        self.assertEqual(client.objects[("mirror", key)], self.data)
+        checksum = hashlib.sha512(self.data).hexdigest()
+        expected_sums = f"{checksum} consulta_cand/consulta_cand_2020.zip\n"
+        self.assertEqual(client.objects[("mirror", "tse/SHA512SUMS")].decode(), expected_sums)
+        self.assertEqual((download_path / "SHA512SUMS").read_text(), expected_sums)
+
+        # Same size and checksum: nothing is uploaded (from a new download too)
+        (download_path / "consulta_cand/consulta_cand_2020.zip").unlink()
+        self.mirror(client)
+        self.assertEqual(client.uploads, [key])
+
+        # File changed in TSE
+        self.server.files["/consulta_cand_2020.zip"] = self.data[::-1] + b"!"
+        self.mirror(client)
+        self.assertEqual(client.uploads, [key, key])
+        self.assertEqual(client.objects[("mirror", key)], self.data[::-1] + b"!")
+
+
+try:
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+@unittest.skipUnless(pyarrow, "pyarrow is not installed")
+class ParquetWriterTestCase(unittest.TestCase):
+    schema = OrderedDict(
+        [
+            ("ano", rows.fields.IntegerField),
+            ("data", rows.fields.DateField),
+            ("valor", rows.fields.DecimalField),
+            ("nome", rows.fields.TextField),
+        ]
+    )
+
+    def test_types_and_row_groups(self):
+        data = [
+            [2020, "2020-10-01", "1234.56", "ANA"],
+            ["2018", "", "0", ""],
+            [None, None, None, None],
+        ] * 5
+        with tempfile.TemporaryDirectory() as temp_path:
+            filename = Path(temp_path) / "test.parquet"
+            writer = writers.ParquetWriter(filename, self.schema, row_group_size=4)
+            writer.batch_size = 3
+            writer.writerows(data[:8])
+            writer.write_csv(StringIO("2020,2020-10-01,1234.56,ANA\n" * 7))
+            writer.close()
+
+            parquet = pyarrow.parquet.ParquetFile(filename)
+            metadata = parquet.metadata
+            table = parquet.read()
+
+        self.assertEqual(
+            [metadata.row_group(index).num_rows for index in range(metadata.num_row_groups)],
+            [4, 4, 4, 3],
+        )
+        self.assertEqual(
+            [str(field.type) for field in table.schema],
+            ["int64", "date32[day]", "decimal128(38, 10)", "string"],
+        )
+        result = table.to_pylist()
+        self.assertEqual(
+            list(result[0].values()),
+            [2020, datetime.date(2020, 10, 1), decimal.Decimal("1234.56"), "ANA"],
+        )
+        self.assertEqual(list(result[1].values()), [2018, None, decimal.Decimal("0"), None])
+        self.assertEqual(list(result[2].values()), [None, None, None, None])
+        self.assertEqual(result[-1], result[0])
+
+    def test_invalid_values_are_null(self):
+        with tempfile.TemporaryDirectory() as temp_path:
+            filename = Path(temp_path) / "test.parquet"
+            writer = writers.ParquetWriter(filename, self.schema)
+            writer.writerow(["DEFERIDO", "2020-10-01", "#NE", "ANA"])
+            writer.writerow(["2020", "01/10/2020", "1.5", "JOSE"])
+            writer.writerow([str(2 ** 63), "", "", ""])
+            writer.close()
+            table = pyarrow.parquet.read_table(filename)
+
+        self.assertEqual(
+            table.to_pydict(),
+            {
+                "ano": [None, 2020, None],
+                "data": [datetime.date(2020, 10, 1), None, None],
+                "valor": [None, decimal.Decimal("1.5"), None],
+                "nome": ["ANA", "JOSE", None],
+            },
+        )
+        self.assertEqual(writer.invalid_values, {"ano": 2, "data": 1, "valor": 1})
+
+
+class SQLiteLoaderTestCase(unittest.TestCase):
+    schema = OrderedDict(
+        [
+            ("ano", rows.fields.IntegerField),
+            ("sigla_unidade_federativa", rows.fields.TextField),
+            ("cpf", rows.fields.TextField),
+            ("valor", rows.fields.DecimalField),
+            ("eleito", rows.fields.BoolField),
+        ]
+    )
+
+    def test_types_nulls_and_indexes(self):
+        with tempfile.TemporaryDirectory() as temp_path:
+            csv_filename = Path(temp_path) / "receita.csv.gz"
+            with gzip.open(csv_filename, mode="wt", encoding="utf-8") as fobj:
+                writer = csv.writer(fobj)
+                writer.writerow(list(self.schema.keys()) + ["extra"])
+                writer.writerow(["2020", "SP", "***12345678", "1234.5", "True", "X"])
+                writer.writerow(["", "", "", "", "False", ""])
+            connection = loaders.sqlite_connect(Path(temp_path) / "test.sqlite")
+            result = loaders.load_sqlite(
+                connection, "receita", csv_filename, self.schema, batch_size=1
+            )
+            self.assertEqual(result["rows"], 2)
+            self.assertEqual(
+                connection.execute("SELECT * FROM receita").fetchall(),
+                [(2020, "SP", "***12345678", 1234.5, 1, "X"), (None, None, None, None, 0, None)],
+            )
+            self.assertEqual(
+                sorted(
+                    row[0]
+                    for row in connection.execute(
+                        "SELECT name FROM sqlite_master WHERE type = 'index'"
+                    )
+                ),
+                ["idx_receita_ano", "idx_receita_cpf", "idx_receita_sigla_unidade_federativa"],
+            )
+            loaders.sqlite_close(connection)
+
+
+class PostgreSQLLoaderTestCase(unittest.TestCase):
+    schema = SQLiteLoaderTestCase.schema
+
+    def test_copy_file(self):
+        data = [[2020, "SP", "", "1.5", True], [None, "A\nB", "1", "", False]] * 3
+        fobj = loaders.CopyFile(data, batch_size=2)
+        result = ""
+        while True:
+            chunk = fobj.read(7)
+            if not chunk:
+                break
+            self.assertLessEqual(len(chunk), 7)
+            result += chunk
+        self.assertEqual(result, '2020,SP,,1.5,True\n,"A\nB",1,,False\n' * 3)
+        self.assertEqual(fobj.total, 6)
+
+    def test_copy_file_invalid_values(self):
+        data = [
+            ("DEFERIDO", "SP", "***123456**", "1.234,56", "S"),
+            (str(2 ** 63), "RJ", "", "-1e3", "false"),
+            (" 2020 ", "", "", ".5", True),
+        ]
+        fobj = loaders.CopyFile(data, schema=self.schema)
+        self.assertEqual(
+            fobj.read(),
+            ",SP,***123456**,,\n,RJ,,-1e3,false\n 2020 ,,,.5,True\n",
+        )
+        self.assertEqual(fobj.invalid_values, {"ano": 2, "valor": 1, "eleito": 1})
+        self.assertEqual(data[0][0], "DEFERIDO")  # The rows are not changed
+
+    @unittest.skipIf(
+        not os.environ.get("POSTGRESQL_TEST_URL"),
+        "POSTGRESQL_TEST_URL is not set (a PostgreSQL database used by the tests)",
+    )
+    def test_load(self):
+        connection = loaders.postgresql_connect(os.environ["POSTGRESQL_TEST_URL"])
+        data = [[2020, "SP", "***12345678", "1234.5", "True"], ["", "", "", "", "False"]]
+        try:
+            result = loaders.load_postgresql(connection, "test_receita", data, self.schema)
+            self.assertEqual(result["rows"], 2)
+            self.assertEqual(result["invalid_values"], {})
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT * FROM test_receita")
+                self.assertEqual(
+                    cursor.fetchall(),
+                    [
+                        (2020, "SP", "***12345678", decimal.Decimal("1234.5"), True),
+                        (None, None, None, None, False),
+                    ],
+                )
+                cursor.execute(
+                    "SELECT indexname FROM pg_indexes WHERE tablename = 'test_receita' "
+                    "ORDER BY indexname"
+                )
+                self.assertEqual(
+                    [row[0] for row in cursor.fetchall()],
+                    [
+                        "idx_test_receita_ano",
+                        "idx_test_receita_cpf",
+                        "idx_test_receita_sigla_unidade_federativa",
+                    ],
+                )
+                cursor.execute("DROP TABLE test_receita")
+            connection.commit()
+        finally:
+            connection.close()
+
+
+class KeyIndexTestCase(unittest.TestCase):
+    keys = {"cpf": ("cpf",), "sequencial": ("ano", "numero_sequencial")}
+
+    def test_lookup(self):
+        data = [["ano", "numero_sequencial", "cpf", "nome"]]
+        for number in range(3000):
+            data.append(["2018", str(number), f"{number % 1000:011d}", f"NOME {number}"])
+        data.append(["2020", "1", "", "COM\nQUEBRA DE LINHA"])
+        data.append(["2022", "1", obfuscate_cpf("12345678901"), "CENSURADO"])
+        with tempfile.TemporaryDirectory() as temp_path:
+            csv_filename = Path(temp_path) / "candidatura.csv.gz"
+            with gzip.open(csv_filename, mode="wt", encoding="utf-8") as fobj:
+                csv.writer(fobj).writerows(data)
+            result = lookup.update_index(csv_filename, self.keys)
+            self.assertEqual(result["rows"], 3002)
+            self.assertGreater(result["blocks"], 1)
+            self.assertIsNone(lookup.update_index(csv_filename, self.keys))
+
+            with lookup.KeyIndex(lookup.index_path(csv_filename)) as index:
+                self.assertFalse(index.is_stale(csv_filename))
+                self.assertEqual(
+                    index.lookup("sequencial", 2018, 2999),
+                    [{"ano": "2018", "numero_sequencial": "2999", "cpf": "00000000999", "nome": "NOME 2999"}],
+                )
+                self.assertEqual(
+                    [row["nome"] for row in index.lookup("sequencial", "2020", "1")],
+                    ["COM\nQUEBRA DE LINHA"],
+                )
+                self.assertEqual(
+                    [row["nome"] for row in index.lookup("cpf", "00000000007")],
+                    ["NOME 7", "NOME 1007", "NOME 2007"],
+                )
+                # As in the README (the censored output has masked CPFs)
+                self.assertEqual(
+                    [row["nome"] for row in index.lookup("cpf", "***456789**")],
+                    ["CENSURADO"],
+                )
+                self.assertEqual(index.lookup("cpf", ""), [])
+                self.assertEqual(index.lookup("sequencial", "2016", "1"), [])
+
+
+class EnrichTestCase(unittest.TestCase):
+    def write_csv(self, filename, data):
+        with gzip.open(filename, mode="wt", encoding="utf-8") as fobj:
+            csv.writer(fobj).writerows(data)
+
+    def read_csv(self, filename):
+        with gzip.open(filename, mode="rt", encoding="utf-8") as fobj:
+            return list(csv.reader(fobj))
+
+    def test_enrich_file(self):
+        with tempfile.TemporaryDirectory() as temp_path:
+            temp_path = Path(temp_path)
+            self.write_csv(
+                temp_path / "candidatura.csv.gz",
+                [
+                    ["ano", "numero_sequencial", "turno", "nome_urna", "genero"],
+                    ["2018", "10", "1", "ANA", "FEMININO"],
+                    ["2018", "10", "2", "ANA SILVA", "FEMININO"],
+                    ["2020", "10", "1", "JOSE", "MASCULINO"],
+                    ["2020", "", "1", "SEM SEQUENCIAL", "MASCULINO"],
+                ],
+            )
+            self.write_csv(
+                temp_path / "receita.csv.gz",
+                [
+                    ["ano", "numero_sequencial", "valor"],
+                    ["2018", "010", "1.5"],
+                    ["2020", "10", "2"],
+                    ["2020", "", "3"],
+                    ["2016", "10", "4"],
+                ],
+            )
+            table = enrich.CandidaturaTable(
+                temp_path / "candidatura.csv.gz", columns=["nome_urna", "genero"]
+            )
+            self.assertEqual((len(table), table.duplicates), (2, 1))
+            result = enrich.enrich_file(
+                table,
+                temp_path / "receita.csv.gz",
+                temp_path / "enriquecida.csv.gz",
+                temp_path / "sem_candidatura.csv.gz",
+            )
+            self.assertEqual((result["matched"], result["unmatched"]), (2, 2))
+            self.assertEqual(
+                self.read_csv(temp_path / "enriquecida.csv.gz"),
+                [
+                    ["ano", "numero_sequencial", "valor", "candidatura_nome_urna", "candidatura_genero"],
+                    ["2018", "010", "1.5", "ANA SILVA", "FEMININO"],
+                    ["2020", "10", "2", "JOSE", "MASCULINO"],
+                ],
+            )
+            self.assertEqual(
+                self.read_csv(temp_path / "sem_candidatura.csv.gz"),
+                [["ano", "numero_sequencial", "valor"], ["2020", "", "3"], ["2016", "10", "4"]],
+            )
+
+
+class SocioTestCase(unittest.TestCase):
+    def write_csv(self, filename, data):
+        with gzip.open(filename, mode="wt", encoding="utf-8") as fobj:
+            csv.writer(fobj).writerows(data)
+
+    def test_uuid_set(self):
+        values = [str(uuid.uuid4()) for _ in range(1000)]
+        uuid_set = socio.UUIDSet(values[:500] + [None, ""])
+        self.assertEqual(len(uuid_set), 500)
+        self.assertTrue(all(value in uuid_set for value in values[:500]))
+        self.assertFalse(any(value in uuid_set for value in values[500:]))
+
+    def test_bloom_filter_false_positive_rate(self):
+        # UUID5 values (as in `UUIDSet`) have fixed version and variant bits
+        def person_hash(key):
+            return socio.uuid_hash(socio.uuid5_string(socio.PERSON_URL.format(key)))
+
+        bloom = socio.BloomFilter(20_000)
+        for index in range(20_000):
+            bloom.add(person_hash(f"{index:06d}-PESSOA"))
+        self.assertTrue(all(person_hash(f"{index:06d}-PESSOA") in bloom for index in range(20_000)))
+        false_positives = sum(person_hash(f"{index:06d}-OUTRA") in bloom for index in range(100_000))
+        # Expected ~126 (the deviation is ~11)
+        self.assertLess(false_positives / 100_000, 1.5 * bloom.false_positive_rate)
+
+    def test_person_identity(self):
+        person = socio.Person(" 12345678901 ", "João da Silva")
+        self.assertEqual(person.key, "456789-JOAO-DA-SILVA")
+        self.assertEqual(person.url, "https://id.brasil.io/person/v1/456789-JOAO-DA-SILVA")
+        self.assertEqual(person.uuid, uuid.uuid5(uuid.NAMESPACE_URL, person.url))
+        self.assertFalse(hasattr(person, "__dict__"))
+        pairs = [("12345678901", "João da Silva"), ("***456789**", "JOAO DA SILVA"), ("", "")]
+        self.assertEqual(
+            socio.person_uuids(pairs),
+            [str(socio.Person(document, name).uuid) for document, name in pairs],
+        )
+        self.assertEqual(len(set(socio.person_uuids(pairs[:2]))), 1)
+        self.assertEqual(socio.person_identity.cache_info().maxsize, socio.PERSON_CACHE_SIZE)
+
+    def test_bounded_levenshtein(self):
+        def levenshtein(a, b):
+            previous = list(range(len(b) + 1))
+            for index_a, char_a in enumerate(a, start=1):
+                current = [index_a]
+                for index_b, char_b in enumerate(b, start=1):
+                    current.append(
+                        min(previous[index_b] + 1, current[-1] + 1, previous[index_b - 1] + (char_a != char_b))
+                    )
+                previous = current
+            return previous[-1]
+
+        random.seed(42)
+        for _ in range(2000):
+            a = "".join(random.choice("0123") for _ in range(random.randint(0, 9)))
+            b = "".join(random.choice("0123") for _ in range(random.randint(0, 9)))
+            limit = random.randint(0, 3)
+            with self.subTest(a=a, b=b, limit=limit):
+                self.assertEqual(
+                    socio.bounded_levenshtein(a, b, limit), min(levenshtein(a, b), limit + 1)
+                )
+
+    def test_cpf_conflicts(self):
+        detector = socio.CPFConflictDetector(max_block_size=3)
+        for person_uuid, cpf in [
+            ("a", "12345678901"),
+            ("a", "21345678901"),  # Same digits
+            ("a", "12345678902"),  # Same prefix
+            ("b", "12345678901"),
+            ("b", "19345678901"),  # Typo
+            ("b", "98745678901"),
+            ("c", "***45678901"),
+            ("c", "***45678999"),
+            ("d", "10045678901"),
+            ("d", "20045678901"),
+            ("d", "30045678901"),
+            ("d", "40045678901"),
+        ]:
+            detector.add(person_uuid, cpf)
+        self.assertEqual(
+            list(detector.conflicts()),
+            [
+                socio.Conflict("b", "123456789", "987456789", "edit distance greater than 1"),
+                socio.Conflict("b", "193456789", "987456789", "edit distance greater than 1"),
+                socio.Conflict("d", "100456789", "400456789", "4 different CPFs"),
+            ],
+        )
+        self.assertEqual(detector.masked, 2)
+
+    def test_match_politicians(self):
+        with tempfile.TemporaryDirectory() as temp_path:
+            temp_path = Path(temp_path)
+            self.write_csv(
+                temp_path / "candidatura.csv.gz",
+                [
+                    ["ano", "cpf", "nome"],
+                    ["2018", "12345678901", "ANA DA SILVA"],
+                    ["2020", "12345678901", "Ana da Silva"],
+                    ["2020", "98765432100", "JOSE"],
+                ],
+            )
+            self.write_csv(
+                temp_path / "socio.csv.gz",
+                [
+                    ["cnpj", "cnpj_cpf_do_socio", "nome_socio", "cpf_representante_legal", "nome_representante_legal"],
+                    ["11111111000111", "***456789**", "ANA DA SILVA", "", ""],
+                    ["22222222000122", "***456789**", "ANA SOUZA", "***654321**", "JOSE"],
+                    ["33333333000133", "***000000**", "MARIA", "", ""],
+                ],
+            )
+            self.write_csv(
+                temp_path / "empresa.csv.gz",
+                [
+                    ["cnpj", "razao_social", "nome_fantasia", "codigo_natureza_juridica"],
+                    ["44444444000144", "JOSE 98765432100", "", "2135"],
+                    ["55555555000155", "JOSE 98765432100", "", "2062"],
+                ],
+            )
+            with open(temp_path / "natureza-juridica.csv", mode="w") as fobj:
+                fobj.write("codigo,natureza_juridica\n2135,Empresário (Individual)\n2062,Sociedade Limitada\n")
+
+            candidates = socio.Candidate(
+                temp_path / "candidatura.csv.gz",
+                cache_filename=temp_path / "candidatura-filtrado.csv.gz",
+            )
+            with mock.patch("builtins.print"):
+                socio.match_politicians(
+                    candidates,
+                    socio.Partner(temp_path / "socio.csv.gz"),
+                    socio.Company(temp_path / "empresa.csv.gz", temp_path / "natureza-juridica.csv"),
+                    temp_path / "politico_socio.csv.gz",
+                )
+            self.assertTrue((temp_path / "candidatura-filtrado.csv.gz").exists())
+            self.assertEqual(candidates.file_type, "filtered")
+            with gzip.open(temp_path / "politico_socio.csv.gz", mode="rt") as fobj:
+                result = [(row["ano"], row["nome"], row["cnpj"]) for row in csv.DictReader(fobj)]
+            self.assertEqual(
+                result,
+                [
+                    ("2018", "ANA DA SILVA", "11111111000111"),
+                    ("2020", "Ana da Silva", "11111111000111"),
+                    ("2020", "JOSE", "22222222000122"),
+                    ("2020", "JOSE", "44444444000144"),
+                ],
+            )
+
+    def test_match_politicians_masked_cpfs(self):
+        # Default (censored) candidatura output: conflicts can't be detected
+        with tempfile.TemporaryDirectory() as temp_path:
+            temp_path = Path(temp_path)
+            self.write_csv(
+                temp_path / "candidatura.csv.gz",
+                [
+                    ["ano", "cpf", "nome"],
+                    ["2018", "***456789**", "ANA DA SILVA"],
+                    ["2020", "***456789**", "ANA DA SILVA"],
+                ],
+            )
+            self.write_csv(
+                temp_path / "socio.csv.gz",
+                [
+                    ["cnpj", "cnpj_cpf_do_socio", "nome_socio", "cpf_representante_legal", "nome_representante_legal"],
+                    ["11111111000111", "***456789**", "ANA DA SILVA", "", ""],
+                ],
+            )
+            self.write_csv(
+                temp_path / "empresa.csv.gz",
+                [["cnpj", "razao_social", "nome_fantasia", "codigo_natureza_juridica"]],
+            )
+            with open(temp_path / "natureza-juridica.csv", mode="w") as fobj:
+                fobj.write("codigo,natureza_juridica\n")
+
+            with mock.patch("builtins.print") as print_mock:
+                socio.match_politicians(
+                    socio.Candidate(temp_path / "candidatura.csv.gz"),
+                    socio.Partner(temp_path / "socio.csv.gz"),
+                    socio.Company(temp_path / "empresa.csv.gz", temp_path / "natureza-juridica.csv"),
+                    temp_path / "politico_socio.csv.gz",
+                    temp_path / "conflitos.csv.gz",
+                )
+            messages = [call.args[0] for call in print_mock.call_args_list]
+            self.assertIn("Encontrados 0 CPFs conflitantes", messages)
+            warnings = [message for message in messages if message.startswith("AVISO:")]
+            self.assertEqual(len(warnings), 1)
+            self.assertIn("2 candidaturas com CPF censurado", warnings[0])
+            self.assertIn("--no-censorship", warnings[0])
@@ -1,17 +1,32 @@
 import argparse
 import csv
+import gzip
+import hashlib
+import json
 import os
 import re
-import stat
+import shutil
 import sys
-from collections import OrderedDict
+import tempfile
+import time
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from glob import glob
+from io import StringIO
+from pathlib import Path
 
 import rows
-from rows.utils import open_compressed
 from tqdm import tqdm
 
+import enrich
+import loaders
+import lookup
+import mirror
+import profiling
+import query
 import settings
+import writers
+from downloader import file_sha512
 from extractors import (
     read_header,
     CandidaturaExtractor,
@@ -22,18 +37,149 @@ from extractors import (
 )
 
 REGEXP_HEADER_YEAR = re.compile("([0-9]{4}.*)\.csv")
+# Files whose changes invalidate all the parts created by `--incremental`
+CODE_FILENAMES = (
+    Path(__file__),
+    settings.BASE_PATH / "extractors.py",
+    settings.BASE_PATH / "layouts.py",
+    settings.BASE_PATH / "utils.py",
+)
+MANIFEST_VERSION = 1
+
+
+def extract_year(ExtractorClass, year, output_filename, base_url=None, censor=False,
+        fast_normalization=False, jobs=1,
+        compresslevel=writers.DEFAULT_COMPRESSION_LEVEL, compression_threads=1):
+    """Extract one year into a CSV file (without header)
+
+    This function runs inside the worker processes when `extract_data` is
+    called with `jobs > 1`, so it must receive only picklable arguments. The
+    file is compressed if `output_filename` has a compression extension.
+    """
+    extractor = ExtractorClass(
+        base_url, censor=censor, jobs=jobs, fast_normalization=fast_normalization
+    )
+    start, total = time.time(), 0
+    with writers.open_output(
+        output_filename, compresslevel=compresslevel, threads=compression_threads
+    ) as fobj:
+        writer = csv.writer(fobj)
+        for row in extractor.extract(year):
+            writer.writerow(row)
+            total += 1
+    return {
+        "year": year,
+        "rows": total,
+        "elapsed": time.time() - start,
+        "worker": os.getpid(),
+    }
+
+
+def download_files(items, force_redownload=False, jobs=4):
+    """Download the files for `(extractor, year)` pairs concurrently
+
+    Files which fail to download are reported at the end (the other ones are
+    still downloaded).
+    """
+    items = {
+        extractor.download_filename(year): (extractor, year) for extractor, year in items
+    }
+    errors = []
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = {
+            executor.submit(
+                extractor.download, year, force=force_redownload, progress=False
+            ): filename
+            for filename, (extractor, year) in items.items()
+        }
+        for future in as_completed(futures):
+            filename = futures[future].relative_to(settings.DOWNLOAD_PATH)
+            try:
+                result = future.result()
+            except Exception as exception:
+                errors.append(filename)
+                print(f"  {filename}: ERROR ({exception})")
+            else:
+                status = "downloaded" if result["downloaded"] else "already downloaded"
+                print(f"  {filename}: {status}")
+    if errors:
+        raise RuntimeError(f"Could not download: {', '.join(str(name) for name in errors)}")
+
+
+def print_invalid_values(invalid_values):
+    "Show how many values (per field) were saved as null because of their type"
+    for field_name, total in sorted(invalid_values.items()):
+        print(f"  WARNING: {total} invalid values saved as null in {field_name}")
 
 
 def extract_data(ExtractorClass, year_range, output_filename, base_url,
-        force_redownload=False, download_only=False, censor=False):
+        force_redownload=False, download_only=False, censor=False, jobs=1,
+        fast_normalization=False, file_format="csv",
+        row_group_size=writers.DEFAULT_ROW_GROUP_SIZE,
+        compresslevel=writers.DEFAULT_COMPRESSION_LEVEL, compression_threads=None,
+        download_jobs=4, profiler=None, seekable=False, partition_by=None):
+    """Download and extract `year_range` into `output_filename`
+
+    If a `profiling.Profiler` is passed, the time of each stage is accounted
+    per archive member (and everything runs in this process, so `jobs` is
+    ignored).
+    """
     extractor_name = ExtractorClass.__name__.replace("Extractor", "")
-    extractor = ExtractorClass(base_url, censor=censor)
-    output_fobj = open_compressed(output_filename, mode="w", encoding="utf-8")
-    writer = csv.DictWriter(
-        output_fobj,
-        fieldnames=list(extractor.schema.keys()),
+    if download_only:
+        print(f"{extractor_name}: downloading {len(year_range)} files")
+        extractor = ExtractorClass(base_url)
+        download_files(
+            [(extractor, year) for year in year_range],
+            force_redownload=force_redownload,
+            jobs=download_jobs,
+        )
+        return
+
+    if jobs > 1 and len(year_range) > 1 and profiler is None:
+        # Download everything first, so the workers only need to extract
+        print(f"{extractor_name}: downloading {len(year_range)} files")
+        download_files(
+            [(ExtractorClass(base_url), year) for year in year_range],
+            force_redownload=force_redownload,
+            jobs=download_jobs,
+        )
+        extract_data_parallel(
+            ExtractorClass=ExtractorClass,
+            year_range=year_range,
+            output_filename=output_filename,
+            base_url=base_url,
+            censor=censor,
+            jobs=jobs,
+            fast_normalization=fast_normalization,
+            file_format=file_format,
+            row_group_size=row_group_size,
+            compresslevel=compresslevel,
+            compression_threads=compression_threads,
+            seekable=seekable,
+            partition_by=partition_by,
+        )
+        return
+
+    # With only one year, parallelize the extraction of its internal files
+    profiler = profiler or profiling.NULL_PROFILER
+    extractor = ExtractorClass(
+        base_url,
+        censor=censor,
+        jobs=jobs,
+        fast_normalization=fast_normalization,
+        profiler=profiler,
+    )
+    writer = writers.open_writer(
+        output_filename,
+        extractor.schema,
+        file_format=file_format,
+        row_group_size=row_group_size,
+        compresslevel=compresslevel,
+        threads=compression_threads,
+        seekable=seekable,
+        partition_by=partition_by,
     )
-    writer.writeheader()
+    writerow = profiler.wrap_function(writer.writerow, "write", count_rows=True)
     for year in year_range:
         print(f"{extractor_name} {year}")
 
@@ -42,13 +188,329 @@ def extract_data(ExtractorClass, year_range, output_filename, base_url,
         if not result["downloaded"]:
             print(f" file has already been downloaded.")
 
-        if not download_only:
-            data = extractor.extract(year)
-            for row in tqdm(data, desc="  Extracting..."):
-                writer.writerow(row)
+        data = extractor.extract(year)
+        for row in tqdm(data, desc="  Extracting..."):
+            writerow(row)
 
         print()
-    output_fobj.close()
+    # Pending (compressed) blocks are written by `close`
+    profiler.wrap_function(writer.close, "write")()
+    print_invalid_values(getattr(writer, "invalid_values", {}))
+    profiler.finish()
+
+
+def extract_data_parallel(ExtractorClass, year_range, output_filename, base_url,
+        censor=False, jobs=2, fast_normalization=False, file_format="csv",
+        row_group_size=writers.DEFAULT_ROW_GROUP_SIZE,
+        compresslevel=writers.DEFAULT_COMPRESSION_LEVEL, compression_threads=None,
+        seekable=False, partition_by=None):
+    """Extract years in a process pool and merge them in `year_range` order
+
+    Each worker writes one year to a temporary file (in the same directory as
+    the final output); the main process then copies these files, in order,
+    to `output_filename`, so the result is the same as a serial run.
+    """
+    extractor_name = ExtractorClass.__name__.replace("Extractor", "")
+    extractor = ExtractorClass(base_url, censor=censor)
+    output_filename = Path(output_filename)
+    writer = writers.open_writer(
+        output_filename,
+        extractor.schema,
+        file_format=file_format,
+        row_group_size=row_group_size,
+        compresslevel=compresslevel,
+        threads=compression_threads,
+        seekable=seekable,
+        partition_by=partition_by,
+    )
+    start, worker_stats = time.time(), defaultdict(lambda: {"rows": 0, "elapsed": 0})
+    print(f"{extractor_name}: extracting {len(year_range)} years using {jobs} workers")
+    with tempfile.TemporaryDirectory(dir=output_filename.parent) as temp_path, \
+            ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [
+            (
+                executor.submit(
+                    extract_year,
+                    ExtractorClass,
+                    year,
+                    Path(temp_path) / f"{index:03d}.csv",
+                    base_url=base_url,
+                    censor=censor,
+                    fast_normalization=fast_normalization,
+                ),
+                Path(temp_path) / f"{index:03d}.csv",
+            )
+            for index, year in enumerate(year_range)
+        ]
+        for future, temp_filename in futures:
+            result = future.result()
+            with open(temp_filename, encoding="utf-8", newline="") as fobj:
+                writer.write_csv(fobj)
+            temp_filename.unlink()
+            stats = worker_stats[result["worker"]]
+            stats["rows"] += result["rows"]
+            stats["elapsed"] += result["elapsed"]
+            speed = result["rows"] / result["elapsed"] if result["elapsed"] else 0
+            print(
+                f"  {result['year']}: {result['rows']} rows in "
+                f"{result['elapsed']:.1f}s ({speed:.0f} rows/s, worker {result['worker']})"
+            )
+    writer.close()
+    print_invalid_values(getattr(writer, "invalid_values", {}))
+
+    for worker, stats in sorted(worker_stats.items()):
+        speed = stats["rows"] / stats["elapsed"] if stats["elapsed"] else 0
+        print(
+            f"  Worker {worker}: {stats['rows']} rows in {stats['elapsed']:.1f}s "
+            f"({speed:.0f} rows/s)"
+        )
+    print(f"  Total time: {time.time() - start:.1f}s")
+
+
+def parse_years(ExtractorClass, value):
+    "Years in a comma-separated string ('all' for `ExtractorClass.year_range`)"
+    if value == "all":
+        return ExtractorClass.year_range
+    years = []
+    for year in value.split(","):
+        try:
+            year = int(year)
+        except ValueError:
+            pass
+        if year not in ExtractorClass.year_range:
+            raise ValueError(year)
+        years.append(year)
+    return years
+
+
+def load_postgresql_table(ExtractorClass, table_name, year_range, database_url,
+        base_url=None, censor=False, fast_normalization=False,
+        force_redownload=False):
+    """Download and stream the rows of `year_range` into a PostgreSQL table
+
+    Runs inside the worker processes of `load_postgresql_data`, so it must
+    receive only picklable arguments.
+    """
+    extractor = ExtractorClass(
+        base_url, censor=censor, fast_normalization=fast_normalization
+    )
+
+    def extracted_rows():
+        for year in year_range:
+            extractor.download(year, force=force_redownload)
+            yield from extractor.extract(year)
+
+    connection = loaders.postgresql_connect(database_url)
+    try:
+        result = loaders.load_postgresql(
+            connection, table_name, extracted_rows(), extractor.schema
+        )
+    finally:
+        connection.close()
+    result["worker"] = os.getpid()
+    return result
+
+
+def load_postgresql_data(tables, database_url, jobs=2, **kwargs):
+    """Load `(ExtractorClass, table_name, year_range)` tables in parallel
+
+    Each table is loaded (and indexed) by one worker process, using its own
+    connection; `kwargs` are passed to `load_postgresql_table`.
+    """
+    start = time.time()
+    print(f"Loading {len(tables)} tables into PostgreSQL using {jobs} workers")
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [
+            executor.submit(
+                load_postgresql_table,
+                ExtractorClass,
+                table_name,
+                year_range,
+                database_url,
+                **kwargs,
+            )
+            for ExtractorClass, table_name, year_range in tables
+        ]
+        for future in as_completed(futures):
+            result = future.result()
+            speed = result["rows"] / result["load_time"] if result["load_time"] else 0
+            print(
+                f"  {result['table']}: {result['rows']} rows in {result['load_time']:.1f}s "
+                f"({speed:.0f} rows/s), indexes in {result['index_time']:.1f}s "
+                f"(worker {result['worker']})"
+            )
+            print_invalid_values(result["invalid_values"])
+    print(f"  Total time: {time.time() - start:.1f}s")
+
+
+def source_sha512(filename, previous=None):
+    """SHA-512 of a downloaded file, reusing `previous` if size/mtime match
+
+    Hashing all the archives takes a while, so the checksum stored in the
+    manifest is trusted if the file was not touched since it was computed.
+    """
+    stat_result = os.stat(filename)
+    source = {"size": stat_result.st_size, "mtime_ns": stat_result.st_mtime_ns}
+    if previous and all(previous.get(key) == value for key, value in source.items()):
+        source["sha512"] = previous["sha512"]
+    else:
+        source["sha512"] = file_sha512(filename)
+    return source
+
+
+def inputs_sha512(extractor, censor):
+    "Hash the code, schema, headers and options used to create a part"
+    hasher = hashlib.sha512()
+    hasher.update(json.dumps({
+        "version": MANIFEST_VERSION,
+        "extractor": extractor.__class__.__name__,
+        "censor": censor,
+    }, sort_keys=True).encode("utf-8"))
+    for filename in list(CODE_FILENAMES) + extractor.input_filenames():
+        hasher.update(str(Path(filename).name).encode("utf-8"))
+        hasher.update(file_sha512(filename).encode("ascii"))
+    return hasher.hexdigest()
+
+
+def load_manifest(filename):
+    if not filename.exists():
+        return {"version": MANIFEST_VERSION, "parts": {}}
+    with open(filename) as fobj:
+        manifest = json.load(fobj)
+    if manifest.get("version") != MANIFEST_VERSION:
+        return {"version": MANIFEST_VERSION, "parts": {}}
+    return manifest
+
+
+def save_manifest(manifest, filename):
+    temp_filename = filename.with_name(filename.name + ".tmp")
+    with open(temp_filename, mode="w") as fobj:
+        json.dump(manifest, fobj, indent=2, sort_keys=True)
+    os.replace(temp_filename, filename)
+
+
+def concatenate_parts(output_filename, header, part_filenames):
+    """Create a gzip file with `header` and the (gzipped) parts, in order
+
+    A gzip file may have many members, which are decompressed as one stream,
+    so the parts are copied as they are (without recompressing).
+    """
+    output_filename = Path(output_filename)
+    temp_filename = output_filename.with_name(output_filename.name + ".tmp")
+    with open(temp_filename, mode="wb") as output_fobj:
+        output_fobj.write(gzip.compress(header.encode("utf-8")))
+        for filename in part_filenames:
+            with open(filename, mode="rb") as fobj:
+                shutil.copyfileobj(fobj, output_fobj, 1024 * 1024)
+    os.replace(temp_filename, output_filename)
+
+
+def extract_data_incremental(ExtractorClass, dataset, year_range, output_filename,
+        base_url, force_redownload=False, download_only=False, censor=False,
+        jobs=1, fast_normalization=False,
+        compresslevel=writers.DEFAULT_COMPRESSION_LEVEL, compression_threads=None,
+        download_jobs=4):
+    """Extract only the years whose inputs changed since the last run
+
+    Each year is saved as a gzipped part in `settings.PARTS_PATH / dataset`,
+    together with a manifest with the SHA-512 of the downloaded archive and of
+    the files/options used to create the part. The parts which are up to date
+    are reused and `output_filename` (which must be a `.csv.gz`) is created by
+    concatenating all of them.
+    """
+    if not str(output_filename).endswith(".gz"):
+        raise ValueError("Incremental extraction requires a .csv.gz output file")
+
+    extractor_name = ExtractorClass.__name__.replace("Extractor", "")
+    extractor = ExtractorClass(base_url, censor=censor)
+    print(f"{extractor_name}: downloading {len(year_range)} files")
+    download_files(
+        [(extractor, year) for year in year_range],
+        force_redownload=force_redownload,
+        jobs=download_jobs,
+    )
+    if download_only:
+        return
+
+    parts_path = settings.PARTS_PATH / dataset
+    parts_path.mkdir(parents=True, exist_ok=True)
+    manifest_filename = parts_path / "manifest.json"
+    manifest = load_manifest(manifest_filename)
+    inputs = inputs_sha512(extractor, censor)
+
+    pending = []
+    for year in year_range:
+        part = manifest["parts"].get(str(year), {})
+        source = source_sha512(extractor.download_filename(year), part.get("source"))
+        part_filename = parts_path / f"{year}.csv.gz"
+        if (
+            part_filename.exists()
+            and part.get("source", {}).get("sha512") == source["sha512"]
+            and part.get("inputs") == inputs
+        ):
+            print(f"  {year}: part is up to date ({part['rows']} rows)")
+            if part["source"] != source:  # Only size/mtime changed
+                part["source"] = source
+                save_manifest(manifest, manifest_filename)
+            continue
+        pending.append((year, source, part_filename))
+
+    def finish(year, source, part_filename, result):
+        os.replace(part_filename.with_name(f"{year}.tmp.csv.gz"), part_filename)
+        manifest["parts"][str(year)] = {
+            "source": source,
+            "inputs": inputs,
+            "rows": result["rows"],
+        }
+        save_manifest(manifest, manifest_filename)
+        print(f"  {year}: {result['rows']} rows in {result['elapsed']:.1f}s")
+
+    print(f"{extractor_name}: extracting {len(pending)} of {len(year_range)} years")
+    if jobs > 1 and len(pending) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = [
+                (
+                    executor.submit(
+                        extract_year,
+                        ExtractorClass,
+                        year,
+                        part_filename.with_name(f"{year}.tmp.csv.gz"),
+                        base_url=base_url,
+                        censor=censor,
+                        fast_normalization=fast_normalization,
+                        compresslevel=compresslevel,
+                    ),
+                    year,
+                    source,
+                    part_filename,
+                )
+                for year, source, part_filename in pending
+            ]
+            for future, year, source, part_filename in futures:
+                finish(year, source, part_filename, future.result())
+    else:
+        for year, source, part_filename in pending:
+            result = extract_year(
+                ExtractorClass,
+                year,
+                part_filename.with_name(f"{year}.tmp.csv.gz"),
+                base_url=base_url,
+                censor=censor,
+                fast_normalization=fast_normalization,
+                jobs=jobs,
+                compresslevel=compresslevel,
+                compression_threads=compression_threads,
+            )
+            finish(year, source, part_filename, result)
+
+    header = StringIO()
+    csv.writer(header).writerow(extractor.output_fields)
+    concatenate_parts(
+        output_filename,
+        header.getvalue(),
+        [parts_path / f"{year}.csv.gz" for year in year_range],
+    )
+    print(f"Created {output_filename}")
 
 
 def create_final_headers(header_type, order_columns, final_filename):
@@ -116,6 +578,7 @@ if __name__ == "__main__":
         "candidatura": {
             "extractor_class": CandidaturaExtractor,
             "output_filename": settings.OUTPUT_PATH / "candidatura.csv.gz",
+            "index_keys": lookup.CANDIDATURA_KEYS,
         },
         "bem_declarado": {
             "extractor_class": BemDeclaradoExtractor,
@@ -137,15 +600,41 @@ if __name__ == "__main__":
     # TODO: clear '##VERIFICAR BASE 1994##' so we can add 1994 too
 
     parser = argparse.ArgumentParser()
-    parser.add_argument("type", choices=list(extractors.keys()) + ["headers", "mirror"])
+    parser.add_argument("type", choices=list(extractors.keys()) + ["headers", "mirror", "download", "load-sqlite", "load-postgresql", "enrich", "query"])
+    parser.add_argument("dataset", nargs="?", choices=list(extractors.keys()), help="Dataset used by 'query'")
     parser.add_argument("--force-redownload", action="store_true", default=False)
     parser.add_argument("--download-only", action="store_true", default=False)
+    parser.add_argument("--download-jobs", type=int, default=4, help="Number of files to download at the same time")
+    parser.add_argument("--s3-endpoint-url", help="S3-compatible endpoint used by 'mirror' (default: AWS)")
+    parser.add_argument("--s3-bucket", default=mirror.DEFAULT_BUCKET, help="Bucket used by 'mirror'")
+    parser.add_argument("--s3-prefix", default=mirror.DEFAULT_PREFIX, help="Key prefix used by 'mirror'")
     parser.add_argument("--output")
     parser.add_argument("--years", default="all")
     parser.add_argument("--use-mirror", action="store_true")
     parser.add_argument("--mirror-url", default="https://data.brasil.io/mirror/eleicoes-brasil/", help="Use the default data repository from TSE or a mirror")
     parser.add_argument("--no-censorship", action="store_true")
+    parser.add_argument("--jobs", type=int, default=1, help="Number of years to extract in parallel")
+    parser.add_argument("--fast-normalization", action="store_true", help="Unaccent and uppercase whole lines before parsing")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv", help="Output file format")
+    parser.add_argument("--row-group-size", type=int, default=writers.DEFAULT_ROW_GROUP_SIZE, help="Rows per row group (Parquet only)")
+    parser.add_argument("--incremental", action="store_true", help="Re-extract only the years whose inputs changed since the last run")
+    parser.add_argument("--compression-level", type=int, choices=range(1, 10), default=writers.DEFAULT_COMPRESSION_LEVEL, metavar="{1-9}", help="gzip compression level")
+    parser.add_argument("--seekable", action="store_true", help="Write the CSV in BGZF blocks with an index of years/states (see readers.py)")
+    parser.add_argument("--partition-by", help="Comma-separated fields: write one file per partition, in Hive-style directories (e.g. ano_eleicao,sigla_unidade_federativa)")
+    parser.add_argument("--compression-threads", type=int, help="Threads used to compress gzip output (default: number of CPUs)")
+    parser.add_argument("--profile", action="store_true", help="Time each extraction stage per archive member (disables --jobs)")
+    parser.add_argument("--profile-memory", action="store_true", help="Also report the peak memory per archive member (slow, implies --profile)")
+    parser.add_argument("--profile-output", help="JSON profile report (default: data/output/<type>-profile.json)")
+    parser.add_argument("--database", default=str(settings.DATA_PATH / "eleicoes-brasil.sqlite"), help="SQLite database used by 'load-sqlite'")
+    parser.add_argument("--database-url", default=os.environ.get("DATABASE_URL"), help="PostgreSQL URL used by 'load-postgresql' (default: $DATABASE_URL)")
+    parser.add_argument("--datasets", default="all", help="Comma-separated datasets used by 'load-sqlite'/'load-postgresql'/'enrich'")
+    parser.add_argument("--columns", help="Comma-separated candidatura columns added by 'enrich' (default: some of them) or columns returned by 'query' (default: all)")
+    parser.add_argument("--where", action="append", default=[], metavar="NAME=VALUE", help="Condition used by 'query' (may be repeated)")
+    parser.add_argument("--output-format", choices=["csv", "jsonl"], default="csv", help="Output format of 'query'")
     args = parser.parse_args()
+    datasets = list(extractors.keys()) if args.datasets == "all" else args.datasets.split(",")
+    if any(dataset not in extractors for dataset in datasets):
+        parser.error(f"invalid --datasets: {args.datasets}")
 
     if args.type == "headers":
         for header_type in extractors.keys():
@@ -154,37 +643,140 @@ if __name__ == "__main__":
             print(f"Creating {final_filename}")
             create_final_headers(header_type, extractor.order_columns, final_filename)
 
+    elif args.type == "download":
+        base_url = args.mirror_url if args.use_mirror else None
+        download_files(
+            [
+                (extractor["extractor_class"](base_url), year)
+                for extractor in extractors.values()
+                for year in extractor["extractor_class"].year_range
+            ],
+            force_redownload=args.force_redownload,
+            jobs=args.download_jobs,
+        )
+
     elif args.type == "mirror":
-        added_urls, created_paths = [], []
-        base_path = settings.MIRROR_FILENAME.parent
-        sha512sums_filename = (settings.DOWNLOAD_PATH / "SHA512SUMS").relative_to(base_path)
-        with open(settings.MIRROR_FILENAME, mode="w") as fobj:
-            fobj.write("#!/bin/bash\n")
-            fobj.write("\n")
-            fobj.write("set -e\n")
-            fobj.write("mkdir -p data/download\n")
-            fobj.write("rm -rf data/download/SHA512SUMS\n")
-            fobj.write("\n")
-            for header_type in sorted(extractors.keys()):
-                extractor = extractors[header_type]["extractor_class"]()
-                for year in extractor.year_range:
-                    url = extractor.url(year)
-                    if url in added_urls:
-                        continue
-                    else:
-                        added_urls.append(url)
-                    filename = extractor.filename(year)
-                    download_filename = extractor.download_filename(year).relative_to(base_path)
-                    save_path = str(download_filename.parent)
-                    if save_path not in created_paths:
-                        fobj.write(f"mkdir -p {save_path}\n")
-                        created_paths.append(save_path)
-                    fobj.write(f"time aria2c -s 8 -x 8 -k 1M -o '{download_filename}' '{url}'\n")
-                    fobj.write(f"time s3cmd put '{download_filename}' s3://mirror/tse/{filename}\n")
-                    fobj.write(f"time echo \"$(sha512sum '{download_filename}' | cut -d' ' -f 1) {filename}\" >> {sha512sums_filename}\n")
-                fobj.write("\n")
-        # chmod 750 {settings.MIRROR_FILENAME}
-        os.chmod(settings.MIRROR_FILENAME, stat.S_IRUSR + stat.S_IWUSR + stat.S_IXUSR + stat.S_IRGRP + stat.S_IXGRP)
+        files = {}
+        for header_type in sorted(extractors.keys()):
+            extractor = extractors[header_type]["extractor_class"]()
+            for year in extractor.year_range:
+                files[extractor.url(year)] = extractor.filename(year)
+        s3_mirror = mirror.S3Mirror(
+            mirror.create_s3_client(args.s3_endpoint_url),
+            bucket=args.s3_bucket,
+            prefix=args.s3_prefix,
+            jobs=args.download_jobs,
+            transfer_config=mirror.create_transfer_config(),
+        )
+        s3_mirror.run(files.items(), force=args.force_redownload)
+
+    elif args.type == "load-postgresql":
+        if not args.database_url:
+            parser.error("--database-url (or DATABASE_URL) is needed by load-postgresql")
+        tables = []
+        for dataset in datasets:
+            ExtractorClass = extractors[dataset]["extractor_class"]
+            try:
+                tables.append((ExtractorClass, dataset, parse_years(ExtractorClass, args.years)))
+            except ValueError as exception:
+                sys.stderr.write(f"ERROR: invalid year '{exception}' for {dataset}\n")
+                exit(1)
+        for path in (settings.DATA_PATH, settings.DOWNLOAD_PATH):
+            if not path.exists():
+                path.mkdir(parents=True)
+        load_postgresql_data(
+            tables,
+            args.database_url,
+            jobs=args.jobs if args.jobs > 1 else len(tables),
+            base_url=args.mirror_url if args.use_mirror else None,
+            censor=not args.no_censorship,
+            fast_normalization=args.fast_normalization,
+            force_redownload=args.force_redownload,
+        )
+
+    elif args.type == "enrich":
+        finance_datasets = ("receita", "despesa")
+        if args.datasets == "all":
+            datasets = list(finance_datasets)
+        elif any(dataset not in finance_datasets for dataset in datasets):
+            parser.error("enrich is only available for receita and despesa")
+        candidatura_filename = extractors["candidatura"]["output_filename"]
+        print(f"Loading {candidatura_filename}")
+        start = time.time()
+        table = enrich.CandidaturaTable(candidatura_filename, columns=(args.columns or ",".join(enrich.DEFAULT_COLUMNS)).split(","))
+        print(
+            f"  {len(table)} candidacies ({table.duplicates} duplicated) "
+            f"in {time.time() - start:.1f}s"
+        )
+        for dataset in datasets:
+            input_filename = extractors[dataset]["output_filename"]
+            output_filename = settings.OUTPUT_PATH / f"{dataset}_enriquecida.csv.gz"
+            unmatched_filename = settings.OUTPUT_PATH / f"{dataset}_sem_candidatura.csv.gz"
+            print(f"Enriching {input_filename}")
+            result = enrich.enrich_file(
+                table,
+                input_filename,
+                output_filename,
+                unmatched_filename,
+                compresslevel=args.compression_level,
+                threads=args.compression_threads,
+            )
+            total = result["matched"] + result["unmatched"]
+            speed = total / result["elapsed"] if result["elapsed"] else 0
+            print(
+                f"  {result['matched']} rows in {output_filename}, {result['unmatched']} "
+                f"in {unmatched_filename} ({speed:.0f} rows/s)"
+            )
+
+    elif args.type == "query":
+        if args.dataset is None:
+            parser.error("query needs a dataset (e.g. 'tse.py query candidatura')")
+        try:
+            result = query.query(
+                extractors[args.dataset]["output_filename"],
+                settings.OUTPUT_PATH / args.dataset,
+                query.parse_where(args.where),
+                args.columns.split(",") if args.columns else None,
+            )
+        except (FileNotFoundError, ValueError) as exception:
+            sys.stderr.write(f"ERROR: {exception}\n")
+            exit(1)
+        start = time.time()
+        if args.output:
+            fobj = writers.open_output(
+                args.output,
+                compresslevel=args.compression_level,
+                threads=args.compression_threads,
+            )
+        else:
+            fobj = sys.stdout
+        total = query.write_results(fobj, result["fields"], result["rows"], args.output_format)
+        if args.output:
+            fobj.close()
+        sys.stderr.write(
+            f"{total} rows from {result['source']} in {time.time() - start:.2f}s\n"
+        )
+
+    elif args.type == "load-sqlite":
+        connection = loaders.sqlite_connect(args.database)
+        for dataset in datasets:
+            extractor = extractors[dataset]
+            if not extractor["output_filename"].exists():
+                print(f"Skipping {dataset} ({extractor['output_filename']} not found)")
+                continue
+            print(f"Loading {extractor['output_filename']} into {args.database}")
+            result = loaders.load_sqlite(
+                connection,
+                dataset,
+                extractor["output_filename"],
+                extractor["extractor_class"]().schema,
+            )
+            speed = result["rows"] / result["load_time"] if result["load_time"] else 0
+            print(
+                f"  {result['rows']} rows in {result['load_time']:.2f}s ({speed:.0f} rows/s), "
+                f"indexes in {result['index_time']:.2f}s"
+            )
+        loaders.sqlite_close(connection)
 
     else:
         for path in (settings.DATA_PATH, settings.DOWNLOAD_PATH, settings.OUTPUT_PATH):
@@ -192,26 +784,92 @@ if __name__ == "__main__":
                 path.mkdir(parents=True)
 
         extractor = extractors[args.type]
-        if args.years == "all":
-            years = extractor["extractor_class"].year_range
+        try:
+            years = parse_years(extractor["extractor_class"], args.years)
+        except ValueError as exception:
+            sys.stderr.write(f"ERROR: invalid year '{exception}' for {args.type}\n")
+            exit(1)
+
+        output_filename = args.output or extractor["output_filename"]
+        profiler = None
+        if args.profile or args.profile_memory:
+            if args.incremental:
+                parser.error("--profile is not available with --incremental")
+            profiler = profiling.Profiler(trace_memory=args.profile_memory)
+        if args.incremental:
+            if args.format != "csv":
+                parser.error("--incremental is only available for CSV output")
+            if args.seekable:
+                parser.error("--seekable is not available with --incremental")
+            if args.partition_by:
+                parser.error("--partition-by is not available with --incremental")
+            extract_data_incremental(
+                ExtractorClass=extractor["extractor_class"],
+                dataset=args.type,
+                year_range=years,
+                output_filename=output_filename,
+                base_url=args.mirror_url if args.use_mirror else None,
+                force_redownload=args.force_redownload,
+                download_only=args.download_only,
+                censor=not args.no_censorship,
+                jobs=args.jobs,
+                fast_normalization=args.fast_normalization,
+                compresslevel=args.compression_level,
+                compression_threads=args.compression_threads,
+                download_jobs=args.download_jobs,
+            )
+
         else:
-            years = []
-            for value in args.years.split(","):
+            if args.seekable and args.format != "csv":
+                parser.error("--seekable is only available for CSV output")
+            partition_by = args.partition_by.split(",") if args.partition_by else None
+            if partition_by:
+                if args.format != "csv" or args.seekable:
+                    parser.error("--partition-by is only available for CSV output (without --seekable)")
+                field_names = list(extractor["extractor_class"]().schema.keys())
                 try:
-                    value = int(value)
-                except ValueError:
-                    pass
-                if value not in extractor["extractor_class"].year_range:
-                    sys.stderr.write(f"ERROR: invalid year '{value}' for {args.type}\n")
-                    exit(1)
-                years.append(value)
-
-        extract_data(
-            ExtractorClass=extractor["extractor_class"],
-            year_range=years,
-            output_filename=args.output or extractor["output_filename"],
-            base_url=args.mirror_url if args.use_mirror else None,
-            force_redownload=args.force_redownload,
-            download_only=args.download_only,
-            censor=not args.no_censorship,
-        )
+                    for name in partition_by:
+                        writers.partition_field(name, field_names)
+                except ValueError as exception:
+                    parser.error(f"{exception} (for {args.type})")
+                if not args.output:
+                    output_filename = settings.OUTPUT_PATH / args.type
+            if args.format == "parquet" and not args.output:
+                output_filename = output_filename.with_name(
+                    output_filename.name.replace(".csv.gz", ".parquet")
+                )
+            extract_data(
+                ExtractorClass=extractor["extractor_class"],
+                year_range=years,
+                output_filename=output_filename,
+                base_url=args.mirror_url if args.use_mirror else None,
+                force_redownload=args.force_redownload,
+                download_only=args.download_only,
+                censor=not args.no_censorship,
+                jobs=args.jobs,
+                fast_normalization=args.fast_normalization,
+                file_format=args.format,
+                row_group_size=args.row_group_size,
+                compresslevel=args.compression_level,
+                compression_threads=args.compression_threads,
+                download_jobs=args.download_jobs,
+                profiler=profiler,
+                seekable=args.seekable,
+                partition_by=partition_by,
+            )
+            if profiler is not None and not args.download_only:
+                profile_filename = args.profile_output or (
+                    settings.OUTPUT_PATH / f"{args.type}-profile.json"
+                )
+                profiler.save(profile_filename)
+                print(profiler.summary())
+                print(f"Profile saved to {profile_filename}")
+
+        if extractor.get("index_keys") and args.format == "csv" and not args.partition_by \
+                and not args.download_only:
+            print(f"Indexing {output_filename}")
+            result = lookup.update_index(output_filename, extractor["index_keys"])
+            if result is None:
+                print("  Index is up to date")
+            else:
+                print(f"  {result['rows']} rows in {result['blocks']} blocks")
@@ -1,7 +1,10 @@
 import io
+import re
 import zipfile
 
+from collections import deque
 from csv import Dialect
+from functools import lru_cache
 from unicodedata import normalize
 
 from rows.fields import DateField
@@ -28,6 +31,70 @@ def unaccent(text):
     return normalize("NFKD", text).encode("ascii", errors="ignore").decode("ascii")
 
 
+def _unaccent_upper_table():
+    table = bytearray(range(256))
+    for code in range(256):
+        char = chr(code)
+        value = unaccent(char).upper()
+        # Only 1-byte results can be translated at byte level. Characters which
+        # would be removed or turned into whitespace are kept, so `str.strip`
+        # gives the same result before and after translating. All the others
+        # are handled by the per-field path later.
+        if len(value) == 1 and not char.isspace() and not value.isspace():
+            table[code] = ord(value)
+    return bytes(table)
+
+
+# `bytes.translate` table equivalent to `unaccent(char).upper()` for latin-1
+UNACCENT_UPPER = _unaccent_upper_table()
+# Non-ASCII character removed by `unaccent`, used to mark values to be
+# normalized field by field
+UNACCENT_MARKER = "\x80"
+
+
+@lru_cache()
+def unaccent_upper_function(null_values):
+    """Create a function which unaccents and uppercases whole latin-1 lines
+
+    For any field of a translated line, `unaccent(value).upper()` is the value
+    itself if it's ASCII - if not, running `unaccent(value).upper()` gives the
+    same result as running it on the original value. Spellings of
+    `null_values` which would only become null after translated (like
+    "#nulo") are marked with `UNACCENT_MARKER`, so they're not mistaken by the
+    null values themselves.
+    """
+
+    translated_to = {}
+    for code in range(256):
+        translated_to.setdefault(UNACCENT_UPPER[code], []).append(chr(code))
+    patterns = []
+    for value in null_values:
+        classes = [translated_to[ord(char)] for char in value]
+        for index, char in enumerate(value):
+            # Variants with a different (but equivalent) character in `index`
+            other_chars = [c for c in classes[index] if c != char]
+            if other_chars:
+                patterns.append(
+                    re.escape(value[:index])
+                    + "[" + re.escape("".join(other_chars)) + "]"
+                    + "".join(
+                        "[" + re.escape("".join(chars)) + "]"
+                        for chars in classes[index + 1:]
+                    )
+                )
+    regexp = re.compile("|".join(patterns)) if patterns else None
+    replacement = "\\g<0>" + UNACCENT_MARKER
+    # Avoid running the regexp on lines which can't have the null values
+    needle = "#" if all("#" in value for value in null_values) else ""
+
+    def function(line):
+        if regexp is not None and needle in line:
+            line = regexp.sub(replacement, line)
+        return line.encode("latin-1").translate(UNACCENT_UPPER).decode("latin-1")
+
+    return function
+
+
 def merge_zipfiles(filename1, filename2):
     with zipfile.ZipFile(filename1, 'a') as zip1:
         zip2 = zipfile.ZipFile(filename2, 'r')
@@ -46,3 +113,68 @@ class FixQuotes(io.TextIOWrapper):
         if '";"' in data and not data.startswith('"') and not data.endswith('"'):
             data = '"' + data[:- len(newline)] + '"' + newline
         return data
+
+
+class LineFilter(io.TextIOBase):
+    """Read-only text file-like object which applies `function` to each line
+
+    Only one line of `fobj` is held in memory at a time, so it can be used to
+    fix huge files while they are being read (by `csv.reader`, for example).
+    """
+
+    def __init__(self, fobj, function):
+        self._fobj = fobj
+        self._function = function
+        self._buffer = ""
+
+    def readable(self):
+        return True
+
+    def _next_line(self):
+        line = self._fobj.readline()
+        return self._function(line) if line else line
+
+    def readline(self, size=-1):
+        if self._buffer:
+            line = self._buffer
+        else:
+            line = self._next_line()
+        if size is not None and 0 <= size < len(line):
+            line, self._buffer = line[:size], line[size:]
+        else:
+            self._buffer = ""
+        return line
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            return self._buffer + "".join(iter(self._next_line, ""))
+
+        chunks, total = [], 0
+        while total < size:
+            line = self.readline(size - total)
+            if not line:
+                break
+            chunks.append(line)
+            total += len(line)
+        return "".join(chunks)
+
+    def close(self):
+        super().close()
+        self._fobj.close()
+
+
+class ReplayLines(LineFilter):
+    """Text file-like object which returns `lines` before the ones in `fobj`
+
+    Used to "rewind" a stream which can't seek after its first lines were
+    read.
+    """
+
+    def __init__(self, lines, fobj):
+        super().__init__(fobj, None)
+        self._lines = deque(lines)
+
+    def _next_line(self):
+        if self._lines:
+            return self._lines.popleft()
+        return self._fobj.readline()
@@ -0,0 +1,613 @@
+import csv
+import datetime
+import decimal
+import gzip
+import io
+import json
+import os
+import shutil
+import struct
+import zlib
+from collections import Counter, OrderedDict, deque
+from pathlib import Path
+from urllib.parse import quote
+from concurrent.futures import ThreadPoolExecutor
+
+import rows
+from rows.utils import open_compressed
+
+
+DEFAULT_ROW_GROUP_SIZE = 1_000_000
+DEFAULT_COMPRESSION_LEVEL = 9  # Same as `gzip.open`
+# BGZF blocks have at most 64 KiB (compressed); the data limit is from `bgzip`
+BGZF_MAX_DATA_SIZE = 65280
+BGZF_EOF = bytes.fromhex("1f8b08040000000000ff0600424302001b0003000000000000000000")
+SEEKABLE_INDEX_VERSION = 1
+# For each group, the first field the file has is used to index its blocks
+PARTITION_FIELDS = (("ano", "ano_eleicao"), ("sigla_unidade_federativa", "sigla_uf"))
+MAX_OPEN_PARTITIONS = 64
+# Same as Hive (and Spark, pyarrow etc.) for empty values
+DEFAULT_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+# Partitions (and files) created by the last `PartitionedCsvWriter` run
+PARTITIONS_MANIFEST = "_partitions.json"
+PARTITIONS_MANIFEST_VERSION = 1
+
+
+class ParallelGzipWriter(io.BufferedIOBase):
+    """Binary file-like object which compresses blocks in a thread pool
+
+    Each `block_size` block is compressed independently as a gzip member (zlib
+    releases the GIL, so blocks are compressed in parallel) and the members
+    are written in order: the result is a standard multi-member gzip file.
+    """
+
+    def __init__(self, filename, compresslevel=DEFAULT_COMPRESSION_LEVEL,
+            threads=None, block_size=4 * 1024 * 1024):
+        self.fobj = open(filename, mode="wb")
+        self.compresslevel = compresslevel
+        self.threads = threads or os.cpu_count() or 1
+        self.block_size = block_size
+        self.executor = ThreadPoolExecutor(max_workers=self.threads)
+        self.pending = deque()
+        self.buffer = bytearray()
+        self.members = 0
+        self.member_sizes = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.buffer += data
+        while len(self.buffer) >= self.block_size:
+            self._compress_buffer(self.block_size)
+        return len(data)
+
+    def _compress_buffer(self, size=None):
+        size = len(self.buffer) if size is None else size
+        block = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        self.pending.append(self.executor.submit(self.compress, block))
+        self.members += 1
+        # Limit the number of compressed blocks waiting in memory
+        while len(self.pending) > 2 * self.threads:
+            self._write_pending()
+
+    def compress(self, block):
+        return gzip.compress(block, self.compresslevel, mtime=0)
+
+    def _write_pending(self):
+        member = self.pending.popleft().result()
+        self.fobj.write(member)
+        self.member_sizes.append(len(member))
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            if self.buffer or not self.members:
+                self._compress_buffer()
+            while self.pending:
+                self._write_pending()
+            self._write_trailer()
+        finally:
+            self.executor.shutdown()
+            self.fobj.close()
+            super().close()
+
+    def _write_trailer(self):
+        pass
+
+
+def bgzf_block(data, compresslevel=DEFAULT_COMPRESSION_LEVEL):
+    "A BGZF block (a gzip member with its size in the `BC` extra field)"
+
+    compressor = zlib.compressobj(compresslevel, zlib.DEFLATED, -15)
+    deflated = compressor.compress(data) + compressor.flush()
+    if len(deflated) + 26 > 65536:  # Incompressible: store it
+        compressor = zlib.compressobj(0, zlib.DEFLATED, -15)
+        deflated = compressor.compress(data) + compressor.flush()
+    header = struct.pack(
+        "<4BI2BH2BHH", 31, 139, 8, 4, 0, 0, 255, 6, 66, 67, 2, len(deflated) + 25
+    )
+    return header + deflated + struct.pack("<2I", zlib.crc32(data), len(data))
+
+
+class BGZFWriter(ParallelGzipWriter):
+    """`ParallelGzipWriter` which writes BGZF blocks (still a valid gzip file)
+
+    The blocks are created only by `write_block` (`write` is not available),
+    so the caller decides where each one ends. `member_sizes` has the size of
+    each block written.
+    """
+
+    def __init__(self, filename, compresslevel=DEFAULT_COMPRESSION_LEVEL, threads=None):
+        super().__init__(
+            filename,
+            compresslevel=compresslevel,
+            threads=threads,
+            block_size=BGZF_MAX_DATA_SIZE,
+        )
+
+    def write(self, data):
+        raise io.UnsupportedOperation("use write_block")
+
+    def write_block(self, data):
+        if len(data) > BGZF_MAX_DATA_SIZE:
+            raise ValueError(f"BGZF blocks must have at most {BGZF_MAX_DATA_SIZE} bytes")
+        self.buffer += data
+        self._compress_buffer()
+
+    def compress(self, block):
+        return bgzf_block(block, self.compresslevel)
+
+    def _write_trailer(self):
+        self.fobj.write(BGZF_EOF)
+
+
+def seekable_index_filename(filename):
+    return f"{filename}.blocks.json"
+
+
+def partition_fields(field_names):
+    return [
+        next(name for name in group if name in field_names)
+        for group in PARTITION_FIELDS
+        if any(name in field_names for name in group)
+    ]
+
+
+def partition_field(name, field_names):
+    """Field of `field_names` for partition `name` (same field in `PARTITION_FIELDS`)
+
+    >>> partition_field("ano_eleicao", ["ano", "sigla_unidade_federativa"])
+    'ano'
+    >>> partition_field("sigla_unidade_federativa", ["ano", "sigla_unidade_federativa"])
+    'sigla_unidade_federativa'
+    """
+    if name in field_names:
+        return name
+    for group in PARTITION_FIELDS:
+        if name in group:
+            for field_name in group:
+                if field_name in field_names:
+                    return field_name
+    raise ValueError(f"Unknown partition field: {name}")
+
+
+def partition_path(names, values):
+    """Relative path of a partition (values are quoted, as in Hive)
+
+    >>> str(partition_path(["ano_eleicao", "sigla_uf"], ["2020", "SP"]))
+    'ano_eleicao=2020/sigla_uf=SP'
+    """
+    return Path(*(
+        f"{name}={quote(value, safe=' ') if value else DEFAULT_PARTITION}"
+        for name, value in zip(names, values)
+    ))
+
+
+class SeekableCsvWriter:
+    """Write rows to a BGZF file and an index of its blocks (`.blocks.json`)
+
+    Rows never cross block boundaries (unless a row is bigger than a block)
+    and a new block is started whenever the values of the partition fields
+    (year and state) change, so any block (or sequence of blocks of one year
+    and state) can be decompressed and parsed alone - see `readers.py`. The
+    header is in the first block, alone.
+    """
+
+    block_chars = 60_000
+
+    def __init__(self, filename, field_names,
+            compresslevel=DEFAULT_COMPRESSION_LEVEL, threads=None):
+        self.filename = filename
+        self.field_names = list(field_names)
+        self.partition_fields = partition_fields(self.field_names)
+        self.positions = [self.field_names.index(name) for name in self.partition_fields]
+        self.gzip = BGZFWriter(filename, compresslevel=compresslevel, threads=threads)
+        self.buffer = io.StringIO()
+        self.writer = csv.writer(self.buffer)
+        # First row (number) of each block (`None` if it doesn't start a row)
+        self.blocks = []
+        self.ranges = []
+        self.partition = None
+        self.rows = 0
+        self.row_starts = []
+        self.writer.writerow(self.field_names)
+        self._flush_block(header=True)
+
+    def _submit(self, data, first_row):
+        self.gzip.write_block(data)
+        self.blocks.append(first_row)
+
+    def _flush_block(self, header=False):
+        text = self.buffer.getvalue()
+        if not text:
+            return
+        first_row = None if header else self.rows - len(self.row_starts)
+        data = text.encode("utf-8")
+        if len(data) <= BGZF_MAX_DATA_SIZE:
+            self._submit(data, first_row)
+        else:  # Only with many multi-byte characters: split by rows
+            data = bytearray()
+            ends = self.row_starts[1:] + [len(text)]
+            for row_number, start, end in zip(
+                range(first_row, self.rows), self.row_starts, ends
+            ):
+                row_data = text[start:end].encode("utf-8")
+                if data and len(data) + len(row_data) > BGZF_MAX_DATA_SIZE:
+                    self._submit(bytes(data), first_row)
+                    data, first_row = bytearray(), row_number
+                data += row_data
+                while len(data) > BGZF_MAX_DATA_SIZE:  # A huge row
+                    self._submit(bytes(data[:BGZF_MAX_DATA_SIZE]), first_row)
+                    del data[:BGZF_MAX_DATA_SIZE]
+                    first_row = None
+            if data:
+                self._submit(bytes(data), first_row)
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        self.row_starts = []
+
+    def writerow(self, row):
+        partition = [
+            "" if row[position] is None else str(row[position])
+            for position in self.positions
+        ]
+        if partition != self.partition:
+            self._flush_block()
+            self._finish_range()
+            self.partition = partition
+            self.ranges.append(
+                dict(zip(self.partition_fields, partition), first_row=self.rows, first_block=len(self.blocks))
+            )
+        self.row_starts.append(self.buffer.tell())
+        self.writer.writerow(row)
+        self.rows += 1
+        if self.buffer.tell() >= self.block_chars:
+            self._flush_block()
+
+    def writerows(self, rows):
+        for row in rows:
+            self.writerow(row)
+
+    def _finish_range(self):
+        if self.ranges:
+            current = self.ranges[-1]
+            current["rows"] = self.rows - current["first_row"]
+            current["last_block"] = len(self.blocks) - 1
+
+    def write_csv(self, fobj):
+        "Write the rows from an uncompressed CSV file-like object without header"
+        self.writerows(csv.reader(fobj))
+
+    def close(self):
+        self._flush_block()
+        self._finish_range()
+        self.gzip.close()
+        offsets, offset = [], 0
+        for size in self.gzip.member_sizes:
+            offsets.append(offset)
+            offset += size
+        index = {
+            "version": SEEKABLE_INDEX_VERSION,
+            "fields": self.field_names,
+            "partition_fields": self.partition_fields,
+            "rows": self.rows,
+            "end": offset,
+            "blocks": [[offset, first_row] for offset, first_row in zip(offsets, self.blocks)],
+            "ranges": self.ranges,
+        }
+        index_filename = seekable_index_filename(self.filename)
+        temp_filename = f"{index_filename}.tmp"
+        with open(temp_filename, mode="w") as fobj:
+            json.dump(index, fobj)
+        os.replace(temp_filename, index_filename)
+
+
+def open_output(filename, compresslevel=DEFAULT_COMPRESSION_LEVEL, threads=None):
+    "Open a text file for writing, using `ParallelGzipWriter` for `.gz` files"
+
+    if str(filename).endswith(".gz"):
+        return io.TextIOWrapper(
+            ParallelGzipWriter(filename, compresslevel=compresslevel, threads=threads),
+            encoding="utf-8",
+        )
+    return open_compressed(filename, mode="w", encoding="utf-8")
+
+
+class CsvWriter:
+    "Write rows (lists) to a (possibly compressed) CSV file"
+
+    def __init__(self, filename, field_names,
+            compresslevel=DEFAULT_COMPRESSION_LEVEL, threads=None):
+        self.filename = filename
+        self.fobj = open_output(filename, compresslevel=compresslevel, threads=threads)
+        self.writer = csv.writer(self.fobj)
+        self.writer.writerow(field_names)
+        self.writerow = self.writer.writerow
+        self.writerows = self.writer.writerows
+
+    def write_csv(self, fobj):
+        "Copy the rows from an uncompressed CSV file-like object without header"
+        shutil.copyfileobj(fobj, self.fobj, 1024 * 1024)
+
+    def close(self):
+        self.fobj.close()
+
+
+class PartitionedCsvWriter:
+    """Write rows to one `.csv.gz` file per partition, in Hive-style directories
+
+    Each row goes to `<path>/<name>=<value>/.../part-00000.csv.gz`, based on
+    the values of `partition_by` (names in `PARTITION_FIELDS` are converted to
+    the field the dataset has, so `ano_eleicao` is `ano` in `candidatura`; the
+    directories keep the requested names). All fields are kept in the files.
+
+    At most `max_open` files are open at a time: the least recently used one is
+    closed and, if needed again, reopened in append mode (as a new gzip
+    member). The files are written in `<path>.tmp`, which replaces `<path>`
+    only in `close` - like a single-file output, the directory has only the
+    partitions of the last run, never partial or old ones. The partitions
+    and their files are listed in `<path>/_partitions.json`.
+    """
+
+    part_name = "part-00000.csv.gz"
+
+    def __init__(self, path, field_names, partition_by,
+            compresslevel=DEFAULT_COMPRESSION_LEVEL, max_open=MAX_OPEN_PARTITIONS):
+        self.path = Path(path)
+        self.field_names = list(field_names)
+        self.partition_by = list(partition_by)
+        self.positions = [
+            self.field_names.index(partition_field(name, self.field_names))
+            for name in self.partition_by
+        ]
+        self.compresslevel = compresslevel
+        self.max_open = max_open
+        self.temp_path = self.path.with_name(self.path.name + ".tmp")
+        if self.temp_path.exists():  # Left by an interrupted run
+            shutil.rmtree(self.temp_path)
+        self.temp_path.mkdir(parents=True)
+        self.files = OrderedDict()  # Partition values -> (fobj, writerow)
+        self.partitions = set()
+        self.rows = 0
+
+    def _open(self, values):
+        if len(self.files) >= self.max_open:
+            fobj, _ = self.files.popitem(last=False)[1]
+            fobj.close()
+        filename = self.temp_path / partition_path(self.partition_by, values) / self.part_name
+        if values not in self.partitions:
+            filename.parent.mkdir(parents=True)
+        fobj = gzip.open(
+            filename, mode="at", compresslevel=self.compresslevel, encoding="utf-8", newline=""
+        )
+        writerow = csv.writer(fobj).writerow
+        if values not in self.partitions:
+            writerow(self.field_names)
+            self.partitions.add(values)
+        self.files[values] = (fobj, writerow)
+        return writerow
+
+    def writerow(self, row):
+        values = tuple(
+            "" if row[position] is None else str(row[position])
+            for position in self.positions
+        )
+        item = self.files.get(values)
+        if item is None:
+            writerow = self._open(values)
+        else:
+            self.files.move_to_end(values)
+            writerow = item[1]
+        writerow(row)
+        self.rows += 1
+
+    def writerows(self, rows):
+        for row in rows:
+            self.writerow(row)
+
+    def write_csv(self, fobj):
+        "Write the rows from an uncompressed CSV file-like object without header"
+        self.writerows(csv.reader(fobj))
+
+    def close(self):
+        while self.files:
+            fobj, _ = self.files.popitem()[1]
+            fobj.close()
+        manifest = {
+            "version": PARTITIONS_MANIFEST_VERSION,
+            "fields": self.field_names,
+            "partition_by": self.partition_by,
+            "rows": self.rows,
+            "files": [
+                str(partition_path(self.partition_by, values) / self.part_name)
+                for values in sorted(self.partitions)
+            ],
+        }
+        with open(self.temp_path / PARTITIONS_MANIFEST, mode="w") as fobj:
+            json.dump(manifest, fobj, indent=2)
+        if self.path.exists():
+            old_path = self.path.with_name(self.path.name + ".old")
+            if old_path.exists():
+                shutil.rmtree(old_path)
+            os.replace(self.path, old_path)
+            os.replace(self.temp_path, self.path)
+            shutil.rmtree(old_path)
+        else:
+            os.replace(self.temp_path, self.path)
+
+
+def _to_integer(value):
+    value = int(value)
+    if not -2 ** 63 <= value < 2 ** 63:
+        raise ValueError(f"{value} is out of the int64 range")
+    return value
+
+
+def _to_decimal(value):
+    return decimal.Decimal(value)
+
+
+def _to_date(value):
+    if isinstance(value, datetime.date):
+        return value
+    return datetime.date.fromisoformat(value)
+
+
+def _to_text(value):
+    return str(value)
+
+
+class ParquetWriter:
+    """Write rows (lists) to a typed Parquet file, based on a `rows` schema
+
+    Rows are buffered as Arrow record batches (so the memory used by the
+    buffer is compact) until there are `row_group_size` of them, then a row
+    group is written. Empty values are stored as nulls for all field types
+    (in CSV there's no difference between empty and null text). Values which
+    can't be converted to their field types (like `DEFERIDO` in some years of
+    `codigo_situacao_candidatura`) are also stored as nulls and counted in
+    `invalid_values` (field name -> count).
+    """
+
+    batch_size = 65536
+
+    def __init__(self, filename, schema, row_group_size=DEFAULT_ROW_GROUP_SIZE):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise RuntimeError("pyarrow is needed to export to Parquet (pip install pyarrow)")
+
+        self.pa = pyarrow
+        self.filename = filename
+        self.row_group_size = row_group_size
+        self.field_names = list(schema.keys())
+        self.converters, arrow_fields = [], []
+        for field_name, field_type in schema.items():
+            arrow_type, converter = self.arrow_type(field_type)
+            arrow_fields.append(pyarrow.field(field_name, arrow_type))
+            self.converters.append(converter)
+        self.arrow_schema = pyarrow.schema(arrow_fields)
+        self.writer = pyarrow.parquet.ParquetWriter(
+            str(filename), self.arrow_schema, compression="zstd"
+        )
+        self.rows, self.batches, self.buffered = [], [], 0
+        self.invalid_values = Counter()
+
+    def arrow_type(self, field_type):
+        pa = self.pa
+        if issubclass(field_type, rows.fields.BoolField):
+            return pa.bool_(), field_type.deserialize
+        elif issubclass(field_type, rows.fields.IntegerField):
+            return pa.int64(), _to_integer
+        elif issubclass(field_type, rows.fields.DecimalField):
+            return pa.decimal128(38, 10), _to_decimal
+        elif issubclass(field_type, rows.fields.FloatField):
+            return pa.float64(), float
+        elif issubclass(field_type, rows.fields.DateField):
+            return pa.date32(), _to_date
+        return pa.string(), _to_text
+
+    def _convert_column(self, field_name, converter, column):
+        try:
+            return [None if value is None or value == "" else converter(value) for value in column]
+        except (ValueError, ArithmeticError):
+            pass
+        # Slower path, only for the columns with invalid values
+        values = []
+        for value in column:
+            if value is None or value == "":
+                values.append(None)
+                continue
+            try:
+                values.append(converter(value))
+            except (ValueError, ArithmeticError):
+                values.append(None)
+                self.invalid_values[field_name] += 1
+        return values
+
+    def _convert_batch(self):
+        columns = list(zip(*self.rows)) if self.rows else [()] * len(self.field_names)
+        arrays = [
+            self.pa.array(self._convert_column(field.name, converter, column), type=field.type)
+            for field, converter, column in zip(self.arrow_schema, self.converters, columns)
+        ]
+        self.batches.append(
+            self.pa.RecordBatch.from_arrays(arrays, schema=self.arrow_schema)
+        )
+        self.rows = []
+
+    def _write_row_group(self):
+        table = self.pa.Table.from_batches(self.batches, schema=self.arrow_schema)
+        self.writer.write_table(table, row_group_size=self.row_group_size)
+        self.batches, self.buffered = [], 0
+
+    def _flush_batch(self):
+        self.buffered += len(self.rows)
+        self._convert_batch()
+        if self.buffered == self.row_group_size:
+            self._write_row_group()
+
+    def writerow(self, row):
+        self.rows.append(row)
+        # Batches never cross row group boundaries, so all row groups (except
+        # the last one) have exactly `row_group_size` rows
+        if len(self.rows) == min(self.batch_size, self.row_group_size - self.buffered):
+            self._flush_batch()
+
+    def writerows(self, rows):
+        for row in rows:
+            self.writerow(row)
+
+    def write_csv(self, fobj):
+        "Write the rows from an uncompressed CSV file-like object without header"
+        self.writerows(csv.reader(fobj))
+
+    def close(self):
+        if self.rows:
+            self._flush_batch()
+        if self.batches:
+            self._write_row_group()
+        self.writer.close()
+
+
+def open_writer(filename, schema, file_format="csv",
+        row_group_size=DEFAULT_ROW_GROUP_SIZE,
+        compresslevel=DEFAULT_COMPRESSION_LEVEL, threads=None, seekable=False,
+        partition_by=None):
+    """Create a writer for the rows yielded by `Extractor.extract`
+
+    With `partition_by`, `filename` is the directory of the partitions.
+    """
+
+    if partition_by:
+        if file_format != "csv" or seekable:
+            raise ValueError("Partitioned output is only available for (non-seekable) CSV")
+        return PartitionedCsvWriter(
+            filename,
+            list(schema.keys()),
+            partition_by,
+            compresslevel=compresslevel,
+        )
+    elif seekable:
+        if file_format != "csv" or not str(filename).endswith(".gz"):
+            raise ValueError("Seekable output is only available for .csv.gz files")
+        return SeekableCsvWriter(
+            filename,
+            list(schema.keys()),
+            compresslevel=compresslevel,
+            threads=threads,
+        )
+    elif file_format == "csv":
+        return CsvWriter(
+            filename,
+            list(schema.keys()),
+            compresslevel=compresslevel,
+            threads=threads,
+        )
+    elif file_format == "parquet":
+        return ParquetWriter(filename, schema, row_group_size=row_group_size)
+    raise ValueError(f"Unknown output format: {file_format}")